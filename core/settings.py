@@ -90,6 +90,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "hourskill_app.middleware.BearerAuthMiddleware",
     "hourskill_app.middleware.VipAccessMiddleware",
     "hourskill_app.middleware.SingleSessionMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
@@ -128,6 +129,30 @@ DATABASES = {
 }
 
 
+# Cache
+# Catalog versions, auth snapshots, unlocked-id sets, idempotency replays and
+# the watch-heartbeat buffer are shared between workers through this cache, so
+# any deployment running more than one process must point REDIS_URL at Redis.
+# Without it every process gets its own LocMemCache (fine for runserver).
+
+REDIS_URL = os.getenv("REDIS_URL", "").strip()
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "hourskill",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
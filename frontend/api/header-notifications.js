@@ -101,6 +101,8 @@
 
     badge.classList.add('notif-badge');
 
+    let items = [];
+
     async function fetchNotifications() {
       try {
         const res = await fetch(`${apiBase}/api/notifications/`, {
@@ -109,13 +111,94 @@
         const data = await res.json();
         if (!res.ok) return;
 
-        renderNotificationItems(data.notifications || [], list);
+        items = data.notifications || [];
+        renderNotificationItems(items, list);
         setUnreadBadge(data.unread_count || 0, badge);
       } catch (err) {
         console.error('Failed to fetch notifications', err);
       }
     }
 
+    function readEvent(event) {
+      try {
+        return JSON.parse(event.data);
+      } catch (err) {
+        return null;
+      }
+    }
+
+    function updateBalance(data) {
+      const userState = window.HourskillUserState;
+      if (!data || !userState) return;
+      const vipExpiry = data.vip_expiry || null;
+      userState.setUser({
+        tc_balance: data.balance,
+        vip_expiry: vipExpiry,
+        is_vip: Boolean(vipExpiry && new Date(vipExpiry) > new Date()),
+      });
+    }
+
+    let pollTimer = null;
+
+    function startPolling() {
+      if (!pollTimer) pollTimer = setInterval(fetchNotifications, pollMs);
+    }
+
+    async function fetchStreamTicket() {
+      try {
+        const res = await fetch(`${apiBase}/api/stream/ticket/`, {
+          method: 'POST',
+          headers: { Authorization: `Bearer ${token}` },
+        });
+        if (!res.ok) return null;
+        const data = await res.json();
+        return data.ticket || null;
+      } catch (err) {
+        return null;
+      }
+    }
+
+    // Server-sent events replace the polling timer; polling stays as the fallback.
+    // The stream URL carries a one-minute ticket, never the bearer token (URLs end up in access logs).
+    async function connectStream() {
+      if (!window.EventSource) return false;
+      const ticket = await fetchStreamTicket();
+      if (!ticket) return false;
+      const source = new EventSource(`${apiBase}/api/stream/?ticket=${encodeURIComponent(ticket)}`);
+      let connected = false;
+
+      source.addEventListener('state', (event) => {
+        connected = true;
+        const data = readEvent(event);
+        if (!data) return;
+        setUnreadBadge(data.unread_count, badge);
+        updateBalance(data);
+      });
+      source.addEventListener('notification', (event) => {
+        const data = readEvent(event);
+        if (!data) return;
+        items = [data, ...items.filter((n) => n.id !== data.id)].slice(0, 20);
+        renderNotificationItems(items, list);
+      });
+      source.addEventListener('unread', (event) => {
+        const data = readEvent(event);
+        if (data) setUnreadBadge(data.unread_count, badge);
+      });
+      source.addEventListener('balance', (event) => updateBalance(readEvent(event)));
+      source.addEventListener('error', () => {
+        // EventSource retries dropped streams itself; a refused one (expired ticket) is closed for good.
+        if (source.readyState !== EventSource.CLOSED) return;
+        if (!connected) {
+          startPolling();
+          return;
+        }
+        connectStream().then((ok) => {
+          if (!ok) startPolling();
+        });
+      });
+      return true;
+    }
+
     async function markNotificationsAsRead() {
       try {
         await fetch(`${apiBase}/api/notifications/mark-read/`, {
@@ -150,6 +233,8 @@
     });
 
     fetchNotifications();
-    setInterval(fetchNotifications, pollMs);
+    connectStream().then((ok) => {
+      if (!ok) startPolling();
+    });
   };
 })();
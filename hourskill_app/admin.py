@@ -23,7 +23,7 @@ def _system_overview(request):
     month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
 
     total_wallet_tc = Wallet.objects.aggregate(total=Sum('balance'))['total'] or 0
-    total_vip = User.objects.filter(is_vip=True).count()
+    total_vip = Wallet.objects.filter(vip_expiry__gt=now).count()
     total_view_points = (
         Transaction.objects.filter(
             tx_type='VIEW_POINT',
@@ -54,6 +54,8 @@ class UserAdmin(BaseUserAdmin):
 
     inlines = (UserProfileInline,)
     list_display = BaseUserAdmin.list_display + ('is_creator', 'is_vip', 'view_points_this_month')
+    # is_vip reads the wallet row.
+    list_select_related = ('wallet',)
 
     def view_points_this_month(self, obj):
         now = timezone.now()
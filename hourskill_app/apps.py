@@ -8,4 +8,5 @@ class HourskillAppConfig(AppConfig):
 
     def ready(self):
         """Import signal handlers so Django registers them once the app is ready."""
+        import hourskill_app.shared_cache  # noqa: F401
         import hourskill_app.signals  # noqa: F401
\ No newline at end of file
@@ -0,0 +1,240 @@
+"""Bearer-token resolution with a two-level cached user/profile snapshot.
+
+The API authenticates every call with a signed bearer token. Resolving the
+token used to cost a user query, and the profile helpers then went back to
+the database for the same row. This module resolves the token once and
+rebuilds ``User``/``UserProfile``/``Wallet`` instances from a snapshot kept
+in an in-process LRU (short TTL, per worker) backed by the shared Django
+cache. Snapshots are dropped on User/UserProfile/Wallet saves (see
+signals.py) and after queryset ``update()`` calls that bypass signals.
+
+Invalidation only reaches other workers through a shared cache (REDIS_URL).
+On a per-process cache the snapshot lives no longer than the local copy, so
+a role change or ban elsewhere is picked up within SNAPSHOT_LOCAL_TTL.
+Deactivated users never authenticate.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .models import User, UserProfile, Wallet
+from .realtime import publish_user_change
+from .shared_cache import cache_is_shared
+
+
+TOKEN_MAX_AGE_SECONDS = 60 * 60 * 24 * 7  # 7 days
+# EventSource puts its credential in the URL, where access logs keep it; a
+# stream ticket only opens the event stream and only for a minute.
+STREAM_TICKET_SALT = "hourskill.stream-ticket"
+STREAM_TICKET_MAX_AGE = getattr(settings, "STREAM_TICKET_MAX_AGE", 60)
+
+SNAPSHOT_CACHE_PREFIX = "auth-snapshot"
+SNAPSHOT_CACHE_TTL = getattr(settings, "AUTH_SNAPSHOT_CACHE_TTL", 60)
+# Local copies are not invalidated across workers, so keep them short-lived.
+SNAPSHOT_LOCAL_TTL = getattr(settings, "AUTH_SNAPSHOT_LOCAL_TTL", 5)
+SNAPSHOT_LOCAL_SIZE = getattr(settings, "AUTH_SNAPSHOT_LOCAL_SIZE", 1024)
+
+# Password hashes never leave the database; the field is deferred instead.
+_USER_EXCLUDED_FIELDS = {"password"}
+
+
+class _LocalLRU:
+    """Small thread-safe LRU with per-entry expiry for per-worker snapshots."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_local_snapshots = _LocalLRU(SNAPSHOT_LOCAL_SIZE, SNAPSHOT_LOCAL_TTL)
+
+
+def _snapshot_key(user_id):
+    return f"{SNAPSHOT_CACHE_PREFIX}:{user_id}"
+
+
+def _model_values(instance, excluded=()):
+    """Collect concrete field values keyed by attname for later from_db()."""
+    return {
+        field.attname: getattr(instance, field.attname)
+        for field in instance._meta.concrete_fields
+        if field.name not in excluded
+    }
+
+
+def _build_snapshot(user_id):
+    """Load user + profile + wallet in one query and flatten them to plain values."""
+    user = User.objects.select_related("profile", "wallet").filter(id=user_id).first()
+    if user is None:
+        return None
+    try:
+        profile = user.profile
+    except UserProfile.DoesNotExist:
+        profile = None
+    try:
+        wallet = user.wallet
+    except Wallet.DoesNotExist:
+        wallet = None
+    return {
+        "user": _model_values(user, _USER_EXCLUDED_FIELDS),
+        "profile": _model_values(profile) if profile else None,
+        "wallet": _model_values(wallet) if wallet else None,
+    }
+
+
+def _instantiate(model, values):
+    """Rebuild a model instance as if it had been loaded from the database."""
+    field_names = list(values)
+    return model.from_db(DEFAULT_DB_ALIAS, field_names, [values[name] for name in field_names])
+
+
+def _snapshot_cache_ttl():
+    # A per-process cache is not reached by invalidations from other workers.
+    return SNAPSHOT_CACHE_TTL if cache_is_shared() else min(SNAPSHOT_CACHE_TTL, SNAPSHOT_LOCAL_TTL)
+
+
+def get_user_snapshot(user_id):
+    """Return the cached snapshot dict for a user, loading it on a miss."""
+    key = _snapshot_key(user_id)
+    snapshot = _local_snapshots.get(key)
+    if snapshot is not None:
+        return snapshot
+
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = _build_snapshot(user_id)
+        if snapshot is None:
+            return None
+        cache.set(key, snapshot, timeout=_snapshot_cache_ttl())
+
+    _local_snapshots.set(key, snapshot)
+    return snapshot
+
+
+def load_user(user_id):
+    """Return a fresh User instance (with profile/wallet attached when present).
+
+    Returns None for unknown and deactivated users.
+    """
+    snapshot = get_user_snapshot(user_id)
+    if snapshot is None or not snapshot["user"].get("is_active", True):
+        return None
+    user = _instantiate(User, snapshot["user"])
+    if snapshot["profile"] is not None:
+        # Assigning the reverse one-to-one fills the relation cache both ways.
+        user.profile = _instantiate(UserProfile, snapshot["profile"])
+    if snapshot.get("wallet") is not None:
+        user.wallet = _instantiate(Wallet, snapshot["wallet"])
+    return user
+
+
+def invalidate_user_snapshot(user_id):
+    """Drop cached snapshots for a user, after commit when inside a transaction."""
+    if not user_id:
+        return
+
+    def _drop():
+        key = _snapshot_key(user_id)
+        _local_snapshots.delete(key)
+        cache.delete(key)
+
+    _drop()
+    if transaction.get_connection().in_atomic_block:
+        # Readers may repopulate from pre-commit data; drop again once committed.
+        transaction.on_commit(_drop)
+    # Balance and VIP changes all pass through here; open event streams re-read them.
+    publish_user_change([user_id])
+
+
+def read_bearer_user_id(request):
+    """Verify the bearer token on a request and return its user id or None."""
+    auth_header = request.META.get("HTTP_AUTHORIZATION", "")
+    if not auth_header.startswith("Bearer "):
+        return None
+    return read_token_user_id(auth_header.split(" ", 1)[1].strip())
+
+
+def read_token_user_id(raw_token):
+    """Verify a raw signed token and return its user id or None."""
+    if not raw_token:
+        return None
+    try:
+        data = signing.TimestampSigner().unsign_object(raw_token, max_age=TOKEN_MAX_AGE_SECONDS)
+    except Exception:
+        return None
+    if not isinstance(data, dict):
+        return None
+    return data.get("uid")
+
+
+def issue_stream_ticket(user):
+    """Short-lived ticket for opening the event stream; useless as a bearer token."""
+    return signing.TimestampSigner(salt=STREAM_TICKET_SALT).sign_object({"uid": user.id})
+
+
+def read_stream_ticket_user_id(raw_ticket):
+    """Verify a stream ticket and return its user id or None."""
+    if not raw_ticket:
+        return None
+    try:
+        data = signing.TimestampSigner(salt=STREAM_TICKET_SALT).unsign_object(
+            raw_ticket, max_age=STREAM_TICKET_MAX_AGE
+        )
+    except Exception:
+        return None
+    if not isinstance(data, dict):
+        return None
+    return data.get("uid")
+
+
+def resolve_request_user(request):
+    """Resolve the bearer user once per request and memoize it on the request."""
+    if hasattr(request, "auth_user"):
+        return request.auth_user
+
+    user_id = read_bearer_user_id(request)
+    user = None
+    if user_id:
+        try:
+            user = load_user(user_id)
+        except Exception:
+            user = None
+    request.auth_user = user
+    return user
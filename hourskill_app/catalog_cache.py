@@ -0,0 +1,68 @@
+"""Versioned response cache for the public catalog endpoints.
+
+Course, video and category listings are identical for every visitor apart
+from a few per-viewer flags. Views cache the shared (anonymous) base payload
+under the current catalog version and overlay the viewer's flags per
+request. Saving or deleting a Course, Video or Category bumps the version on
+commit, so stale bases are never served; they simply age out of the cache.
+The version key must live in a cache shared by all workers (REDIS_URL), or
+a bump on one worker would not reach the others.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+CATALOG_VERSION_KEY = 'catalog-version'
+CATALOG_RESPONSE_PREFIX = 'catalog-response'
+CATALOG_RESPONSE_CACHE_TTL = getattr(settings, 'CATALOG_RESPONSE_CACHE_TTL', 5 * 60)
+
+
+def get_catalog_version():
+    """Return the current catalog version token, creating one on first use."""
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, str(time.time_ns()), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def _set_new_version():
+    cache.set(CATALOG_VERSION_KEY, str(time.time_ns()), timeout=None)
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog payload once the current transaction commits."""
+    transaction.on_commit(_set_new_version)
+
+
+def _cache_key(name, request, version):
+    # Absolute media URLs depend on scheme and host, so they are part of the key.
+    query = '&'.join(
+        f'{key}={value}' for key, values in sorted(request.GET.lists()) for value in sorted(values)
+    )
+    raw = f'{request.scheme}://{request.get_host()}?{query}'
+    digest = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    return f'{CATALOG_RESPONSE_PREFIX}:{name}:{version}:{digest}'
+
+
+def get_or_build_base(name, request, build):
+    """Return the cached base payload for this endpoint and query, building it on a miss.
+
+    Exceptions raised by ``build`` propagate and nothing is cached.
+    """
+    key = _cache_key(name, request, get_catalog_version())
+    base = cache.get(key)
+    if base is None:
+        base = build()
+        cache.set(key, base, timeout=CATALOG_RESPONSE_CACHE_TTL)
+    return base
+
+
+def strong_etag(content):
+    """Strong validator derived from the exact response bytes."""
+    return '"%s"' % hashlib.sha256(content).hexdigest()[:32]
@@ -0,0 +1,107 @@
+"""Journaled creator revenue.
+
+A sale appends a ``CreatorRevenueEntry`` instead of locking and updating
+the creator's ``CreatorAccount``, so concurrent buyers of a popular
+creator never queue on one row. ``fold_creator_revenue`` later moves the
+unfolded entries into ``pending_vnd``/``total_earned_vnd`` (and the
+``CreatorStats.revenue_vnd`` counter) in one short transaction; the
+fold_creator_revenue command runs it periodically. Reads stay exact by
+adding the still-unfolded entries to the account in the same query.
+"""
+
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .creator_stats import bump_creator_stats
+from .models import CreatorAccount, CreatorRevenueEntry
+from .money import run_money_operation
+
+
+def record_sale(creator, amount_vnd, video=None):
+    """Journal a creator's share of a sale; insert-only, no row locks."""
+    amount = Decimal(str(amount_vnd))
+    if amount <= 0:
+        return None
+    # Plain read (no lock) in the common case; guarantees readers find the account row.
+    CreatorAccount.objects.get_or_create(user=creator)
+    return CreatorRevenueEntry.objects.create(creator=creator, video=video, amount_vnd=amount)
+
+
+def record_sales(sales):
+    """Journal several ``(creator, amount_vnd, video)`` sales with one insert."""
+    entries = [
+        CreatorRevenueEntry(creator=creator, video=video, amount_vnd=Decimal(str(amount_vnd)))
+        for creator, amount_vnd, video in sales
+        if Decimal(str(amount_vnd)) > 0
+    ]
+    for creator in {entry.creator for entry in entries}:
+        CreatorAccount.objects.get_or_create(user=creator)
+    return CreatorRevenueEntry.objects.bulk_create(entries)
+
+
+def _unfolded_total(creator_ref):
+    return Coalesce(
+        Subquery(
+            CreatorRevenueEntry.objects.filter(creator_id=creator_ref, folded_at__isnull=True)
+            .order_by()
+            .values('creator_id')
+            .annotate(total=Sum('amount_vnd'))
+            .values('total')
+        ),
+        Value(Decimal('0.00')),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def get_creator_account_for_read(user):
+    """Creator account with unfolded revenue included; unsaved when none exists. Never writes."""
+    account = (
+        CreatorAccount.objects.filter(user=user)
+        .annotate(unfolded_vnd=_unfolded_total(OuterRef('user_id')))
+        .first()
+    )
+    if account is None:
+        # record_sale creates the account before journaling, so there is nothing unfolded.
+        return CreatorAccount(user=user)
+    account.pending_vnd += account.unfolded_vnd
+    account.total_earned_vnd += account.unfolded_vnd
+    return account
+
+
+def _fold(locks, creator_id):
+    # Locking the account first serializes folds of the same creator; sales never take it.
+    account = locks.get_or_create(CreatorAccount, user_id=creator_id)[0]
+    entries = [
+        (entry.id, entry.amount_vnd)
+        for entry in locks.lock(CreatorRevenueEntry, creator_id=creator_id, folded_at__isnull=True)
+    ]
+    if not entries:
+        return Decimal('0.00')
+    total = sum((amount for _, amount in entries), Decimal('0.00'))
+    now = timezone.now()
+    CreatorRevenueEntry.objects.filter(id__in=[entry_id for entry_id, _ in entries]).update(folded_at=now)
+    CreatorAccount.objects.filter(pk=account.pk).update(
+        pending_vnd=F('pending_vnd') + total,
+        total_earned_vnd=F('total_earned_vnd') + total,
+        updated_at=now,
+    )
+    bump_creator_stats(creator_id, revenue_vnd=total)
+    return total
+
+
+def fold_creator_revenue(creator_id):
+    """Move a creator's unfolded entries into their account; returns the VND folded."""
+    return run_money_operation('fold_creator_revenue', _fold, creator_id)
+
+
+def creators_with_unfolded_revenue():
+    """Creator ids that have entries waiting to be folded."""
+    return list(
+        CreatorRevenueEntry.objects.filter(folded_at__isnull=True)
+        .order_by('creator_id')
+        .values_list('creator_id', flat=True)
+        .distinct()
+    )
@@ -0,0 +1,237 @@
+"""Maintenance helpers for the CreatorStats read model.
+
+Hot write paths (reviews, follows) apply F() deltas with
+``bump_creator_stats``; new views are applied after commit
+(``record_creator_views``) so purchases do not hold the row lock; sales reach ``revenue_vnd`` when their journal
+entries are folded (see creator_revenue.py). Rare changes that affect
+several aggregates at once (soft-deleting a video) and the batch command
+recompute rows from source tables with ``refresh_creator_stats``. The
+teachers leaderboard reads the ``rank`` column assigned periodically by
+``rank_creators``; creators that become eligible in between are appended
+after the current last rank.
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Max, Sum, Value, When
+from django.utils import timezone
+
+from .models import CreatorRevenueEntry, CreatorStats, Follow, Transaction, Video, WatchSession
+
+
+STAT_FIELDS = (
+    'total_views',
+    'rating_sum',
+    'rating_count',
+    'follower_count',
+    'following_count',
+    'video_count',
+    'revenue_vnd',
+)
+RANK_BATCH_SIZE = 500
+
+
+def compute_creator_stats(creator_ids):
+    """Compute aggregates for the given creator ids from source tables.
+
+    Returns ``{creator_id: {field: value}}`` containing only creators with at
+    least one non-zero aggregate. Each aggregate is one grouped query.
+    """
+    creator_ids = list(creator_ids)
+    if not creator_ids:
+        return {}
+
+    stats = {}
+
+    def _put(creator_id, field, value):
+        stats.setdefault(creator_id, {}).setdefault(field, value)
+
+    active_videos = Video.objects.filter(creator_id__in=creator_ids, is_active=True, is_deleted=False)
+    for row in (
+        active_videos.values('creator_id')
+        .annotate(videos=Count('id'), r_sum=Sum('rating_sum'), r_count=Sum('rating_count'))
+        .order_by()
+    ):
+        _put(row['creator_id'], 'video_count', row['videos'])
+        _put(row['creator_id'], 'rating_sum', row['r_sum'] or 0)
+        _put(row['creator_id'], 'rating_count', row['r_count'] or 0)
+
+    for row in (
+        WatchSession.objects.filter(
+            video__creator_id__in=creator_ids,
+            video__is_active=True,
+            video__is_deleted=False,
+        )
+        .values('video__creator_id')
+        .annotate(views=Count('id'))
+        .order_by()
+    ):
+        _put(row['video__creator_id'], 'total_views', row['views'])
+
+    for row in (
+        Follow.objects.filter(following_id__in=creator_ids)
+        .values('following_id')
+        .annotate(followers=Count('id'))
+        .order_by()
+    ):
+        _put(row['following_id'], 'follower_count', row['followers'])
+
+    for row in (
+        Follow.objects.filter(follower_id__in=creator_ids)
+        .values('follower_id')
+        .annotate(following=Count('id'))
+        .order_by()
+    ):
+        _put(row['follower_id'], 'following_count', row['following'])
+
+    for row in (
+        Transaction.objects.filter(receiver_id__in=creator_ids, tx_type='CONTENT_SALE', amount_vnd__gt=0)
+        .values('receiver_id')
+        .annotate(revenue=Sum('amount_vnd'))
+        .order_by()
+    ):
+        _put(row['receiver_id'], 'revenue_vnd', row['revenue'] or Decimal('0.00'))
+
+    # Journaled sales not yet folded are added to revenue_vnd by the fold itself.
+    for row in (
+        CreatorRevenueEntry.objects.filter(creator_id__in=creator_ids, folded_at__isnull=True)
+        .values('creator_id')
+        .annotate(unfolded=Sum('amount_vnd'))
+        .order_by()
+    ):
+        if row['creator_id'] in stats and 'revenue_vnd' in stats[row['creator_id']]:
+            stats[row['creator_id']]['revenue_vnd'] -= row['unfolded']
+
+    return stats
+
+
+def refresh_creator_stats(creator_ids):
+    """Recompute and upsert CreatorStats rows for the given creators.
+
+    Creators that already have a row are reset to the recomputed values even
+    when everything dropped to zero. Returns the number of rows written.
+    """
+    creator_ids = [creator_id for creator_id in set(creator_ids) if creator_id]
+    if not creator_ids:
+        return 0
+
+    computed = compute_creator_stats(creator_ids)
+    existing = set(CreatorStats.objects.filter(user_id__in=creator_ids).values_list('user_id', flat=True))
+    now = timezone.now()
+
+    rows = []
+    for creator_id in creator_ids:
+        values = computed.get(creator_id)
+        if values is None and creator_id not in existing:
+            continue
+        values = values or {}
+        rows.append(CreatorStats(
+            user_id=creator_id,
+            total_views=values.get('total_views', 0),
+            rating_sum=values.get('rating_sum', 0),
+            rating_count=values.get('rating_count', 0),
+            follower_count=values.get('follower_count', 0),
+            following_count=values.get('following_count', 0),
+            video_count=values.get('video_count', 0),
+            revenue_vnd=values.get('revenue_vnd', Decimal('0.00')),
+            updated_at=now,
+        ))
+
+    if rows:
+        CreatorStats.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=[*STAT_FIELDS, 'updated_at'],
+        )
+        append_unranked_creators(creator_ids)
+    return len(rows)
+
+
+def bump_creator_stats(creator_id, **deltas):
+    """Apply F() deltas to a creator's stats row; build the row from source if missing.
+
+    Call after the underlying write in the same transaction so a freshly
+    built row already includes it.
+    """
+    updates = {field: F(field) + value for field, value in deltas.items() if value}
+    if not creator_id or not updates:
+        return
+    updates['updated_at'] = timezone.now()
+    if not CreatorStats.objects.filter(user_id=creator_id).update(**updates):
+        refresh_creator_stats([creator_id])
+    elif deltas.get('video_count', 0) > 0:
+        append_unranked_creators([creator_id])
+
+
+def record_creator_views(creator_id, views=1):
+    """Count new watch sessions once the transaction commits.
+
+    Purchases open sessions while holding wallet locks; bumping the creator's
+    hot stats row there would serialize every buyer of that creator again.
+    """
+    if creator_id and views:
+        transaction.on_commit(lambda: bump_creator_stats(creator_id, total_views=views))
+
+
+def bump_follow_counts(follower_id, following_id, delta):
+    """Keep both sides of a follow edge in sync; call inside the toggle transaction."""
+    bump_creator_stats(following_id, follower_count=delta)
+    bump_creator_stats(follower_id, following_count=delta)
+
+
+def get_creator_stats(user):
+    """Return the creator's stats row, or an unsaved all-zero row when none exists."""
+    stats = CreatorStats.objects.filter(user=user).first()
+    return stats or CreatorStats(user=user)
+
+
+def rank_creators():
+    """Assign leaderboard ranks: views, then average rating, then username.
+
+    Creators without active videos lose their rank. Returns the number of
+    ranked creators.
+    """
+    ordered = (
+        CreatorStats.objects.filter(video_count__gt=0)
+        .annotate(
+            avg_rating_value=Case(
+                When(rating_count__gt=0, then=F('rating_sum') * 1.0 / F('rating_count')),
+                default=Value(0.0),
+                output_field=FloatField(),
+            ),
+        )
+        .order_by('-total_views', '-avg_rating_value', 'user__username', 'user_id')
+        .only('id', 'rank')
+    )
+
+    changed = []
+    ranked = 0
+    for position, stats in enumerate(ordered.iterator(chunk_size=RANK_BATCH_SIZE), start=1):
+        ranked = position
+        if stats.rank != position:
+            stats.rank = position
+            changed.append(stats)
+        if len(changed) >= RANK_BATCH_SIZE:
+            CreatorStats.objects.bulk_update(changed, ['rank'])
+            changed = []
+    if changed:
+        CreatorStats.objects.bulk_update(changed, ['rank'])
+
+    CreatorStats.objects.filter(video_count=0, rank__isnull=False).update(rank=None)
+    return ranked
+
+
+def append_unranked_creators(creator_ids):
+    """Place newly eligible creators at the end of the leaderboard until the next full ranking."""
+    unranked = list(
+        CreatorStats.objects.filter(user_id__in=creator_ids, rank__isnull=True, video_count__gt=0)
+        .order_by('user_id')
+        .values_list('id', flat=True)
+    )
+    if not unranked:
+        return
+    last_rank = CreatorStats.objects.aggregate(last=Max('rank'))['last'] or 0
+    for offset, stats_id in enumerate(unranked, start=1):
+        CreatorStats.objects.filter(pk=stats_id).update(rank=last_rank + offset)
@@ -0,0 +1,161 @@
+"""Idempotency-Key support for the money endpoints.
+
+Clients send an ``Idempotency-Key`` header with purchase, unlock, recharge,
+VIP and withdrawal requests. The first request claims the key (a row in
+``IdempotencyKey``) and runs normally; its response is stored and replayed
+verbatim for any retry with the same key within IDEMPOTENCY_KEY_TTL, so a
+retry storm costs one cache (or primary-key) lookup per retry instead of
+another money transaction. A retry that arrives while the first request is
+still running gets 409; reusing a key for a different request gets 422.
+Server errors release the key so the client can try again.
+"""
+
+import functools
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .auth import resolve_request_user
+from .models import IdempotencyKey
+
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+IDEMPOTENCY_CACHE_PREFIX = 'idempotency'
+IDEMPOTENCY_KEY_TTL = getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60)
+# A claim older than this without a stored response is treated as abandoned (crashed worker).
+IDEMPOTENCY_IN_FLIGHT_TIMEOUT = getattr(settings, 'IDEMPOTENCY_IN_FLIGHT_TIMEOUT', 5 * 60)
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+
+def _error(message, status):
+    return JsonResponse({'status': 'error', 'message': message}, status=status)
+
+
+def _request_hash(request):
+    digest = hashlib.sha256()
+    digest.update(f'{request.method} {request.path}\n'.encode('utf-8'))
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def _cache_key(user_id, key):
+    return f"{IDEMPOTENCY_CACHE_PREFIX}:{user_id}:{hashlib.sha1(key.encode('utf-8')).hexdigest()}"
+
+
+def _replay(endpoint, request_hash, stored):
+    stored_endpoint, stored_hash, status_code, body = stored
+    if stored_endpoint != endpoint or stored_hash != request_hash:
+        return _error('Idempotency-Key đã được dùng cho một yêu cầu khác.', 422)
+    response = HttpResponse(body, status=status_code, content_type='application/json')
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _lookup(user_id, key, cutoff):
+    """Completed response for the key as a tuple, 'running', or None when unclaimed."""
+    row = (
+        IdempotencyKey.objects.filter(user_id=user_id, key=key, created_at__gte=cutoff)
+        .values_list('endpoint', 'request_hash', 'status_code', 'response_body', 'created_at')
+        .first()
+    )
+    if row is None:
+        return None
+    endpoint, request_hash, status_code, body, created_at = row
+    if status_code is None:
+        if created_at < timezone.now() - timedelta(seconds=IDEMPOTENCY_IN_FLIGHT_TIMEOUT):
+            IdempotencyKey.objects.filter(user_id=user_id, key=key, status_code__isnull=True).delete()
+            return None
+        return 'running'
+    stored = (endpoint, request_hash, status_code, body)
+    cache.set(_cache_key(user_id, key), stored, timeout=IDEMPOTENCY_KEY_TTL)
+    return stored
+
+
+def _claim(user, key, endpoint, request_hash, cutoff):
+    """Insert the in-flight row; returns None when claimed, else the current holder's state."""
+    # A key past its window is free again; drop the old row so the unique insert can succeed.
+    IdempotencyKey.objects.filter(user=user, key=key, created_at__lt=cutoff).delete()
+    try:
+        IdempotencyKey.objects.create(user=user, key=key, endpoint=endpoint, request_hash=request_hash)
+    except IntegrityError:
+        return _lookup(user.id, key, cutoff) or 'running'
+    return None
+
+
+def _store(user_id, key, endpoint, request_hash, response):
+    body = response.content.decode(response.charset or 'utf-8')
+    IdempotencyKey.objects.filter(user_id=user_id, key=key, status_code__isnull=True).update(
+        status_code=response.status_code,
+        response_body=body,
+    )
+    cache.set(
+        _cache_key(user_id, key),
+        (endpoint, request_hash, response.status_code, body),
+        timeout=IDEMPOTENCY_KEY_TTL,
+    )
+
+
+def idempotent(endpoint):
+    """View decorator: replay the stored response for a repeated Idempotency-Key.
+
+    Requests without the header, or without a bearer user, run unchanged.
+    Responses below 500 are stored; 5xx responses and exceptions release the key.
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = request.META.get(IDEMPOTENCY_HEADER, '').strip()
+            if not key:
+                return view(request, *args, **kwargs)
+            user = resolve_request_user(request)
+            if user is None:
+                return view(request, *args, **kwargs)
+            if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+                return _error('Idempotency-Key quá dài.', 400)
+
+            request_hash = _request_hash(request)
+            stored = cache.get(_cache_key(user.id, key))
+            if stored is not None:
+                return _replay(endpoint, request_hash, stored)
+
+            cutoff = timezone.now() - timedelta(seconds=IDEMPOTENCY_KEY_TTL)
+            stored = _lookup(user.id, key, cutoff) or _claim(user, key, endpoint, request_hash, cutoff)
+            if stored == 'running':
+                return _error('Yêu cầu với Idempotency-Key này đang được xử lý.', 409)
+            if stored is not None:
+                return _replay(endpoint, request_hash, stored)
+
+            try:
+                response = view(request, *args, **kwargs)
+            except BaseException:
+                IdempotencyKey.objects.filter(user=user, key=key, status_code__isnull=True).delete()
+                raise
+            if response.status_code >= 500 or getattr(response, 'streaming', False):
+                IdempotencyKey.objects.filter(user=user, key=key, status_code__isnull=True).delete()
+            else:
+                _store(user.id, key, endpoint, request_hash, response)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def purge_expired_idempotency_keys(chunk_size=1000, dry_run=False):
+    """Delete rows older than the replay window in chunks; returns how many were (or would be) removed."""
+    cutoff = timezone.now() - timedelta(seconds=IDEMPOTENCY_KEY_TTL)
+    expired = IdempotencyKey.objects.filter(created_at__lt=cutoff)
+    if dry_run:
+        return expired.count()
+    removed = 0
+    while True:
+        ids = list(expired.order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return removed
+        removed += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
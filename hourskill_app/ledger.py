@@ -0,0 +1,132 @@
+"""Ledger-derived TC balances backed by periodic per-user checkpoints.
+
+Every wallet mutation writes a ``Transaction`` row in the same database
+transaction, so a user's balance at ledger id N is their balance at an
+earlier checkpoint plus the signed sum of their SUCCESS rows in between.
+``LedgerCheckpoint`` rows (written by the checkpoint_ledger command) bound
+that sum to the activity since the last checkpoint, so verifying a balance
+or answering "what was the balance at id N" never scans the whole history.
+
+Only SUCCESS rows move TC. A row's effect depends on its type: purchases
+debit the sender, top-ups and rewards credit the receiver, transfer-style
+rows (see ``services.transfer_tc``) do both. VND-only rows (withdrawals,
+pending creator revenue) have no TC effect.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import OuterRef, Subquery, Sum
+
+from .models import LedgerCheckpoint, Transaction
+
+
+# Wallets open with the signup bonus, which has no ledger row (see signals.py).
+GENESIS_BALANCE = Decimal('30.00')
+
+DEBIT_SENDER_TYPES = frozenset({
+    'CONTENT_SALE', 'VIP_PURCHASE', 'BUY_VIP', 'VIEW_POINT', 'SPEND_VIEW', 'EARN_CREATOR',
+})
+CREDIT_RECEIVER_TYPES = frozenset({
+    'RECHARGE', 'EARN_ADS', 'SPEND_VIEW', 'EARN_CREATOR',
+})
+
+
+def ledger_head():
+    """Highest committed ledger id (0 for an empty ledger)."""
+    return Transaction.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def ledger_deltas(user_ids, after_id, upto_id):
+    """Return {user_id: signed TC delta} over ledger ids in (after_id, upto_id].
+
+    Users without activity in the range are omitted. Two aggregate queries,
+    both served by the (sender, id) / (receiver, id) indexes.
+    """
+    user_ids = list(user_ids)
+    deltas = defaultdict(Decimal)
+    if not user_ids or upto_id <= after_id:
+        return deltas
+
+    in_range = Transaction.objects.filter(status='SUCCESS', id__gt=after_id, id__lte=upto_id)
+    credits = (
+        in_range.filter(receiver_id__in=user_ids, tx_type__in=CREDIT_RECEIVER_TYPES)
+        .values('receiver_id')
+        .annotate(total=Sum('amount_tc'))
+        .values_list('receiver_id', 'total')
+    )
+    for user_id, total in credits:
+        deltas[user_id] += total or Decimal('0.00')
+    debits = (
+        in_range.filter(sender_id__in=user_ids, tx_type__in=DEBIT_SENDER_TYPES)
+        .values('sender_id')
+        .annotate(total=Sum('amount_tc'))
+        .values_list('sender_id', 'total')
+    )
+    for user_id, total in debits:
+        deltas[user_id] -= total or Decimal('0.00')
+    return deltas
+
+
+def ledger_deltas_since(starts, upto_id):
+    """Like ``ledger_deltas`` with a per-user start: ``starts`` is {user_id: after_id}.
+
+    Users are grouped by start id; checkpoints written in one run share their
+    id, so this is a handful of queries rather than one per user.
+    """
+    by_start = defaultdict(list)
+    for user_id, after_id in starts.items():
+        by_start[after_id].append(user_id)
+    deltas = defaultdict(Decimal)
+    for after_id, user_ids in by_start.items():
+        for user_id, delta in ledger_deltas(user_ids, after_id, upto_id).items():
+            deltas[user_id] += delta
+    return deltas
+
+
+def latest_checkpoints(user_ids, upto_id=None):
+    """Return {user_id: (as_of_tx_id, balance)} for each user's newest checkpoint at or before ``upto_id``."""
+    newest = LedgerCheckpoint.objects.filter(user_id=OuterRef('user_id'))
+    if upto_id is not None:
+        newest = newest.filter(as_of_tx_id__lte=upto_id)
+    newest = newest.order_by('-as_of_tx_id').values('as_of_tx_id')[:1]
+    rows = LedgerCheckpoint.objects.filter(user_id__in=list(user_ids), as_of_tx_id=Subquery(newest))
+    return {
+        user_id: (as_of_tx_id, balance)
+        for user_id, as_of_tx_id, balance in rows.values_list('user_id', 'as_of_tx_id', 'balance')
+    }
+
+
+def balance_as_of(user_id, tx_id):
+    """Ledger-derived TC balance of ``user_id`` right after ledger id ``tx_id``.
+
+    Walks forward from the newest checkpoint at or before ``tx_id`` or, when
+    the id predates every checkpoint, backward from the oldest later one.
+    Without checkpoints the whole history is summed from the signup bonus.
+    """
+    before = (
+        LedgerCheckpoint.objects.filter(user_id=user_id, as_of_tx_id__lte=tx_id)
+        .order_by('-as_of_tx_id')
+        .values_list('as_of_tx_id', 'balance')
+        .first()
+    )
+    if before is not None:
+        as_of_tx_id, balance = before
+        return balance + ledger_deltas([user_id], as_of_tx_id, tx_id)[user_id]
+
+    after = (
+        LedgerCheckpoint.objects.filter(user_id=user_id, as_of_tx_id__gt=tx_id)
+        .order_by('as_of_tx_id')
+        .values_list('as_of_tx_id', 'balance')
+        .first()
+    )
+    if after is not None:
+        as_of_tx_id, balance = after
+        return balance - ledger_deltas([user_id], tx_id, as_of_tx_id)[user_id]
+
+    return GENESIS_BALANCE + ledger_deltas([user_id], 0, tx_id)[user_id]
+
+
+def ledger_balance(user_id):
+    """Current ledger-derived balance: newest checkpoint plus activity since it."""
+    return balance_as_of(user_id, ledger_head())
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from hourskill_app.notification_templates import NOTIFICATION_ARCHIVE_AFTER_DAYS, archive_read_notifications
+
+
+class Command(BaseCommand):
+    help = (
+        "Move read notifications older than --older-than-days into NotificationArchive. Unread rows "
+        "are never moved, so unread counters are unaffected; run periodically."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days",
+            type=int,
+            default=NOTIFICATION_ARCHIVE_AFTER_DAYS,
+            help="Archive read notifications whose latest event is older than this many days.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of rows moved per transaction.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Count notifications that would be archived without moving them.",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        older_than_days = max(0, options["older_than_days"])
+        moved = archive_read_notifications(
+            older_than_days=older_than_days,
+            chunk_size=max(1, options["chunk_size"]),
+            dry_run=dry_run,
+        )
+        stats = {"older_than_days": older_than_days, "notifications_archived": moved}
+
+        mode = "DRY RUN" if dry_run else "APPLY"
+        self.stdout.write(self.style.SUCCESS(f"[{mode}] Read notifications archived."))
+        for key, value in stats.items():
+            self.stdout.write(f"{key.replace('_', ' ').capitalize()}: {value}")
@@ -0,0 +1,172 @@
+import random
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, transaction
+
+from hourskill_app.models import Transaction, User, Wallet
+from hourskill_app.money import reset_retry_metrics, retry_metrics, run_money_operation
+from hourskill_app.services import transfer_tc
+
+
+BENCH_PREFIX = "bench_money_"
+BENCH_TX_TYPE = "EARN_CREATOR"
+
+
+def _naive_transfer(locks, sender_id, receiver_id, amount):
+    # Pre-runner behaviour: sender first, then receiver, regardless of pk order.
+    sender_wallet = Wallet.objects.select_for_update().get(user_id=sender_id)
+    receiver_wallet = Wallet.objects.select_for_update().get(user_id=receiver_id)
+    sender_wallet.balance -= amount
+    receiver_wallet.balance += amount
+    sender_wallet.save(update_fields=["balance", "updated_at"])
+    receiver_wallet.save(update_fields=["balance", "updated_at"])
+    Transaction.objects.create(
+        sender_id=sender_id, receiver_id=receiver_id, tx_type=BENCH_TX_TYPE, amount_tc=amount, status="SUCCESS"
+    )
+
+
+def _naive_debit(locks, user_id, amount):
+    # Pre-guarded-UPDATE behaviour: lock, check in Python, then save.
+    wallet = Wallet.objects.select_for_update().get(user_id=user_id)
+    if wallet.balance < amount:
+        return None
+    wallet.balance -= amount
+    wallet.save(update_fields=["balance", "updated_at"])
+    return wallet.balance
+
+
+def _guarded_debit(locks, user_id, amount):
+    return locks.debit(user_id, amount)
+
+
+class Command(BaseCommand):
+    help = (
+        "Concurrency benchmark for money operations. Worker threads hit a small pool of throwaway users "
+        "with random opposite-direction transfers (--scenario transfer) or purchase-style debits "
+        "(--scenario debit), then report throughput, latency, failures and retry counters. --naive "
+        "runs the old code path for comparison: sender-then-receiver locking, or SELECT FOR UPDATE "
+        "plus a Python balance check instead of the guarded UPDATE. Writes to the configured "
+        "database; benchmark users and their rows are removed afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8, help="Concurrent worker threads.")
+        parser.add_argument("--operations", type=int, default=200, help="Transfers per thread.")
+        parser.add_argument("--users", type=int, default=4, help="Size of the user pool (small = more contention).")
+        parser.add_argument(
+            "--balance",
+            type=Decimal,
+            default=Decimal("1000.00"),
+            help="Starting TC of each benchmark user (small = debits refused for insufficient funds).",
+        )
+        parser.add_argument("--scenario", choices=("transfer", "debit"), default="transfer")
+        parser.add_argument(
+            "--naive",
+            action="store_true",
+            help="Run the pre-runner code path of the scenario for comparison.",
+        )
+        parser.add_argument("--keep", action="store_true", help="Keep benchmark users and ledger rows.")
+
+    def handle(self, *args, **options):
+        threads = max(1, options["threads"])
+        operations = max(1, options["operations"])
+        pool_size = max(2, options["users"])
+        naive = options["naive"]
+        scenario = options["scenario"]
+        balance = max(Decimal("0.00"), options["balance"])
+
+        if connection.vendor == "sqlite":
+            self.stdout.write(self.style.WARNING(
+                "SQLite serializes all writers; lock ordering and deadlock numbers are only meaningful on PostgreSQL/MySQL."
+            ))
+
+        user_ids = self._create_users(pool_size, balance)
+        reset_retry_metrics()
+        latencies = []
+        failures = []
+        # Only debits that committed move money; refused ones (insufficient funds) do not.
+        debited, refused = [], []
+        results_lock = threading.Lock()
+
+        def worker(seed):
+            rng = random.Random(seed)
+            users = {user.id: user for user in User.objects.filter(id__in=user_ids)}
+            local_latencies, local_failures, local_debited, local_refused = [], [], [], []
+            try:
+                for _ in range(operations):
+                    sender_id, receiver_id = rng.sample(user_ids, 2)
+                    amount = Decimal("1.00")
+                    started = time.perf_counter()
+                    try:
+                        if scenario == "debit":
+                            debit = _naive_debit if naive else _guarded_debit
+                            if run_money_operation("debit", debit, sender_id, amount) is not None:
+                                local_debited.append(amount)
+                            else:
+                                local_refused.append(amount)
+                        elif naive:
+                            run_money_operation("transfer", _naive_transfer, sender_id, receiver_id, amount)
+                        else:
+                            transfer_tc(users[sender_id], users[receiver_id], amount, BENCH_TX_TYPE)
+                    except (DatabaseError, ValueError) as exc:
+                        local_failures.append(type(exc).__name__)
+                    local_latencies.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+                with results_lock:
+                    latencies.extend(local_latencies)
+                    failures.extend(local_failures)
+                    debited.extend(local_debited)
+                    refused.extend(local_refused)
+
+        started = time.perf_counter()
+        workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        total = sum(Wallet.objects.filter(user_id__in=user_ids).values_list("balance", flat=True), Decimal("0.00"))
+        expected_total = balance * pool_size - sum(debited, Decimal("0.00"))
+        conserved = total == expected_total
+        if not options["keep"]:
+            self._cleanup(user_ids)
+
+        latencies.sort()
+        done = len(latencies)
+        mode = "NAIVE" if naive else "RUNNER"
+        self.stdout.write(self.style.SUCCESS(f"[{mode}] {done} {scenario} operations in {elapsed:.2f}s"))
+        self.stdout.write(f"Throughput: {done / elapsed:.1f} ops/s")
+        if latencies:
+            self.stdout.write(f"Latency p50: {latencies[done // 2] * 1000:.1f} ms")
+            self.stdout.write(f"Latency p95: {latencies[min(done - 1, int(done * 0.95))] * 1000:.1f} ms")
+            self.stdout.write(f"Latency max: {latencies[-1] * 1000:.1f} ms")
+        self.stdout.write(f"Failed operations: {len(failures)}")
+        if scenario == "debit":
+            self.stdout.write(f"Refused debits: {len(refused)}")
+        self.stdout.write(f"Balance conserved: {conserved}")
+        for name, counters in sorted(retry_metrics().items()):
+            summary = ", ".join(f"{key}={value}" for key, value in sorted(counters.items()))
+            self.stdout.write(f"Retry metrics {name}: {summary}")
+
+    def _create_users(self, pool_size, balance):
+        self._cleanup(list(User.objects.filter(username__startswith=BENCH_PREFIX).values_list("id", flat=True)))
+        user_ids = []
+        with transaction.atomic():
+            for index in range(pool_size):
+                user = User.objects.create_user(f"{BENCH_PREFIX}{index}", password=None)
+                Wallet.objects.update_or_create(user=user, defaults={"balance": balance})
+                user_ids.append(user.id)
+        return user_ids
+
+    def _cleanup(self, user_ids):
+        if not user_ids:
+            return
+        with transaction.atomic():
+            Transaction.objects.filter(sender_id__in=user_ids).delete()
+            Transaction.objects.filter(receiver_id__in=user_ids).delete()
+            User.objects.filter(id__in=user_ids).delete()
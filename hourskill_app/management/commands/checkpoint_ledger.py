@@ -0,0 +1,131 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from hourskill_app.ledger import (
+    GENESIS_BALANCE,
+    latest_checkpoints,
+    ledger_deltas,
+    ledger_deltas_since,
+    ledger_head,
+)
+from hourskill_app.models import LedgerCheckpoint, Transaction, Wallet
+
+
+class Command(BaseCommand):
+    help = (
+        "Write per-user ledger checkpoints at the current ledger head and audit wallets against them. "
+        "Only users with ledger activity since the previous run are visited (all wallets with --full), "
+        "so a run costs time proportional to new activity. Each expected balance is the previous "
+        "checkpoint plus the ledger delta since it; wallets that disagree are reported as drift. "
+        "Use --dry-run to audit without writing checkpoints."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of users checkpointed per transaction.",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Visit every wallet, not only users with ledger activity since the last run.",
+        )
+        parser.add_argument(
+            "--seed-from-wallet",
+            action="store_true",
+            help="For users without a checkpoint, trust the current wallet balance instead of "
+            "replaying their whole ledger from the signup bonus (for history older than the ledger).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report drift without writing checkpoints.",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = max(1, options["chunk_size"])
+        dry_run = options["dry_run"]
+        seed_from_wallet = options["seed_from_wallet"]
+
+        stats = {
+            "users_checked": 0,
+            "checkpoints_created": 0,
+            "checkpoints_seeded": 0,
+            "wallets_drifted": 0,
+        }
+
+        head = ledger_head()
+        # Every checkpoint of a run shares the run's head, so the newest one marks the last run.
+        previous_head = LedgerCheckpoint.objects.aggregate(head=Max("as_of_tx_id"))["head"] or 0
+        if options["full"]:
+            user_ids = list(Wallet.objects.order_by("user_id").values_list("user_id", flat=True))
+        else:
+            user_ids = self._active_user_ids(previous_head, head)
+
+        drift = []
+        for index in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[index:index + chunk_size]
+            with transaction.atomic():
+                drift.extend(self._checkpoint_chunk(chunk, head, seed_from_wallet, stats, dry_run))
+
+        stats["wallets_drifted"] = len(drift)
+        mode = "DRY RUN" if dry_run else "APPLY"
+        self.stdout.write(self.style.SUCCESS(f"[{mode}] Ledger checkpointed at transaction {head}."))
+        for key, value in stats.items():
+            self.stdout.write(f"{key.replace('_', ' ').capitalize()}: {value}")
+        for user_id, expected, actual in drift:
+            self.stdout.write(f"Drift user={user_id} ledger={expected} wallet={actual}")
+
+    def _active_user_ids(self, after_id, upto_id):
+        new_rows = Transaction.objects.filter(id__gt=after_id, id__lte=upto_id).order_by()
+        user_ids = set(new_rows.exclude(sender_id=None).values_list("sender_id", flat=True).distinct())
+        user_ids.update(new_rows.exclude(receiver_id=None).values_list("receiver_id", flat=True).distinct())
+        return sorted(user_ids)
+
+    def _checkpoint_chunk(self, user_ids, head, seed_from_wallet, stats, dry_run):
+        # Money operations lock or update the wallet row before writing their ledger row, so once these
+        # locks are held every ledger row for these users has committed. Rows committed after `head`
+        # was read are already in the balances, so they are read too (up to `locked_head`) and added
+        # to the expectation; the checkpoints themselves stay at the run's shared `head`.
+        wallets = dict(
+            Wallet.objects.select_for_update()
+            .filter(user_id__in=user_ids)
+            .order_by("user_id")
+            .values_list("user_id", "balance")
+        )
+        locked_head = ledger_head()
+        since_head = ledger_deltas(wallets, head, locked_head)
+        previous = latest_checkpoints(wallets, upto_id=head)
+
+        starts = {}
+        for user_id in wallets:
+            if user_id in previous:
+                starts[user_id] = previous[user_id][0]
+            elif not seed_from_wallet:
+                starts[user_id] = 0
+        deltas = ledger_deltas_since(starts, head)
+
+        drift = []
+        checkpoints = []
+        for user_id, actual in wallets.items():
+            stats["users_checked"] += 1
+            if user_id in starts:
+                opening = previous[user_id][1] if user_id in previous else GENESIS_BALANCE
+                expected = opening + deltas[user_id]
+                if expected + since_head[user_id] != actual:
+                    drift.append((user_id, expected + since_head[user_id], actual))
+                if user_id not in previous or previous[user_id][0] != head:
+                    checkpoints.append(LedgerCheckpoint(user_id=user_id, as_of_tx_id=head, balance=expected))
+            else:
+                checkpoints.append(LedgerCheckpoint(
+                    user_id=user_id, as_of_tx_id=head, balance=actual - since_head[user_id], seeded=True,
+                ))
+                stats["checkpoints_seeded"] += 1
+
+        stats["checkpoints_created"] += len(checkpoints)
+        if not dry_run and checkpoints:
+            LedgerCheckpoint.objects.bulk_create(checkpoints)
+        return drift
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from hourskill_app.notification_outbox import drain_outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Deliver queued notification events: render their texts and bulk-create Notification rows "
+        "in batches, deleting each batch from the outbox in the same transaction. Several workers "
+        "can run at once where the database supports SKIP LOCKED. Use --loop to keep polling."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of outbox events delivered per transaction.",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep running and poll the outbox when it is empty.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds to sleep between polls of an empty outbox (with --loop).",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options["batch_size"])
+        stats = {"events_processed": 0, "notifications_created": 0}
+        try:
+            while True:
+                events, notifications = drain_outbox(batch_size)
+                stats["events_processed"] += events
+                stats["notifications_created"] += notifications
+                if events:
+                    continue
+                if not options["loop"]:
+                    break
+                time.sleep(max(0.05, options["interval"]))
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS("Notification outbox drained."))
+        for key, value in stats.items():
+            self.stdout.write(f"{key.replace('_', ' ').capitalize()}: {value}")
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from hourskill_app.watch_heartbeats import WATCH_HEARTBEAT_FLUSH_INTERVAL, flush_heartbeats
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply buffered watch heartbeats to WatchSession.watched_seconds with one bulk UPDATE per "
+        "batch. Needs the shared cache the web workers write to; with a per-process cache nothing "
+        "is buffered, since pings are written straight to WatchSession. Use --loop to keep "
+        "flushing periodically."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of buffered sessions applied per UPDATE.",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep running and flush every --interval seconds.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=WATCH_HEARTBEAT_FLUSH_INTERVAL,
+            help="Seconds to sleep between flushes (with --loop).",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options["batch_size"])
+        stats = {"sessions_updated": 0, "seconds_applied": 0}
+        try:
+            while True:
+                sessions, seconds = flush_heartbeats(batch_size)
+                stats["sessions_updated"] += sessions
+                stats["seconds_applied"] += seconds
+                if not options["loop"]:
+                    break
+                time.sleep(max(0.05, options["interval"]))
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS("Watch heartbeats flushed."))
+        for key, value in stats.items():
+            self.stdout.write(f"{key.replace('_', ' ').capitalize()}: {value}")
@@ -0,0 +1,24 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from hourskill_app.creator_revenue import creators_with_unfolded_revenue, fold_creator_revenue
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold journaled creator revenue entries into CreatorAccount.pending_vnd/total_earned_vnd "
+        "and CreatorStats.revenue_vnd. Each creator is folded in its own short transaction; run periodically."
+    )
+
+    def handle(self, *args, **options):
+        stats = {"creators_folded": 0, "vnd_folded": Decimal("0.00")}
+        for creator_id in creators_with_unfolded_revenue():
+            total = fold_creator_revenue(creator_id)
+            if total:
+                stats["creators_folded"] += 1
+                stats["vnd_folded"] += total
+
+        self.stdout.write(self.style.SUCCESS("Creator revenue folded."))
+        for key, value in stats.items():
+            self.stdout.write(f"{key.replace('_', ' ').capitalize()}: {value}")
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from hourskill_app.idempotency import IDEMPOTENCY_KEY_TTL, purge_expired_idempotency_keys
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete stored Idempotency-Key responses older than IDEMPOTENCY_KEY_TTL. Expired keys are "
+        "never replayed, so this only keeps the table compact; run periodically."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of rows deleted per statement.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Count expired keys without deleting them.",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        removed = purge_expired_idempotency_keys(chunk_size=max(1, options["chunk_size"]), dry_run=dry_run)
+        stats = {"window_seconds": IDEMPOTENCY_KEY_TTL, "keys_expired": removed}
+
+        mode = "DRY RUN" if dry_run else "APPLY"
+        self.stdout.write(self.style.SUCCESS(f"[{mode}] Expired idempotency keys purged."))
+        for key, value in stats.items():
+            self.stdout.write(f"{key.replace('_', ' ').capitalize()}: {value}")
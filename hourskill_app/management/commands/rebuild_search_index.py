@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from hourskill_app.search import rebuild_search_index, search_backend
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the catalog search index (SearchDocument rows and the backend full-text index) "
+        "from active videos and courses. Use after bulk imports or updates that bypass save hooks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of rows fetched per database round trip.",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = max(1, options["chunk_size"])
+
+        with transaction.atomic():
+            videos, courses = rebuild_search_index(chunk_size=chunk_size)
+
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
+        self.stdout.write(f"Backend: {search_backend()}")
+        self.stdout.write(f"Videos indexed: {videos}")
+        self.stdout.write(f"Courses indexed: {courses}")
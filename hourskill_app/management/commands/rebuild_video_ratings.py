@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+
+from hourskill_app.models import CommentReview, Video
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute Video.rating_count / rating_sum from CommentReview in id-range chunks. "
+        "Use --dry-run to report drift without writing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of video ids processed per transaction.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report drifted rows without writing to database.",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = max(1, options["chunk_size"])
+        dry_run = options["dry_run"]
+
+        max_id = Video.objects.aggregate(max_id=Max("id"))["max_id"] or 0
+        stats = {"videos_scanned": 0, "videos_fixed": 0}
+
+        for start in range(1, max_id + 1, chunk_size):
+            end = start + chunk_size
+
+            with transaction.atomic():
+                # Lock the chunk first so concurrent reviews wait and apply on top of the rebuild.
+                videos = list(
+                    Video.objects.select_for_update()
+                    .filter(id__gte=start, id__lt=end)
+                    .only("id", "rating_count", "rating_sum")
+                )
+                if not videos:
+                    continue
+
+                totals = {
+                    row["video_id"]: (row["count"], row["total"] or 0)
+                    for row in (
+                        CommentReview.objects.filter(
+                            video_id__gte=start,
+                            video_id__lt=end,
+                            rating__isnull=False,
+                        )
+                        .values("video_id")
+                        .annotate(count=Count("id"), total=Sum("rating"))
+                        .order_by()
+                    )
+                }
+
+                drifted = []
+                for video in videos:
+                    stats["videos_scanned"] += 1
+                    count, total = totals.get(video.id, (0, 0))
+                    if video.rating_count != count or video.rating_sum != total:
+                        video.rating_count = count
+                        video.rating_sum = total
+                        drifted.append(video)
+
+                stats["videos_fixed"] += len(drifted)
+                if drifted and not dry_run:
+                    Video.objects.bulk_update(drifted, ["rating_count", "rating_sum"])
+
+        mode = "DRY RUN" if dry_run else "APPLY"
+        self.stdout.write(self.style.SUCCESS(f"[{mode}] Video rating aggregates rebuilt."))
+        self.stdout.write(f"Videos scanned: {stats['videos_scanned']}")
+        self.stdout.write(f"Videos with drifted counters: {stats['videos_fixed']}")
@@ -0,0 +1,87 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from hourskill_app.auth import invalidate_user_snapshot
+from hourskill_app.models import User, UserProfile, Wallet
+
+
+PROFILE_DEFAULTS = {
+    "notify_comments": True,
+    "notify_follows": True,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the profile and wallet rows that GET endpoints only read and never create. "
+        "Balance and VIP state live on the wallet row alone, so there is nothing else to mirror. "
+        "Runs in id-range chunks; use --dry-run to report missing rows without writing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of user ids processed per transaction.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report missing rows without writing to database.",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = max(1, options["chunk_size"])
+        dry_run = options["dry_run"]
+
+        stats = {
+            "users_scanned": 0,
+            "profiles_created": 0,
+            "wallets_created": 0,
+        }
+
+        max_id = User.objects.aggregate(max_id=Max("id"))["max_id"] or 0
+        for start in range(1, max_id + 1, chunk_size):
+            with transaction.atomic():
+                changed_user_ids = self._reconcile_chunk(start, start + chunk_size, stats, dry_run)
+            for user_id in changed_user_ids:
+                invalidate_user_snapshot(user_id)
+
+        mode = "DRY RUN" if dry_run else "APPLY"
+        self.stdout.write(self.style.SUCCESS(f"[{mode}] Account state reconciled."))
+        for key, value in stats.items():
+            self.stdout.write(f"{key.replace('_', ' ').capitalize()}: {value}")
+
+    def _reconcile_chunk(self, start, end, stats, dry_run):
+        user_ids = list(User.objects.filter(id__gte=start, id__lt=end).values_list("id", flat=True))
+        stats["users_scanned"] += len(user_ids)
+        if not user_ids:
+            return []
+
+        with_profile = set(UserProfile.objects.filter(user_id__in=user_ids).values_list("user_id", flat=True))
+        with_wallet = set(Wallet.objects.filter(user_id__in=user_ids).values_list("user_id", flat=True))
+        new_profiles = [
+            UserProfile(user_id=user_id, **PROFILE_DEFAULTS) for user_id in user_ids if user_id not in with_profile
+        ]
+        new_wallets = [
+            Wallet(user_id=user_id, balance=Decimal("30.00")) for user_id in user_ids if user_id not in with_wallet
+        ]
+        stats["profiles_created"] += len(new_profiles)
+        stats["wallets_created"] += len(new_wallets)
+
+        if dry_run:
+            return []
+
+        # ignore_conflicts: a signup racing this chunk may have created the row meanwhile.
+        if new_profiles:
+            UserProfile.objects.bulk_create(new_profiles, ignore_conflicts=True)
+        if new_wallets:
+            Wallet.objects.bulk_create(new_wallets, ignore_conflicts=True)
+
+        touched = {profile.user_id for profile in new_profiles}
+        touched.update(wallet.user_id for wallet in new_wallets)
+        return sorted(touched)
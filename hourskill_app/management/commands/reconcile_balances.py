@@ -0,0 +1,180 @@
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from hourskill_app.auth import invalidate_user_snapshot
+from hourskill_app.ledger import (
+    GENESIS_BALANCE,
+    balance_as_of,
+    latest_checkpoints,
+    ledger_deltas_since,
+    ledger_head,
+)
+from hourskill_app.models import LedgerCheckpoint, Wallet
+
+
+def _init_worker():
+    import django
+
+    # Spawned workers start without Django configured; forked ones already are.
+    django.setup()
+
+
+def _expected_balances(user_ids, head):
+    """Ledger balance per user at ``head``: newest checkpoint plus the delta since it."""
+    previous = latest_checkpoints(user_ids, upto_id=head)
+    starts = {user_id: previous[user_id][0] if user_id in previous else 0 for user_id in user_ids}
+    deltas = ledger_deltas_since(starts, head)
+    return {
+        user_id: (previous[user_id][1] if user_id in previous else GENESIS_BALANCE) + deltas[user_id]
+        for user_id in user_ids
+    }
+
+
+def _confirm(user_id, repair, from_genesis=False):
+    """Re-check one suspected drift under the wallet lock; returns (wallet, ledger, repaired) or None.
+
+    A wallet without any checkpoint is only repaired with ``from_genesis``: its
+    ledger balance is then the signup bonus plus the whole history, which is
+    wrong for accounts whose early rows predate the ledger.
+    """
+    with transaction.atomic():
+        wallet = Wallet.objects.select_for_update().filter(user_id=user_id).first()
+        if wallet is None:
+            return None
+        # With the wallet locked, every ledger row for this user has committed.
+        expected = balance_as_of(user_id, ledger_head())
+        if wallet.balance == expected:
+            return None
+        if repair and not from_genesis:
+            repair = LedgerCheckpoint.objects.filter(user_id=user_id).exists()
+        if repair:
+            Wallet.objects.filter(pk=wallet.pk).update(balance=expected, updated_at=timezone.now())
+    if repair:
+        invalidate_user_snapshot(user_id)
+    return wallet.balance, expected, repair
+
+
+def _scan_range(start, end, repair, from_genesis=False):
+    """Audit wallets with user_id in [start, end); runs in a worker process."""
+    drift = []
+    # The first pass reads without locks; a user that moved money between the wallet read and
+    # the ledger sums looks drifted, so candidates are confirmed one by one under a short lock.
+    wallets = Wallet.objects.filter(user_id__gte=start, user_id__lt=end).order_by()
+    head = ledger_head()
+    balances = dict(wallets.values_list("user_id", "balance").iterator())
+    expected = _expected_balances(list(balances), head)
+    for user_id, balance in balances.items():
+        if balance == expected[user_id]:
+            continue
+        confirmed = _confirm(user_id, repair, from_genesis)
+        if confirmed is not None:
+            drift.append((user_id, *confirmed))
+    return len(balances), drift
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare every Wallet.balance with the balance derived from the Transaction ledger "
+        "(latest ledger checkpoint plus the delta since it) and write a drift report. "
+        "Wallets are streamed in user-id ranges fanned out over a process pool; ranges are read "
+        "without locks and only suspected drift is re-checked under a short per-wallet lock. "
+        "Use --repair to set drifted wallets to their ledger balance; wallets without a checkpoint "
+        "are only repaired with --from-genesis."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Number of user ids audited per range.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=min(4, os.cpu_count() or 1),
+            help="Worker processes; 1 runs in this process.",
+        )
+        parser.add_argument(
+            "--report",
+            default="",
+            help="Write drifted wallets as CSV to this path ('-' for stdout).",
+        )
+        parser.add_argument(
+            "--repair",
+            action="store_true",
+            help="Set drifted wallet balances to the ledger balance.",
+        )
+        parser.add_argument(
+            "--from-genesis",
+            action="store_true",
+            help="With --repair, also repair wallets that have no ledger checkpoint, "
+            "using the signup bonus plus their whole ledger history.",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = max(1, options["chunk_size"])
+        workers = max(1, options["workers"])
+        repair = options["repair"]
+        from_genesis = options["from_genesis"]
+
+        bounds = Wallet.objects.aggregate(low=Min("user_id"), high=Max("user_id"))
+        ranges = []
+        if bounds["low"] is not None:
+            ranges = [(start, start + chunk_size) for start in range(bounds["low"], bounds["high"] + 1, chunk_size)]
+
+        stats = {"wallets_scanned": 0, "wallets_drifted": 0, "wallets_repaired": 0, "wallets_left_unrepaired": 0}
+        drift = []
+        if workers == 1:
+            results = (_scan_range(start, end, repair, from_genesis) for start, end in ranges)
+            self._collect(results, stats, drift)
+        else:
+            # Workers must open their own connections, never share the parent's.
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                results = pool.map(
+                    _scan_range,
+                    [start for start, _ in ranges],
+                    [end for _, end in ranges],
+                    [repair] * len(ranges),
+                    [from_genesis] * len(ranges),
+                )
+                self._collect(results, stats, drift)
+
+        if options["report"]:
+            self._write_report(options["report"], sorted(drift))
+
+        mode = "REPAIR" if repair else "REPORT"
+        self.stdout.write(self.style.SUCCESS(f"[{mode}] Wallet balances reconciled against the ledger."))
+        for key, value in stats.items():
+            self.stdout.write(f"{key.replace('_', ' ').capitalize()}: {value}")
+        if repair and stats["wallets_left_unrepaired"]:
+            self.stdout.write(self.style.WARNING(
+                "Wallets without a ledger checkpoint were left unrepaired; "
+                "run checkpoint_ledger first or pass --from-genesis."
+            ))
+
+    def _collect(self, results, stats, drift):
+        for scanned, rows in results:
+            stats["wallets_scanned"] += scanned
+            stats["wallets_drifted"] += len(rows)
+            stats["wallets_repaired"] += sum(1 for row in rows if row[3])
+            stats["wallets_left_unrepaired"] += sum(1 for row in rows if not row[3])
+            drift.extend(rows)
+
+    def _write_report(self, path, drift):
+        handle = self.stdout if path == "-" else open(path, "w", newline="")
+        try:
+            writer = csv.writer(handle)
+            writer.writerow(["user_id", "wallet_balance", "ledger_balance", "difference", "repaired"])
+            for user_id, wallet_balance, ledger_balance, repaired in drift:
+                writer.writerow([user_id, wallet_balance, ledger_balance, wallet_balance - ledger_balance, int(repaired)])
+        finally:
+            if handle is not self.stdout:
+                handle.close()
@@ -0,0 +1,87 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max
+
+from hourskill_app.creator_stats import refresh_creator_stats
+from hourskill_app.models import CreatorStats, Follow, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare CreatorStats.follower_count / following_count with the Follow table in user-id chunks "
+        "and repair drift. Use --dry-run to only report."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of user ids checked per transaction.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report drifted rows without writing to database.",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = max(1, options["chunk_size"])
+        dry_run = options["dry_run"]
+
+        stats = {"rows_checked": 0, "rows_fixed": 0, "rows_created": 0}
+        max_id = User.objects.aggregate(max_id=Max("id"))["max_id"] or 0
+
+        for start in range(1, max_id + 1, chunk_size):
+            end = start + chunk_size
+            with transaction.atomic():
+                stored = {
+                    row.user_id: row
+                    for row in CreatorStats.objects.select_for_update()
+                    .filter(user_id__gte=start, user_id__lt=end)
+                    .only("id", "user_id", "follower_count", "following_count")
+                }
+                followers = dict(
+                    Follow.objects.filter(following_id__gte=start, following_id__lt=end)
+                    .values("following_id")
+                    .annotate(total=Count("id"))
+                    .order_by()
+                    .values_list("following_id", "total")
+                )
+                following = dict(
+                    Follow.objects.filter(follower_id__gte=start, follower_id__lt=end)
+                    .values("follower_id")
+                    .annotate(total=Count("id"))
+                    .order_by()
+                    .values_list("follower_id", "total")
+                )
+
+                drifted = []
+                missing = []
+                for user_id in set(stored) | set(followers) | set(following):
+                    expected_followers = followers.get(user_id, 0)
+                    expected_following = following.get(user_id, 0)
+                    row = stored.get(user_id)
+                    if row is None:
+                        missing.append(user_id)
+                        continue
+                    stats["rows_checked"] += 1
+                    if row.follower_count != expected_followers or row.following_count != expected_following:
+                        row.follower_count = expected_followers
+                        row.following_count = expected_following
+                        drifted.append(row)
+
+                stats["rows_fixed"] += len(drifted)
+                stats["rows_created"] += len(missing)
+                if not dry_run:
+                    if drifted:
+                        CreatorStats.objects.bulk_update(drifted, ["follower_count", "following_count"])
+                    if missing:
+                        # Build full rows so the other aggregates are not left at zero.
+                        refresh_creator_stats(missing)
+
+        mode = "DRY RUN" if dry_run else "APPLY"
+        self.stdout.write(self.style.SUCCESS(f"[{mode}] Follow counters reconciled."))
+        self.stdout.write(f"Rows checked: {stats['rows_checked']}")
+        self.stdout.write(f"Rows with drifted counters: {stats['rows_fixed']}")
+        self.stdout.write(f"Missing rows: {stats['rows_created']}")
@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max
+
+from hourskill_app.models import Notification, NotificationCounter, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare NotificationCounter.unread_count with the unread Notification rows in user-id chunks "
+        "and repair drift. Use --dry-run to only report."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of user ids checked per transaction.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report drifted rows without writing to database.",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = max(1, options["chunk_size"])
+        dry_run = options["dry_run"]
+
+        stats = {"rows_checked": 0, "rows_fixed": 0, "rows_created": 0}
+        max_id = User.objects.aggregate(max_id=Max("id"))["max_id"] or 0
+
+        for start in range(1, max_id + 1, chunk_size):
+            end = start + chunk_size
+            with transaction.atomic():
+                # Locked so deliveries and mark-read for these users wait until the chunk is fixed.
+                stored = {
+                    row.user_id: row
+                    for row in NotificationCounter.objects.select_for_update()
+                    .filter(user_id__gte=start, user_id__lt=end)
+                    .only("id", "user_id", "unread_count")
+                }
+                unread = dict(
+                    Notification.objects.filter(recipient_id__gte=start, recipient_id__lt=end, is_read=False)
+                    .values("recipient_id")
+                    .annotate(total=Count("id"))
+                    .order_by()
+                    .values_list("recipient_id", "total")
+                )
+
+                drifted = []
+                missing = []
+                for user_id in set(stored) | set(unread):
+                    expected = unread.get(user_id, 0)
+                    row = stored.get(user_id)
+                    if row is None:
+                        missing.append(NotificationCounter(user_id=user_id, unread_count=expected))
+                        continue
+                    stats["rows_checked"] += 1
+                    if row.unread_count != expected:
+                        row.unread_count = expected
+                        drifted.append(row)
+
+                stats["rows_fixed"] += len(drifted)
+                stats["rows_created"] += len(missing)
+                if not dry_run:
+                    if drifted:
+                        NotificationCounter.objects.bulk_update(drifted, ["unread_count"])
+                    if missing:
+                        NotificationCounter.objects.bulk_create(missing, ignore_conflicts=True)
+
+        mode = "DRY RUN" if dry_run else "APPLY"
+        self.stdout.write(self.style.SUCCESS(f"[{mode}] Unread notification counters reconciled."))
+        self.stdout.write(f"Rows checked: {stats['rows_checked']}")
+        self.stdout.write(f"Rows with drifted counters: {stats['rows_fixed']}")
+        self.stdout.write(f"Missing rows: {stats['rows_created']}")
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from hourskill_app.creator_stats import rank_creators, refresh_creator_stats
+from hourskill_app.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the CreatorStats read model from videos, watch sessions, follows and the ledger. "
+        "Processes users in id-range chunks; use --user to refresh specific creators. "
+        "Re-ranks the teachers leaderboard afterwards; --rank-only skips the rebuild (cheap, cron-friendly)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of user ids processed per transaction.",
+        )
+        parser.add_argument(
+            "--user",
+            type=int,
+            action="append",
+            default=[],
+            help="Refresh only this user id (repeatable).",
+        )
+        parser.add_argument(
+            "--rank-only",
+            action="store_true",
+            help="Only recompute leaderboard ranks from existing stats rows.",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = max(1, options["chunk_size"])
+        only_ids = options["user"]
+
+        rows_written = 0
+        if not options["rank_only"]:
+            rows_written = self._refresh(only_ids, chunk_size)
+
+        with transaction.atomic():
+            ranked = rank_creators()
+
+        self.stdout.write(self.style.SUCCESS("Creator stats refreshed."))
+        self.stdout.write(f"Rows written: {rows_written}")
+        self.stdout.write(f"Creators ranked: {ranked}")
+
+    def _refresh(self, only_ids, chunk_size):
+        if only_ids:
+            with transaction.atomic():
+                return refresh_creator_stats(only_ids)
+
+        rows_written = 0
+        max_id = User.objects.aggregate(max_id=Max("id"))["max_id"] or 0
+        for start in range(1, max_id + 1, chunk_size):
+            user_ids = list(
+                User.objects.filter(id__gte=start, id__lt=start + chunk_size).values_list("id", flat=True)
+            )
+            with transaction.atomic():
+                rows_written += refresh_creator_stats(user_ids)
+        return rows_written
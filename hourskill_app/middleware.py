@@ -5,9 +5,21 @@ from django.http import JsonResponse
 from django.shortcuts import redirect
 from django.utils.deprecation import MiddlewareMixin
 from django.core.cache import cache
-from django.utils import timezone
 
-from .models import UserProfile
+from .auth import resolve_request_user
+
+
+class BearerAuthMiddleware(MiddlewareMixin):
+    """Resolve the API bearer token once and attach the user to the request.
+
+    Views read ``request.auth_user`` through ``_get_auth_user``; the user
+    (and its profile, when one exists) comes from the cached snapshot in
+    ``hourskill_app.auth`` instead of a fresh query per helper call.
+    """
+
+    def process_request(self, request):
+        resolve_request_user(request)
+        return None
 
 
 class SingleSessionMiddleware(MiddlewareMixin):
@@ -70,7 +82,7 @@ class SingleSessionMiddleware(MiddlewareMixin):
 
 
 class VipAccessMiddleware(MiddlewareMixin):
-    """Attach VIP access state to request and expire outdated subscriptions."""
+    """Attach VIP access state (read from the user's Wallet) to request."""
 
     def process_request(self, request):
         user = getattr(request, 'user', None)
@@ -79,21 +91,7 @@ class VipAccessMiddleware(MiddlewareMixin):
             return None
 
         try:
-            profile, _ = UserProfile.objects.get_or_create(user=user)
-            expiry = profile.vip_expiry or user.vip_expiry
-            flagged = bool(profile.is_vip or user.is_vip)
-            active = bool(flagged and expiry and expiry > timezone.now())
-
-            if flagged and expiry and expiry <= timezone.now():
-                profile.is_vip = False
-                profile.vip_expiry = None
-                profile.save(update_fields=['is_vip', 'vip_expiry'])
-                user.is_vip = False
-                user.vip_expiry = None
-                user.save(update_fields=['is_vip', 'vip_expiry'])
-                active = False
-
-            request.vip_active = active
+            request.vip_active = user.is_vip
         except Exception:
             request.vip_active = False
 
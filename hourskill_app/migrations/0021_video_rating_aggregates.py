@@ -0,0 +1,40 @@
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    CommentReview = apps.get_model('hourskill_app', 'CommentReview')
+    Video = apps.get_model('hourskill_app', 'Video')
+
+    totals = (
+        CommentReview.objects.filter(rating__isnull=False)
+        .values('video_id')
+        .annotate(count=Count('id'), total=Sum('rating'))
+        .order_by()
+    )
+    for row in totals.iterator():
+        Video.objects.filter(pk=row['video_id']).update(
+            rating_count=row['count'],
+            rating_sum=row['total'] or 0,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hourskill_app', '0020_remove_course_bundle_price_tc'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='rating_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='rating_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
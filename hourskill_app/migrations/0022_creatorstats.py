@@ -0,0 +1,70 @@
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_creator_stats(apps, schema_editor):
+    CreatorStats = apps.get_model('hourskill_app', 'CreatorStats')
+    Follow = apps.get_model('hourskill_app', 'Follow')
+    Transaction = apps.get_model('hourskill_app', 'Transaction')
+    Video = apps.get_model('hourskill_app', 'Video')
+    WatchSession = apps.get_model('hourskill_app', 'WatchSession')
+
+    stats = {}
+
+    def _row(creator_id):
+        return stats.setdefault(creator_id, {})
+
+    active = Video.objects.filter(is_active=True, is_deleted=False)
+    for row in active.values('creator_id').annotate(
+        videos=Count('id'), r_sum=Sum('rating_sum'), r_count=Sum('rating_count')
+    ).order_by():
+        _row(row['creator_id']).update(
+            video_count=row['videos'],
+            rating_sum=row['r_sum'] or 0,
+            rating_count=row['r_count'] or 0,
+        )
+    for row in WatchSession.objects.filter(video__is_active=True, video__is_deleted=False).values(
+        'video__creator_id'
+    ).annotate(views=Count('id')).order_by():
+        _row(row['video__creator_id'])['total_views'] = row['views']
+    for row in Follow.objects.values('following_id').annotate(followers=Count('id')).order_by():
+        _row(row['following_id'])['follower_count'] = row['followers']
+    for row in Transaction.objects.filter(
+        tx_type='CONTENT_SALE', amount_vnd__gt=0, receiver__isnull=False
+    ).values('receiver_id').annotate(revenue=Sum('amount_vnd')).order_by():
+        _row(row['receiver_id'])['revenue_vnd'] = row['revenue'] or Decimal('0.00')
+
+    CreatorStats.objects.bulk_create(
+        [CreatorStats(user_id=creator_id, **values) for creator_id, values in stats.items()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hourskill_app', '0021_video_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CreatorStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_views', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('rating_count', models.IntegerField(default=0)),
+                ('follower_count', models.IntegerField(default=0)),
+                ('video_count', models.IntegerField(default=0)),
+                ('revenue_vnd', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=models.deletion.CASCADE, related_name='creator_stats', to='hourskill_app.user')),
+            ],
+            options={
+                'verbose_name_plural': 'Creator stats',
+            },
+        ),
+        migrations.RunPython(backfill_creator_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+from django.db import migrations, models
+from django.db.models import Case, F, FloatField, Value, When
+
+
+def assign_initial_ranks(apps, schema_editor):
+    CreatorStats = apps.get_model('hourskill_app', 'CreatorStats')
+
+    ordered = (
+        CreatorStats.objects.filter(video_count__gt=0)
+        .annotate(
+            avg_rating_value=Case(
+                When(rating_count__gt=0, then=F('rating_sum') * 1.0 / F('rating_count')),
+                default=Value(0.0),
+                output_field=FloatField(),
+            ),
+        )
+        .order_by('-total_views', '-avg_rating_value', 'user__username', 'user_id')
+    )
+    rows = []
+    for position, stats in enumerate(ordered, start=1):
+        stats.rank = position
+        rows.append(stats)
+    CreatorStats.objects.bulk_update(rows, ['rank'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hourskill_app', '0022_creatorstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='creatorstats',
+            name='rank',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='creatorstats',
+            index=models.Index(fields=['rank', 'user'], name='creatorstats_rank_user_idx'),
+        ),
+        migrations.RunPython(assign_initial_ranks, migrations.RunPython.noop),
+    ]
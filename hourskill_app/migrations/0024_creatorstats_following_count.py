@@ -0,0 +1,28 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_following_count(apps, schema_editor):
+    CreatorStats = apps.get_model('hourskill_app', 'CreatorStats')
+    Follow = apps.get_model('hourskill_app', 'Follow')
+
+    for row in Follow.objects.values('follower_id').annotate(following=Count('id')).order_by().iterator():
+        updated = CreatorStats.objects.filter(user_id=row['follower_id']).update(following_count=row['following'])
+        if not updated:
+            CreatorStats.objects.create(user_id=row['follower_id'], following_count=row['following'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hourskill_app', '0023_creatorstats_rank'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='creatorstats',
+            name='following_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_following_count, migrations.RunPython.noop),
+    ]
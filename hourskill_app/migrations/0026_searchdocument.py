@@ -0,0 +1,109 @@
+import re
+import unicodedata
+
+from django.db import migrations, models, transaction
+from django.db.utils import OperationalError
+
+
+FTS_TABLE = 'hourskill_search_fts'
+DOCUMENT_TABLE = 'hourskill_app_searchdocument'
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def fold_text(value):
+    """Frozen copy of search.fold_text as of this migration."""
+    if not value:
+        return ''
+    value = str(value).replace('đ', 'd').replace('Đ', 'D')
+    decomposed = unicodedata.normalize('NFKD', value)
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return ' '.join(_TOKEN_RE.findall(stripped.lower()))
+
+
+def create_fulltext_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f'ALTER TABLE {DOCUMENT_TABLE} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ('
+            "setweight(to_tsvector('simple', title), 'A') || "
+            "setweight(to_tsvector('simple', category), 'B') || "
+            "setweight(to_tsvector('simple', body), 'C')) STORED"
+        )
+        schema_editor.execute(
+            f'CREATE INDEX searchdocument_vector_gin ON {DOCUMENT_TABLE} USING GIN (search_vector)'
+        )
+    elif connection.vendor == 'sqlite':
+        try:
+            with transaction.atomic(using=connection.alias):
+                schema_editor.execute(
+                    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(title, body, category, prefix='2 3')"
+                )
+        except OperationalError:
+            # SQLite built without FTS5: search falls back to scanning the folded columns.
+            pass
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def backfill_search_documents(apps, schema_editor):
+    Course = apps.get_model('hourskill_app', 'Course')
+    SearchDocument = apps.get_model('hourskill_app', 'SearchDocument')
+    Video = apps.get_model('hourskill_app', 'Video')
+
+    documents = []
+    for video in Video.objects.filter(is_active=True, is_deleted=False).select_related('category').iterator():
+        documents.append(SearchDocument(
+            kind='video',
+            object_id=video.id,
+            title=fold_text(video.title),
+            body=fold_text(video.description),
+            category=fold_text(video.category.name if video.category else ''),
+        ))
+    for course in Course.objects.filter(is_active=True, is_deleted=False).select_related('category').iterator():
+        documents.append(SearchDocument(
+            kind='course',
+            object_id=course.id,
+            title=fold_text(course.title),
+            body=fold_text(course.description),
+            category=fold_text(' '.join(
+                part for part in (course.category_text, course.category.name if course.category else '') if part
+            )),
+        ))
+    SearchDocument.objects.bulk_create(documents, batch_size=500)
+
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names():
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, body, category) '
+            f'SELECT id, title, body, category FROM {DOCUMENT_TABLE}'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hourskill_app', '0025_catalog_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('video', 'Video'), ('course', 'Course')], max_length=10)),
+                ('object_id', models.PositiveIntegerField()),
+                ('title', models.TextField(blank=True, default='')),
+                ('body', models.TextField(blank=True, default='')),
+                ('category', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+        migrations.RunPython(backfill_search_documents, migrations.RunPython.noop),
+    ]
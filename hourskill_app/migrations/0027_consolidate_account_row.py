@@ -0,0 +1,95 @@
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def move_balances_to_wallet(apps, schema_editor):
+    User = apps.get_model('hourskill_app', 'User')
+    UserProfile = apps.get_model('hourskill_app', 'UserProfile')
+    Wallet = apps.get_model('hourskill_app', 'Wallet')
+
+    profiles = {profile.user_id: profile for profile in UserProfile.objects.all().iterator()}
+    wallets = {wallet.user_id: wallet for wallet in Wallet.objects.all().iterator()}
+
+    created, changed = [], []
+    for user in User.objects.only('id', 'is_vip', 'vip_expiry').iterator():
+        profile = profiles.get(user.id)
+        wallet = wallets.get(user.id)
+
+        # The profile balance was the source of truth; the wallet only mirrored it.
+        if profile is not None:
+            source = profile.balance_tc if profile.balance_tc is not None else profile.wallet_balance
+            balance = Decimal(str(source or 0))
+        elif wallet is not None:
+            balance = wallet.balance
+        else:
+            balance = Decimal('30.00')
+
+        flagged = bool(user.is_vip or (profile is not None and profile.is_vip))
+        vip_expiry = ((profile.vip_expiry if profile is not None else None) or user.vip_expiry) if flagged else None
+
+        if wallet is None:
+            created.append(Wallet(user_id=user.id, balance=balance, vip_expiry=vip_expiry))
+        elif wallet.balance != balance or wallet.vip_expiry != vip_expiry:
+            wallet.balance = balance
+            wallet.vip_expiry = vip_expiry
+            changed.append(wallet)
+
+    Wallet.objects.bulk_create(created, batch_size=500)
+    Wallet.objects.bulk_update(changed, ['balance', 'vip_expiry'], batch_size=500)
+
+
+def copy_balances_back(apps, schema_editor):
+    User = apps.get_model('hourskill_app', 'User')
+    UserProfile = apps.get_model('hourskill_app', 'UserProfile')
+    Wallet = apps.get_model('hourskill_app', 'Wallet')
+
+    for wallet in Wallet.objects.all().iterator():
+        is_vip = wallet.vip_expiry is not None
+        User.objects.filter(pk=wallet.user_id).update(is_vip=is_vip, vip_expiry=wallet.vip_expiry)
+        UserProfile.objects.filter(user_id=wallet.user_id).update(
+            balance_tc=wallet.balance,
+            wallet_balance=max(0, int(wallet.balance)),
+            is_vip=is_vip,
+            vip_expiry=wallet.vip_expiry,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hourskill_app', '0026_searchdocument'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wallet',
+            name='vip_expiry',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(move_balances_to_wallet, copy_balances_back),
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='balance_tc',
+        ),
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='wallet_balance',
+        ),
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='is_vip',
+        ),
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='vip_expiry',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='is_vip',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='vip_expiry',
+        ),
+    ]
@@ -0,0 +1,33 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hourskill_app', '0028_ledgercheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CreatorRevenueEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount_vnd', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('folded_at', models.DateTimeField(blank=True, null=True)),
+                ('creator', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revenue_entries', to=settings.AUTH_USER_MODEL)),
+                ('video', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='hourskill_app.video')),
+            ],
+            options={
+                'indexes': [
+                    models.Index(
+                        condition=models.Q(folded_at__isnull=True),
+                        fields=['creator'],
+                        name='revenue_entry_unfolded_idx',
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+
+def check_negative_balances(apps, schema_editor):
+    Wallet = apps.get_model('hourskill_app', 'Wallet')
+    # Older unguarded debits could overdraw; the constraint below needs every row at >= 0.
+    # Money is never rewritten here without a ledger row: an operator settles these first.
+    overdrawn = list(Wallet.objects.filter(balance__lt=0).order_by('user_id').values_list('user_id', flat=True))
+    if overdrawn:
+        raise RuntimeError(
+            'Cannot add wallet_balance_non_negative: wallets of user_ids '
+            f"{', '.join(map(str, overdrawn))} are overdrawn. Settle each one with a recorded "
+            'Transaction (and its wallet credit), then run migrate again.'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hourskill_app', '0029_creatorrevenueentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_negative_balances, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='wallet',
+            constraint=models.CheckConstraint(condition=models.Q(balance__gte=0), name='wallet_balance_non_negative'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hourskill_app', '0033_notificationcounter'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='text',
+            field=models.CharField(blank=True, default='', max_length=255, verbose_name='Nội dung thông báo'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='template',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='params',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='actor_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='group_key',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(
+                condition=models.Q(is_read=False) & ~models.Q(group_key=''),
+                fields=['recipient', 'group_key'],
+                name='notif_open_group_idx',
+            ),
+        ),
+        migrations.CreateModel(
+            name='NotificationArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipient_id', models.BigIntegerField(db_index=True)),
+                ('sender_id', models.BigIntegerField(blank=True, null=True)),
+                ('video_id', models.BigIntegerField(blank=True, null=True)),
+                ('notification_type', models.CharField(max_length=20)),
+                ('text', models.CharField(blank=True, default='', max_length=255)),
+                ('link', models.CharField(blank=True, max_length=255, null=True)),
+                ('template', models.CharField(blank=True, default='', max_length=32)),
+                ('params', models.JSONField(blank=True, default=dict)),
+                ('actor_count', models.PositiveIntegerField(default=1)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -1,7 +1,9 @@
 from decimal import Decimal
 
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
+from django.utils import timezone
 
 
 class User(AbstractUser):
@@ -9,29 +11,60 @@ class User(AbstractUser):
 
     # Marks whether the account can publish content
     is_creator = models.BooleanField(default=False, help_text="Creator accounts can upload content")
-    # Marks whether the account has VIP privileges (paid VND)
-    is_vip = models.BooleanField(default=False, help_text="VIP users have paid VND benefits")
-    # Expiry timestamp for VIP status
-    vip_expiry = models.DateTimeField(null=True, blank=True)
     # Reputation signal to throttle spammy behavior
     trust_score = models.IntegerField(default=100, help_text="Lower scores indicate suspicious activity")
 
     def __str__(self):
         return f"{self.username} (VIP)" if self.is_vip else self.username
 
+    @property
+    def account(self):
+        """The user's Wallet (single balance/VIP row), or None when missing."""
+        try:
+            return self.wallet
+        except ObjectDoesNotExist:
+            return None
+
+    # Compatibility reads; VIP state lives on Wallet.vip_expiry.
+    @property
+    def is_vip(self):
+        account = self.account
+        return bool(account and account.is_vip)
+
+    @property
+    def vip_expiry(self):
+        account = self.account
+        return account.vip_expiry if account else None
+
 
 class Wallet(models.Model):
-    """Holds both in-app credits (TC) and real-currency VND for a single user."""
+    """The user's account row: the only stored TC balance and VIP expiry.
+
+    Money operations lock just this row. User and UserProfile expose the
+    former duplicated balance/VIP fields as read-only properties over it.
+    """
 
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='wallet')
     # Single Time-Credit balance (1 TC = 1 minute)
     balance = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('30.00'))
+    # VIP is active while this lies in the future; null when never purchased
+    vip_expiry = models.DateTimeField(null=True, blank=True)
     # Auto-updated on every save to trace wallet mutations
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Backstop for the guarded debit in money.LockSet.debit
+        constraints = [
+            models.CheckConstraint(condition=models.Q(balance__gte=0), name='wallet_balance_non_negative'),
+        ]
+
     def __str__(self):
         return f"Wallet of {self.user.username} | {self.balance} TC"
 
+    @property
+    def is_vip(self):
+        return bool(self.vip_expiry and self.vip_expiry > timezone.now())
+
 
 class Video(models.Model):
     """Represents a single video asset with pricing, ownership, and metadata."""
@@ -72,12 +105,29 @@ class Video(models.Model):
     is_active = models.BooleanField(default=True)
     # Soft-delete flag for retaining history while removing from listings
     is_deleted = models.BooleanField(default=False)
+    # Denormalized review aggregates, bumped with F() when a rating is posted
+    rating_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
     # Creation timestamp for ordering
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Match the (created_at, id) keyset used by the paginated catalog and channel lists
+        indexes = [
+            models.Index(fields=['is_active', 'is_deleted', '-created_at', '-id'], name='video_active_created_idx'),
+            models.Index(fields=['creator', '-created_at', '-id'], name='video_creator_created_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
+    @property
+    def avg_rating(self):
+        """Average star rating from the denormalized counters (0 when unrated)."""
+        if not self.rating_count:
+            return 0.0
+        return self.rating_sum / self.rating_count
+
     @property
     def price_tc(self):
         """Dynamic TC price from duration with round-half-up-to-minute rule."""
@@ -136,10 +186,38 @@ class Transaction(models.Model):
     # Optional linkage to a video (e.g., purchases)
     reference_video = models.ForeignKey(Video, on_delete=models.SET_NULL, null=True, blank=True)
 
+    class Meta:
+        # Per-user id ranges for ledger deltas since a checkpoint (see ledger.py)
+        indexes = [
+            models.Index(fields=['sender', 'id'], name='tx_sender_id_idx'),
+            models.Index(fields=['receiver', 'id'], name='tx_receiver_id_idx'),
+        ]
+
     def __str__(self):
         return f"{self.tx_type} | {self.amount_tc} TC | {self.status}"
 
 
+class LedgerCheckpoint(models.Model):
+    """A user's running TC balance as of ledger (Transaction) id ``as_of_tx_id``.
+
+    Written periodically by the checkpoint_ledger command. The balance at any
+    later id is the checkpoint plus the ledger delta since it (see ledger.py).
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ledger_checkpoints')
+    as_of_tx_id = models.PositiveBigIntegerField()
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    # True when copied from the wallet to bootstrap history that predates the ledger
+    seeded = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'as_of_tx_id')
+
+    def __str__(self):
+        return f"Checkpoint<{self.user_id}@{self.as_of_tx_id}> {self.balance} TC"
+
+
 class WatchSession(models.Model):
     """Per-user, per-video watch session tracking unlock state and progress."""
 
@@ -207,6 +285,13 @@ class Course(models.Model):
     is_deleted = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Match the (created_at, id) keyset used by the paginated catalog and channel lists
+        indexes = [
+            models.Index(fields=['is_active', 'is_deleted', '-created_at', '-id'], name='course_active_created_idx'),
+            models.Index(fields=['instructor', '-created_at', '-id'], name='course_instr_created_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -266,16 +351,84 @@ class Notification(models.Model):
     sender = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='notifications_sent')
     video = models.ForeignKey(Video, on_delete=models.CASCADE, null=True, blank=True, related_name='notifications')
     notification_type = models.CharField(max_length=20, choices=TYPE_CHOICES)
-    text = models.CharField(max_length=255, verbose_name="Nội dung thông báo")
+    # Stored text of rows created before templates; templated rows render on read
+    text = models.CharField(max_length=255, blank=True, default='', verbose_name="Nội dung thông báo")
     link = models.CharField(max_length=255, blank=True, null=True, verbose_name="Đường dẫn chuyển hướng")
+    # Template id and parameters (see notification_templates.py)
+    template = models.CharField(max_length=32, blank=True, default='')
+    params = models.JSONField(default=dict, blank=True)
+    # Grouped rows: events folded into this row, and the key they share
+    actor_count = models.PositiveIntegerField(default=1)
+    group_key = models.CharField(max_length=64, blank=True, default='')
     is_read = models.BooleanField(default=False, verbose_name="Đã đọc?")
+    # Time of the latest event; a group row moves up when it absorbs one
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
+    class Meta:
+        indexes = [
+            # Unread lookups and mark-all-read touch only the recipient's unread rows
+            models.Index(fields=['recipient', 'is_read', '-created_at'], name='notif_recipient_unread_idx'),
+            # Newest-first top-20 for the header poll
+            models.Index(fields=['recipient', '-created_at'], name='notif_recipient_created_idx'),
+            # Open groups that can still absorb events
+            models.Index(
+                fields=['recipient', 'group_key'],
+                name='notif_open_group_idx',
+                condition=models.Q(is_read=False) & ~models.Q(group_key=''),
+            ),
+        ]
+
     def __str__(self):
         status = "Đã đọc" if self.is_read else "Chưa đọc"
         return f"[{status}] {self.recipient.username} | {self.notification_type}"
 
 
+class NotificationArchive(models.Model):
+    """Read notifications moved out of the live table by archive_notifications."""
+
+    recipient_id = models.BigIntegerField(db_index=True)
+    sender_id = models.BigIntegerField(null=True, blank=True)
+    video_id = models.BigIntegerField(null=True, blank=True)
+    notification_type = models.CharField(max_length=20)
+    text = models.CharField(max_length=255, blank=True, default='')
+    link = models.CharField(max_length=255, blank=True, null=True)
+    template = models.CharField(max_length=32, blank=True, default='')
+    params = models.JSONField(default=dict, blank=True)
+    actor_count = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"ArchivedNotification<{self.recipient_id}> {self.template or self.notification_type}"
+
+
+class NotificationCounter(models.Model):
+    """Maintained count of a user's unread notifications (see notification_counters.py)."""
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='notification_counter')
+    unread_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"NotificationCounter<{self.user_id}> unread:{self.unread_count}"
+
+
+class NotificationOutbox(models.Model):
+    """Compact notification event written inside the originating transaction.
+
+    The drain_notification_outbox worker renders queued events into
+    Notification rows in batches and deletes them (see notification_outbox.py).
+    """
+
+    event = models.CharField(max_length=32)
+    # recipient_id, sender_id, video_id plus the event's template parameters
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Outbox<{self.id}> {self.event}"
+
+
 class UserBehavior(models.Model):
     """Event-level telemetry for playback interactions, separate from watch sessions."""
 
@@ -313,10 +466,6 @@ class UserProfile(models.Model):
     # Flexible survey response storage for personalization
     survey_answers = models.JSONField(default=list, blank=True, null=True)
     avatar = models.ImageField(upload_to='avatars/', blank=True, default='')
-    balance_tc = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('30.00'))
-    wallet_balance = models.IntegerField(default=30)
-    is_vip = models.BooleanField(default=False)
-    vip_expiry = models.DateTimeField(null=True, blank=True)
     notify_comments = models.BooleanField(default=True)
     notify_follows = models.BooleanField(default=True)
     dark_mode = models.BooleanField(default=False)
@@ -324,6 +473,24 @@ class UserProfile(models.Model):
     def __str__(self):
         return f"{self.user.email} - Vai trò: {self.role}"
 
+    # Compatibility reads over the user's Wallet, which owns balance and VIP state.
+    @property
+    def balance_tc(self):
+        account = self.user.account
+        return account.balance if account else Decimal('0.00')
+
+    @property
+    def wallet_balance(self):
+        return max(0, int(self.balance_tc))
+
+    @property
+    def is_vip(self):
+        return self.user.is_vip
+
+    @property
+    def vip_expiry(self):
+        return self.user.vip_expiry
+
 
 class CreatorAccount(models.Model):
     """Revenue pool for creator earnings split from purchases."""
@@ -338,6 +505,102 @@ class CreatorAccount(models.Model):
         return f"CreatorAccount<{self.user.username}> A:{self.available_vnd} P:{self.pending_vnd}"
 
 
+class CreatorRevenueEntry(models.Model):
+    """Append-only creator share of one sale, folded into CreatorAccount later.
+
+    Sales only insert here, so buyers never wait on a popular creator's
+    account row; see creator_revenue.py for folding and exact reads.
+    """
+
+    creator = models.ForeignKey(User, on_delete=models.CASCADE, related_name='revenue_entries')
+    video = models.ForeignKey(Video, on_delete=models.SET_NULL, null=True, blank=True)
+    amount_vnd = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Set once the amount has been added to the creator's CreatorAccount
+    folded_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['creator'],
+                condition=models.Q(folded_at__isnull=True),
+                name='revenue_entry_unfolded_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"RevenueEntry<{self.creator_id}> {self.amount_vnd} VND"
+
+
+class CreatorStats(models.Model):
+    """Materialized per-creator aggregates read by rankings and price eligibility.
+
+    Followers also get a row so their following_count can be served from here.
+    """
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='creator_stats')
+    # Watch sessions opened on the creator's active videos
+    total_views = models.IntegerField(default=0)
+    # Review totals across active videos (sum of Video.rating_* counters)
+    rating_sum = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
+    follower_count = models.IntegerField(default=0)
+    following_count = models.IntegerField(default=0)
+    # Active, non-deleted uploads
+    video_count = models.IntegerField(default=0)
+    # Creator share of content sales (VND), mirrors CONTENT_SALE ledger rows
+    revenue_vnd = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    # Leaderboard position assigned by the periodic ranking job (null = not ranked yet)
+    rank = models.PositiveIntegerField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Creator stats"
+        indexes = [
+            models.Index(fields=['rank', 'user'], name='creatorstats_rank_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"CreatorStats<{self.user.username}> views:{self.total_views} videos:{self.video_count}"
+
+    @property
+    def avg_rating(self):
+        """Average star rating across the creator's videos (0 when unrated)."""
+        if not self.rating_count:
+            return 0.0
+        return self.rating_sum / self.rating_count
+
+
+class SearchDocument(models.Model):
+    """Accent-folded text of a searchable video or course.
+
+    Rows are maintained by save hooks (see search.py) and mirrored into the
+    database's full-text index: an FTS5 table on SQLite, a generated
+    tsvector column on PostgreSQL.
+    """
+
+    KIND_VIDEO = 'video'
+    KIND_COURSE = 'course'
+    KIND_CHOICES = (
+        (KIND_VIDEO, 'Video'),
+        (KIND_COURSE, 'Course'),
+    )
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    # Folded, space-separated tokens (lowercase, diacritics removed)
+    title = models.TextField(blank=True, default='')
+    body = models.TextField(blank=True, default='')
+    category = models.TextField(blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('kind', 'object_id')
+
+    def __str__(self):
+        return f"SearchDocument<{self.kind}:{self.object_id}>"
+
+
 class WithdrawalRequest(models.Model):
     """Tracks creator withdrawal requests before payout completion."""
 
@@ -357,4 +620,27 @@ class WithdrawalRequest(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"Withdraw<{self.user.username}> {self.amount_tc} TC ({self.status})"
\ No newline at end of file
+        return f"Withdraw<{self.user.username}> {self.amount_tc} TC ({self.status})"
+
+
+class IdempotencyKey(models.Model):
+    """Stored response of a money endpoint, replayed for retries carrying the same Idempotency-Key.
+
+    ``status_code`` is null while the first request is still running. Rows older
+    than IDEMPOTENCY_KEY_TTL are ignored and removed by purge_idempotency_keys.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    endpoint = models.CharField(max_length=64)
+    # sha256 of method, path and body; a reused key with another request is rejected
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        unique_together = ('user', 'key')
+
+    def __str__(self):
+        return f"Idempotency<{self.user_id}:{self.key}> {self.endpoint} ({self.status_code or 'running'})"
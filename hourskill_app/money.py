@@ -0,0 +1,228 @@
+"""Runner for money operations: global lock order and bounded deadlock retry.
+
+Every operation that moves TC or VND runs through ``run_money_operation``,
+which calls it in its own transaction with a ``LockSet``. Rows are locked
+through the lock set only, in one global order: by table as listed in
+``LOCK_ORDER``, then by primary key. Two operations can then never wait on
+each other in a cycle; taking a lock out of order raises
+``LockOrderError`` instead of deadlocking later under load. Debits use
+``LockSet.debit``, a single guarded UPDATE backed by the
+``wallet_balance_non_negative`` check constraint.
+
+Deadlocks and serialization failures the database still reports (lock
+escalation, SQLite's "database is locked", concurrent inserts) are retried
+a bounded number of times with exponential backoff and full jitter.
+``retry_metrics()`` exposes per-operation run, retry and give-up counters.
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .auth import invalidate_user_snapshot
+from .models import Wallet
+
+
+logger = logging.getLogger(__name__)
+
+# Global lock order by table; within a table rows are locked by ascending pk.
+LOCK_ORDER = (
+    'hourskill_app.Wallet',
+    'hourskill_app.CreatorAccount',
+    'hourskill_app.VideoAccess',
+    'hourskill_app.CreatorRevenueEntry',
+)
+
+MONEY_OP_MAX_ATTEMPTS = getattr(settings, 'MONEY_OP_MAX_ATTEMPTS', 4)
+MONEY_OP_RETRY_BASE_DELAY = getattr(settings, 'MONEY_OP_RETRY_BASE_DELAY', 0.02)
+MONEY_OP_RETRY_MAX_DELAY = getattr(settings, 'MONEY_OP_RETRY_MAX_DELAY', 0.5)
+
+# SQLSTATE deadlock_detected / serialization_failure (PostgreSQL), MySQL deadlock / lock wait timeout.
+_RETRYABLE_SQLSTATES = {'40P01', '40001'}
+_RETRYABLE_MYSQL_CODES = {1213, 1205}
+_RETRYABLE_MESSAGES = ('deadlock', 'could not serialize', 'database is locked', 'database table is locked')
+
+
+class LockOrderError(RuntimeError):
+    """A money operation tried to lock rows against the global lock order."""
+
+
+class LockSet:
+    """Row locks taken by one money operation, enforced to follow ``LOCK_ORDER``."""
+
+    def __init__(self):
+        self._rank = -1
+        self._last_pk = None
+        self._held = set()
+
+    def _claim(self, model, pks=None):
+        label = model._meta.label
+        if label not in LOCK_ORDER:
+            raise LockOrderError(f'{label} is not listed in LOCK_ORDER.')
+        rank = LOCK_ORDER.index(label)
+        if rank < self._rank:
+            raise LockOrderError(f'{label} locked after {LOCK_ORDER[self._rank]}.')
+        if rank > self._rank:
+            self._last_pk = None
+            self._held = set()
+        self._rank = rank
+        self._check_order(pks)
+
+    def _check_order(self, pks):
+        # Rows this operation already holds can be locked again in any order.
+        new_pks = set(pks or ()) - self._held
+        if new_pks and self._last_pk is not None and min(new_pks) <= self._last_pk:
+            raise LockOrderError(f'{LOCK_ORDER[self._rank]} rows locked out of primary-key order.')
+
+    def _locked(self, pks):
+        """Record rows as held; rows whose pks were not known up front are checked here."""
+        self._check_order(pks)
+        if pks:
+            self._held.update(pks)
+            self._last_pk = max(pks) if self._last_pk is None else max(self._last_pk, *pks)
+
+    def lock(self, model, **filters):
+        """Lock and return the rows matching ``filters`` in primary-key order."""
+        self._claim(model)
+        rows = list(model.objects.select_for_update().filter(**filters).order_by('pk'))
+        self._locked([row.pk for row in rows])
+        return rows
+
+    def get_or_create(self, model, defaults=None, **lookup):
+        """Locking ``get_or_create``; the new or existing row counts toward the order."""
+        self._claim(model)
+        row, created = model.objects.select_for_update().get_or_create(defaults=defaults, **lookup)
+        self._locked([row.pk])
+        return row, created
+
+    def bulk_create(self, model, rows):
+        """Insert ``rows`` in one statement; new rows count toward the order like locked ones."""
+        self._claim(model)
+        rows = model.objects.bulk_create(rows)
+        self._locked([row.pk for row in rows if row.pk is not None])
+        return rows
+
+    def wallets(self, user_ids):
+        """Lock the wallets of ``user_ids`` (pk order); returns {user_id: Wallet}.
+
+        Raises Wallet.DoesNotExist when any of the users has no wallet.
+        """
+        user_ids = set(user_ids)
+        wallets = {wallet.user_id: wallet for wallet in self.lock(Wallet, user_id__in=user_ids)}
+        if len(wallets) != len(user_ids):
+            raise Wallet.DoesNotExist
+        return wallets
+
+    def wallet(self, user_id):
+        """Lock one user's wallet."""
+        return self.wallets([user_id])[user_id]
+
+    def debit(self, user_id, amount, expect=None, **changes):
+        """Conditional debit in one guarded UPDATE; returns the new balance or None.
+
+        ``UPDATE wallet SET balance = balance - amount WHERE user_id = ... AND
+        balance >= amount`` (plus ``expect`` field values, for compare-and-set
+        of ``changes``). The affected row count decides success, so no
+        SELECT ... FOR UPDATE precedes it. None means the guard failed:
+        insufficient funds or an ``expect`` mismatch. Raises
+        Wallet.DoesNotExist when the user has no wallet.
+
+        The UPDATE locks the wallet row even when the guard fails, so it
+        counts toward the lock order like any other locked wallet.
+        """
+        # A plain read: a wallet's pk never changes, only its balance.
+        pk = Wallet.objects.filter(user_id=user_id).values_list('pk', flat=True).first()
+        if pk is None:
+            raise Wallet.DoesNotExist
+        self._claim(Wallet, [pk])
+        amount = Decimal(str(amount))
+        updated = Wallet.objects.filter(pk=pk, balance__gte=amount, **(expect or {})).update(
+            balance=F('balance') - amount,
+            updated_at=timezone.now(),
+            **changes,
+        )
+        self._locked([pk])
+        if not updated:
+            return None
+        invalidate_user_snapshot(user_id)
+        # The row is ours until commit, so this read sees exactly the debited balance.
+        return Wallet.objects.filter(pk=pk).values_list('balance', flat=True).get()
+
+
+_metrics_lock = threading.Lock()
+_metrics = defaultdict(Counter)
+
+
+def _record(name, key, amount=1):
+    with _metrics_lock:
+        _metrics[name][key] += amount
+
+
+def retry_metrics():
+    """Per-operation counters since process start: runs, retries, exhausted, conflicts."""
+    with _metrics_lock:
+        return {name: dict(counter) for name, counter in _metrics.items()}
+
+
+def reset_retry_metrics():
+    with _metrics_lock:
+        _metrics.clear()
+
+
+def is_retryable_error(exc):
+    """True for deadlocks and serialization failures, whatever the database backend."""
+    if not isinstance(exc, DatabaseError):
+        return False
+    cause = exc.__cause__
+    sqlstate = getattr(cause, 'sqlstate', None) or getattr(cause, 'pgcode', None)
+    if sqlstate in _RETRYABLE_SQLSTATES:
+        return True
+    args = getattr(cause, 'args', None) or exc.args
+    if args and args[0] in _RETRYABLE_MYSQL_CODES:
+        return True
+    message = str(exc).lower()
+    return any(fragment in message for fragment in _RETRYABLE_MESSAGES)
+
+
+def _backoff(attempt):
+    # Full jitter: spreads retries of the operations that collided.
+    return random.uniform(0, min(MONEY_OP_RETRY_MAX_DELAY, MONEY_OP_RETRY_BASE_DELAY * (2 ** attempt)))
+
+
+def run_money_operation(name, operation, *args, max_attempts=None, **kwargs):
+    """Run ``operation(locks, *args, **kwargs)`` in a transaction, retrying deadlocks.
+
+    Inside an enclosing transaction the operation runs once without retry:
+    a deadlock aborts the outer transaction, so only its owner can retry.
+    The operation must therefore be safe to re-run from the start; side
+    effects belong in ``transaction.on_commit``.
+    """
+    attempts = max(1, max_attempts or MONEY_OP_MAX_ATTEMPTS)
+    if connection.in_atomic_block:
+        attempts = 1
+
+    _record(name, 'runs')
+    for attempt in range(attempts):
+        try:
+            with transaction.atomic():
+                return operation(LockSet(), *args, **kwargs)
+        except DatabaseError as exc:
+            if not is_retryable_error(exc):
+                raise
+            _record(name, 'conflicts')
+            if attempt + 1 >= attempts:
+                _record(name, 'exhausted')
+                logger.error('Money operation %s gave up after %s attempts: %s', name, attempts, exc)
+                raise
+            _record(name, 'retries')
+            delay = _backoff(attempt)
+            logger.warning('Money operation %s hit %s; retry %s in %.3fs', name, exc, attempt + 1, delay)
+            time.sleep(delay)
@@ -0,0 +1,63 @@
+"""Per-user unread notification counters.
+
+The header poll reads ``NotificationCounter.unread_count`` instead of
+counting unread Notification rows. The outbox worker bumps counters for
+each delivered batch in the same transaction, single creates and deletes
+are followed by signals, and marking all as read subtracts exactly the rows
+it flipped. Subtracting (rather than writing zero) keeps the counter right
+when a batch is delivered between the UPDATE and the counter write, without
+a lock. reconcile_notification_counters repairs any remaining drift.
+"""
+
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Notification, NotificationCounter
+from .realtime import publish_user_change
+
+
+def bump_unread_counts(counts):
+    """Add ``{user_id: delta}`` to the users' counters, creating missing rows."""
+    counts = {user_id: delta for user_id, delta in counts.items() if delta}
+    if not counts:
+        return
+    NotificationCounter.objects.bulk_create(
+        [NotificationCounter(user_id=user_id) for user_id in counts],
+        ignore_conflicts=True,
+    )
+    # One UPDATE per distinct delta; a delivered batch mostly has deltas of 1.
+    by_delta = defaultdict(list)
+    for user_id, delta in counts.items():
+        by_delta[delta].append(user_id)
+    now = timezone.now()
+    for delta, user_ids in by_delta.items():
+        NotificationCounter.objects.filter(user_id__in=user_ids).update(
+            unread_count=Greatest(F('unread_count') + delta, Value(0)),
+            updated_at=now,
+        )
+    publish_user_change(counts)
+
+
+def count_unread(notifications):
+    """``{recipient_id: n}`` for the unread ones among ``notifications``."""
+    return Counter(notification.recipient_id for notification in notifications if not notification.is_read)
+
+
+def get_unread_count(user_id):
+    """The user's unread notification count; users without a counter row have none."""
+    return (
+        NotificationCounter.objects.filter(user_id=user_id).values_list('unread_count', flat=True).first()
+        or 0
+    )
+
+
+def mark_all_read(user_id):
+    """Mark every unread notification of the user as read; returns how many were flipped."""
+    with transaction.atomic():
+        flipped = Notification.objects.filter(recipient_id=user_id, is_read=False).update(is_read=True)
+        bump_unread_counts({user_id: -flipped})
+    return flipped
@@ -0,0 +1,154 @@
+"""Transactional outbox for user notifications.
+
+Request paths call ``enqueue_notification`` inside their own transaction:
+it inserts one small ``NotificationOutbox`` row (event name plus ids and
+template parameters), so a purchase, follow or review never waits on
+rendering or on the Notification table while holding its locks. The event
+commits or rolls back together with the action that caused it.
+
+The drain_notification_outbox worker calls ``drain_outbox``, which claims a
+batch (SKIP LOCKED where supported, so several workers can run), folds
+grouped events into the recipients' open group rows, ``bulk_create``s the
+remaining Notification rows (template id and parameters, rendered on read)
+and deletes the batch in the same transaction, bumping the recipients'
+unread counters as part of it.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Notification, NotificationOutbox, User, Video
+from .notification_counters import bump_unread_counts, count_unread
+from .notification_templates import NOTIFICATION_GROUP_WINDOW, TEMPLATES, group_key
+from .realtime import publish_user_change
+
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_notification(event, recipient, sender=None, video=None, **params):
+    """Queue a notification event in the current transaction; delivered later by the worker."""
+    if event not in TEMPLATES:
+        raise ValueError(f'Unknown notification event {event!r}.')
+    if not recipient:
+        return None
+    payload = {
+        'recipient_id': getattr(recipient, 'pk', recipient),
+        'sender_id': getattr(sender, 'pk', sender),
+        'video_id': getattr(video, 'pk', video),
+        **params,
+    }
+    return NotificationOutbox.objects.create(event=event, payload=payload)
+
+
+def _split(payload):
+    ids = {key: payload.get(key) for key in ('recipient_id', 'sender_id', 'video_id')}
+    params = {key: value for key, value in payload.items() if key not in ids}
+    return ids, params
+
+
+def _actor_ids(group):
+    """Distinct senders folded into a group row, kept in ``params['actor_ids']``."""
+    actor_ids = group.params.get('actor_ids')
+    if actor_ids is None:
+        # Rows grouped before actor ids were kept only know their latest sender.
+        return [group.sender_id] if group.sender_id else []
+    return list(actor_ids)
+
+
+def _deliver(events, now):
+    """Fold grouped events into open group rows; returns (rows to create, rows to update)."""
+    payloads = [event.payload for event in events]
+    # Users or videos deleted since the event was queued must not break the batch insert.
+    user_ids = set(
+        User.objects.filter(
+            id__in={p['recipient_id'] for p in payloads} | {p['sender_id'] for p in payloads if p.get('sender_id')}
+        ).values_list('id', flat=True)
+    )
+    video_ids = set(
+        Video.objects.filter(id__in={p['video_id'] for p in payloads if p.get('video_id')}).values_list('id', flat=True)
+    )
+
+    keys = {
+        (p['recipient_id'], group_key(event.event, p.get('video_id')))
+        for event, p in zip(events, payloads)
+    }
+    keys = {(recipient_id, key) for recipient_id, key in keys if key and recipient_id in user_ids}
+    open_groups = {}
+    if keys:
+        cutoff = now - timedelta(seconds=NOTIFICATION_GROUP_WINDOW)
+        for row in Notification.objects.filter(
+            recipient_id__in={recipient_id for recipient_id, _ in keys},
+            group_key__in={key for _, key in keys},
+            is_read=False,
+            created_at__gte=cutoff,
+        ).order_by('created_at'):
+            open_groups[(row.recipient_id, row.group_key)] = row
+
+    created, updated = [], {}
+    for event in events:
+        ids, params = _split(event.payload)
+        if ids['recipient_id'] not in user_ids:
+            continue
+        template = TEMPLATES.get(event.event)
+        if template is None:
+            logger.error('Dropping notification event %s with unknown template %s', event.id, event.event)
+            continue
+        sender_id = ids['sender_id'] if ids['sender_id'] in user_ids else None
+        video_id = ids['video_id'] if ids['video_id'] in video_ids else None
+        key = group_key(event.event, ids['video_id']) or ''
+        group = open_groups.get((ids['recipient_id'], key)) if key else None
+        if group is not None:
+            actor_ids = _actor_ids(group)
+            group.params = template.merge(group.params, params)
+            # A user who follows, unfollows and follows again (or re-rates) counts once.
+            if ids['sender_id'] is None or ids['sender_id'] not in actor_ids:
+                actor_ids.append(ids['sender_id'])
+                group.actor_count += 1
+            group.params['actor_ids'] = [actor_id for actor_id in actor_ids if actor_id is not None]
+            group.sender_id = sender_id
+            group.created_at = now
+            if group.pk:
+                updated[group.pk] = group
+            continue
+        if key:
+            params['actor_ids'] = [ids['sender_id']] if ids['sender_id'] is not None else []
+        row = Notification(
+            recipient_id=ids['recipient_id'],
+            sender_id=sender_id,
+            video_id=video_id,
+            notification_type=template.notification_type,
+            template=event.event,
+            params=params,
+            group_key=key,
+        )
+        created.append(row)
+        if key:
+            # Later events of this batch fold into the new row before it is inserted.
+            open_groups[(ids['recipient_id'], key)] = row
+    return created, list(updated.values())
+
+
+def drain_outbox(batch_size=500):
+    """Deliver one batch of queued events; returns (events, notifications created or updated)."""
+    with transaction.atomic():
+        queued = NotificationOutbox.objects.order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            queued = queued.select_for_update(skip_locked=True)
+        events = list(queued[:batch_size])
+        if not events:
+            return 0, 0
+        now = timezone.now()
+        created, updated = _deliver(events, now)
+        created = Notification.objects.bulk_create(created)
+        if updated:
+            # A group absorbing events stays one unread row: the counter does not move,
+            # but open streams still have to pick up the new text.
+            Notification.objects.bulk_update(updated, ['params', 'actor_count', 'sender', 'created_at'])
+            publish_user_change({notification.recipient_id for notification in updated})
+        bump_unread_counts(count_unread(created))
+        NotificationOutbox.objects.filter(id__in=[event.id for event in events]).delete()
+    return len(events), len(created) + len(updated)
@@ -0,0 +1,188 @@
+"""Notification templates: rendered on read, not stored as text.
+
+A Notification row keeps a template id, its parameters and ``actor_count``;
+the text is produced here when the notification is served. Templates with a
+``merge`` function are grouped: while a recipient's group row is unread and
+younger than NOTIFICATION_GROUP_WINDOW, further events of the same group
+update it in place ("X và 120 người khác đã đánh giá video của bạn")
+instead of adding rows; ``actor_count`` counts distinct senders, whose ids
+the group keeps in ``params['actor_ids']``. Rows from before templates keep their stored text.
+
+Read notifications older than NOTIFICATION_ARCHIVE_AFTER_DAYS are moved to
+NotificationArchive by archive_notifications, so the live table holds what
+the header can still show. Archived rows render with the same templates.
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Notification, NotificationArchive
+
+
+NOTIFICATION_GROUP_WINDOW = getattr(settings, 'NOTIFICATION_GROUP_WINDOW', 6 * 60 * 60)
+NOTIFICATION_ARCHIVE_AFTER_DAYS = getattr(settings, 'NOTIFICATION_ARCHIVE_AFTER_DAYS', 30)
+
+TYPE_PURCHASE = 'purchase'
+TYPE_FOLLOW = 'follow'
+TYPE_RATING = 'rating'
+
+
+def _vnd(value):
+    return f"{max(0, int(Decimal(str(value)))):,}".replace(',', '.')
+
+
+def _actors(name, count):
+    return name if count <= 1 else f"{name} và {count - 1} người khác"
+
+
+def _video_link(ids, params):
+    return f"video-detail.html?id={ids['video_id']}"
+
+
+def _course_link(ids, params):
+    return f"course-detail.html?id={params['course_id']}"
+
+
+def _wallet_link(ids, params):
+    return 'profile.html#wallet'
+
+
+def _latest(previous, current):
+    return current
+
+
+def _sum_share(previous, current):
+    return {**current, 'share_vnd': int(previous.get('share_vnd', 0)) + int(current.get('share_vnd', 0))}
+
+
+class Template:
+    """Text/link renderers of one template id; ``merge`` makes it grouped."""
+
+    def __init__(self, notification_type, text, link, merge=None):
+        self.notification_type = notification_type
+        self.text = text
+        self.link = link
+        self.merge = merge
+
+
+# text(params, actor_count) -> str, link(ids, params) -> str
+TEMPLATES = {
+    'video_unlocked': Template(
+        TYPE_PURCHASE,
+        lambda p, n: f"Bạn đã mở khóa {p['title']}. -{p['price_tc']} TC",
+        _video_link,
+    ),
+    'video_sold': Template(
+        TYPE_PURCHASE,
+        lambda p, n: f"{_actors(p['buyer'], n)} đã mua {p['title']}. +{_vnd(p['share_vnd'])} VND (Pending)",
+        _video_link,
+        merge=_sum_share,
+    ),
+    'course_unlocked': Template(
+        TYPE_PURCHASE,
+        lambda p, n: f"Bạn đã mở khóa {p['lessons']} bài học của {p['title']}. -{p['price_tc']} TC",
+        _course_link,
+    ),
+    'course_sold': Template(
+        TYPE_PURCHASE,
+        lambda p, n: f"{p['buyer']} đã mua khóa học {p['title']}. +{_vnd(p['share_vnd'])} VND (Pending)",
+        _course_link,
+    ),
+    'recharge': Template(
+        TYPE_PURCHASE,
+        lambda p, n: f"Nạp thành công {_vnd(p['amount_vnd'])} VND. +{p['tc_added']} TC",
+        _wallet_link,
+    ),
+    'vip_purchased': Template(
+        TYPE_PURCHASE,
+        lambda p, n: f"{'Gia han' if p['renewal'] else 'Kich hoat'} VIP thanh cong den {p['expiry']}",
+        _wallet_link,
+    ),
+    'withdraw_requested': Template(
+        TYPE_PURCHASE,
+        lambda p, n: f"Yeu cau rut {_vnd(p['amount_vnd'])} VND da duoc tao (ma {p['request_id']}).",
+        _wallet_link,
+    ),
+    'followed': Template(
+        TYPE_FOLLOW,
+        lambda p, n: f"{_actors(p['follower'], n)} đã theo dõi bạn",
+        lambda ids, p: f"/channel.html?id={ids['sender_id']}",
+        merge=_latest,
+    ),
+    'rated': Template(
+        TYPE_RATING,
+        lambda p, n: (
+            f"{p['reviewer']} đã đánh giá {p['rating']} sao cho video của bạn"
+            if n <= 1 else
+            f"{_actors(p['reviewer'], n)} đã đánh giá video của bạn"
+        ),
+        lambda ids, p: f"/{_video_link(ids, p)}",
+        merge=_latest,
+    ),
+}
+
+
+def group_key(template_id, video_id=None):
+    """Key shared by events that collapse into one row per recipient; None when not grouped."""
+    template = TEMPLATES.get(template_id)
+    if template is None or template.merge is None:
+        return None
+    return f"{template_id}:{video_id or ''}"
+
+
+def render_text(notification):
+    """Display text of a Notification (or archived row)."""
+    template = TEMPLATES.get(notification.template)
+    if template is None:
+        return notification.text
+    try:
+        return template.text(notification.params, notification.actor_count)
+    except (KeyError, TypeError, ValueError, ArithmeticError):
+        return notification.text
+
+
+def render_link(notification):
+    """Target link of a Notification (or archived row)."""
+    template = TEMPLATES.get(notification.template)
+    if template is None:
+        return notification.link or ''
+    ids = {'sender_id': notification.sender_id, 'video_id': notification.video_id}
+    try:
+        return template.link(ids, notification.params)
+    except (KeyError, TypeError, ValueError):
+        return notification.link or ''
+
+
+def archive_read_notifications(older_than_days=NOTIFICATION_ARCHIVE_AFTER_DAYS, chunk_size=1000, dry_run=False):
+    """Move read notifications older than the cutoff to the archive in chunks; returns how many moved."""
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    stale = Notification.objects.filter(is_read=True, created_at__lt=cutoff)
+    if dry_run:
+        return stale.count()
+    moved = 0
+    while True:
+        with transaction.atomic():
+            rows = list(stale.order_by('id')[:chunk_size])
+            if not rows:
+                return moved
+            NotificationArchive.objects.bulk_create([
+                NotificationArchive(
+                    recipient_id=row.recipient_id,
+                    sender_id=row.sender_id,
+                    video_id=row.video_id,
+                    notification_type=row.notification_type,
+                    text=row.text,
+                    link=row.link,
+                    template=row.template,
+                    params=row.params,
+                    actor_count=row.actor_count,
+                    created_at=row.created_at,
+                )
+                for row in rows
+            ])
+            Notification.objects.filter(id__in=[row.id for row in rows]).delete()
+        moved += len(rows)
@@ -0,0 +1,179 @@
+"""Server-sent event stream of a user's notifications, unread count and wallet.
+
+Writers call ``publish_user_change`` (wallet and profile changes through
+``auth.invalidate_user_snapshot``, notification deliveries and mark-read
+through ``notification_counters``). After commit it stores a fresh version
+token under the user's channel key in the shared cache and wakes streams of
+that user open in the same process.
+
+``user_event_stream`` is an async generator consumed by the SSE view under
+ASGI. It parks on an in-process event for up to REALTIME_STREAM_TICK
+seconds, then compares the channel token with the last one it saw (one
+cache read) and only queries the database when the token moved. With a
+per-process cache (the default LocMemCache) publishes from other processes
+are invisible, so state is also re-read every REALTIME_DB_POLL_INTERVAL
+seconds. Streams end after REALTIME_STREAM_MAX_AGE; EventSource reconnects.
+"""
+
+import asyncio
+import json
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import Notification, NotificationCounter, Wallet
+
+
+REALTIME_CACHE_PREFIX = 'realtime'
+REALTIME_CHANNEL_TTL = getattr(settings, 'REALTIME_CHANNEL_TTL', 60 * 60)
+REALTIME_STREAM_TICK = getattr(settings, 'REALTIME_STREAM_TICK', 1.0)
+REALTIME_DB_POLL_INTERVAL = getattr(settings, 'REALTIME_DB_POLL_INTERVAL', 30.0)
+REALTIME_KEEPALIVE_INTERVAL = getattr(settings, 'REALTIME_KEEPALIVE_INTERVAL', 15.0)
+REALTIME_STREAM_MAX_AGE = getattr(settings, 'REALTIME_STREAM_MAX_AGE', 10 * 60)
+REALTIME_RECONNECT_MS = getattr(settings, 'REALTIME_RECONNECT_MS', 3000)
+REALTIME_NOTIFICATION_BATCH = 20
+
+_subscribers_lock = threading.Lock()
+# user_id -> {(event loop, asyncio.Event)} for streams open in this process
+_subscribers = {}
+
+
+def _channel_key(user_id):
+    return f'{REALTIME_CACHE_PREFIX}:user:{user_id}'
+
+
+def _wake_local(user_ids):
+    with _subscribers_lock:
+        waiters = [waiter for user_id in user_ids for waiter in _subscribers.get(user_id, ())]
+    for loop, event in waiters:
+        loop.call_soon_threadsafe(event.set)
+
+
+def publish_user_change(user_ids):
+    """Signal open streams of ``user_ids`` to re-read their state once the transaction commits."""
+    user_ids = {user_id for user_id in user_ids if user_id}
+    if not user_ids:
+        return
+
+    def _publish():
+        token = time.time_ns()
+        cache.set_many({_channel_key(user_id): token for user_id in user_ids}, timeout=REALTIME_CHANNEL_TTL)
+        _wake_local(user_ids)
+
+    transaction.on_commit(_publish)
+
+
+def _subscribe(user_id):
+    waiter = (asyncio.get_running_loop(), asyncio.Event())
+    with _subscribers_lock:
+        _subscribers.setdefault(user_id, set()).add(waiter)
+    return waiter
+
+
+def _unsubscribe(user_id, waiter):
+    with _subscribers_lock:
+        waiters = _subscribers.get(user_id)
+        if waiters is not None:
+            waiters.discard(waiter)
+            if not waiters:
+                del _subscribers[user_id]
+
+
+def _sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n'
+
+
+def _load_state(user_id, cursor, serialize_notification):
+    """Current unread count, wallet and notifications new or regrouped since ``cursor`` (sync, own DB access)."""
+    try:
+        unread = NotificationCounter.objects.filter(user_id=user_id).values_list('unread_count', flat=True).first()
+        wallet = Wallet.objects.filter(user_id=user_id).values_list('balance', 'vip_expiry').first()
+        balance, vip_expiry = wallet or (0, None)
+        notifications = Notification.objects.filter(recipient_id=user_id)
+        if cursor is None:
+            # Opening snapshot: only remember where the stream starts.
+            last_id = notifications.order_by('-id').values_list('id', flat=True).first() or 0
+            last_at = notifications.order_by('-created_at').values_list('created_at', flat=True).first()
+            fresh = []
+        else:
+            last_id, last_at = cursor
+            # Grouped rows absorb later events in place and move their created_at forward.
+            changed = Q(id__gt=last_id)
+            if last_at is not None:
+                changed |= Q(created_at__gt=last_at)
+            rows = list(
+                notifications.filter(changed)
+                .select_related('sender', 'video')
+                .order_by('created_at', 'id')[:REALTIME_NOTIFICATION_BATCH]
+            )
+            fresh = [serialize_notification(notification) for notification in rows]
+            last_id = max([last_id] + [notification.id for notification in rows])
+            last_at = rows[-1].created_at if rows else last_at
+        return {
+            'unread_count': unread or 0,
+            'balance': max(0, int(balance)),
+            'vip_expiry': vip_expiry.isoformat() if vip_expiry else None,
+            'cursor': (last_id, last_at),
+            'notifications': fresh,
+        }
+    finally:
+        # Streams are long-lived; do not pin a database connection between reads.
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+def _changes(previous, current):
+    for notification in current['notifications']:
+        yield _sse('notification', notification)
+    if current['unread_count'] != previous['unread_count']:
+        yield _sse('unread', {'unread_count': current['unread_count']})
+    if (current['balance'], current['vip_expiry']) != (previous['balance'], previous['vip_expiry']):
+        yield _sse('balance', {'balance': current['balance'], 'vip_expiry': current['vip_expiry']})
+
+
+async def user_event_stream(user_id, serialize_notification):
+    """Async generator of SSE frames for one user; ends after REALTIME_STREAM_MAX_AGE."""
+    load_state = sync_to_async(_load_state)
+    loop = asyncio.get_running_loop()
+    waiter = _subscribe(user_id)
+    try:
+        version = await cache.aget(_channel_key(user_id))
+        state = await load_state(user_id, None, serialize_notification)
+        yield f'retry: {REALTIME_RECONNECT_MS}\n' + _sse('state', {
+            'unread_count': state['unread_count'],
+            'balance': state['balance'],
+            'vip_expiry': state['vip_expiry'],
+        })
+
+        started = last_read = last_sent = loop.time()
+        while loop.time() - started < REALTIME_STREAM_MAX_AGE:
+            try:
+                await asyncio.wait_for(waiter[1].wait(), timeout=REALTIME_STREAM_TICK)
+            except asyncio.TimeoutError:
+                pass
+            woken = waiter[1].is_set()
+            waiter[1].clear()
+
+            now = loop.time()
+            current_version = await cache.aget(_channel_key(user_id))
+            if woken or current_version != version or now - last_read >= REALTIME_DB_POLL_INTERVAL:
+                version, last_read = current_version, now
+                current = await load_state(user_id, state['cursor'], serialize_notification)
+                for frame in _changes(state, current):
+                    last_sent = now
+                    yield frame
+                state = current
+                if len(current['notifications']) == REALTIME_NOTIFICATION_BATCH:
+                    # More may be waiting; read again on the next tick.
+                    waiter[1].set()
+            if now - last_sent >= REALTIME_KEEPALIVE_INTERVAL:
+                last_sent = now
+                yield ': keepalive\n\n'
+    finally:
+        _unsubscribe(user_id, waiter)
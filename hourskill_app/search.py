@@ -0,0 +1,218 @@
+"""Full-text catalog search over accent-folded video and course text.
+
+Every active video and course has one SearchDocument row holding its title,
+description and category folded to lowercase ASCII-ish tokens, so "ky nang"
+matches "Kỹ năng". The rows are mirrored into the database's own inverted
+index and ranked there:
+
+* SQLite: the FTS5 table ``hourskill_search_fts`` (rowid = document id),
+  ranked with bm25.
+* PostgreSQL: the generated ``search_vector`` tsvector column with a GIN
+  index, ranked with ts_rank_cd.
+* Anything else (or SQLite built without FTS5): token containment on the
+  folded columns, ranked in Python.
+
+Documents are kept in sync by the post_save/post_delete hooks in signals.py;
+``rebuild_search_index`` repairs rows written through bulk operations.
+"""
+
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Course, SearchDocument, Video
+
+
+FTS_TABLE = 'hourskill_search_fts'
+# Relative weights of the title, body and category columns.
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+CATEGORY_WEIGHT = 4.0
+MAX_QUERY_TOKENS = 8
+
+_TOKEN_RE = re.compile(r'\w+')
+_backend_by_alias = {}
+
+
+def fold_text(value):
+    """Lowercase, strip diacritics (including đ) and collapse to space-separated tokens."""
+    if not value:
+        return ''
+    value = str(value).replace('đ', 'd').replace('Đ', 'D')
+    decomposed = unicodedata.normalize('NFKD', value)
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return ' '.join(_TOKEN_RE.findall(stripped.lower()))
+
+
+def query_tokens(query):
+    """Folded, de-duplicated query tokens in input order (capped at MAX_QUERY_TOKENS)."""
+    tokens = []
+    for token in fold_text(query).split():
+        if token not in tokens:
+            tokens.append(token)
+    return tokens[:MAX_QUERY_TOKENS]
+
+
+def search_backend():
+    """Return 'fts5', 'postgres' or 'basic' for the default database connection."""
+    alias = connection.alias
+    backend = _backend_by_alias.get(alias)
+    if backend is None:
+        backend = 'basic'
+        if connection.vendor == 'postgresql':
+            backend = 'postgres'
+        elif connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+                if cursor.fetchone():
+                    backend = 'fts5'
+        _backend_by_alias[alias] = backend
+    return backend
+
+
+def _sync_fts_row(document):
+    if search_backend() != 'fts5':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [document.id])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, body, category) VALUES (%s, %s, %s, %s)',
+            [document.id, document.title, document.body, document.category],
+        )
+
+
+def _upsert_document(kind, object_id, title, body, category):
+    document, _ = SearchDocument.objects.update_or_create(
+        kind=kind,
+        object_id=object_id,
+        defaults={
+            'title': fold_text(title),
+            'body': fold_text(body),
+            'category': fold_text(category),
+        },
+    )
+    _sync_fts_row(document)
+    return document
+
+
+def remove_document(kind, object_id):
+    """Drop a video or course from the index."""
+    document_ids = list(
+        SearchDocument.objects.filter(kind=kind, object_id=object_id).values_list('id', flat=True)
+    )
+    if not document_ids:
+        return
+    if search_backend() == 'fts5':
+        with connection.cursor() as cursor:
+            for document_id in document_ids:
+                cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [document_id])
+    SearchDocument.objects.filter(id__in=document_ids).delete()
+
+
+def index_video(video):
+    """Index an active video or remove it from the index when hidden."""
+    if not video.is_active or video.is_deleted:
+        remove_document(SearchDocument.KIND_VIDEO, video.id)
+        return
+    category = video.category.name if video.category_id and video.category else ''
+    _upsert_document(SearchDocument.KIND_VIDEO, video.id, video.title, video.description, category)
+
+
+def index_course(course):
+    """Index an active course or remove it from the index when hidden."""
+    if not course.is_active or course.is_deleted:
+        remove_document(SearchDocument.KIND_COURSE, course.id)
+        return
+    category = ' '.join(
+        part for part in (
+            course.category_text,
+            course.category.name if course.category_id and course.category else '',
+        ) if part
+    )
+    _upsert_document(SearchDocument.KIND_COURSE, course.id, course.title, course.description, category)
+
+
+def _search_fts5(tokens, kinds, limit):
+    match = ' '.join(f'"{token}"*' for token in tokens)
+    placeholders = ', '.join(['%s'] * len(kinds))
+    sql = (
+        f'SELECT d.kind, d.object_id, bm25({FTS_TABLE}, %s, %s, %s) AS score '
+        f'FROM {FTS_TABLE} JOIN {SearchDocument._meta.db_table} d ON d.id = {FTS_TABLE}.rowid '
+        f'WHERE {FTS_TABLE} MATCH %s AND d.kind IN ({placeholders}) '
+        f'ORDER BY score LIMIT %s'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [TITLE_WEIGHT, BODY_WEIGHT, CATEGORY_WEIGHT, match, *kinds, limit])
+        # bm25 is negative with better matches lower; flip it so higher is better.
+        return [(kind, object_id, -score) for kind, object_id, score in cursor.fetchall()]
+
+
+def _search_postgres(tokens, kinds, limit):
+    tsquery = ' & '.join(f'{token}:*' for token in tokens)
+    placeholders = ', '.join(['%s'] * len(kinds))
+    sql = (
+        f'SELECT d.kind, d.object_id, ts_rank_cd(d.search_vector, q) AS score '
+        f"FROM {SearchDocument._meta.db_table} d, to_tsquery('simple', %s) q "
+        f'WHERE d.search_vector @@ q AND d.kind IN ({placeholders}) '
+        f'ORDER BY score DESC LIMIT %s'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [tsquery, *kinds, limit])
+        return [(kind, object_id, float(score)) for kind, object_id, score in cursor.fetchall()]
+
+
+def _search_basic(tokens, kinds, limit):
+    documents = SearchDocument.objects.filter(kind__in=kinds)
+    for token in tokens:
+        documents = documents.filter(
+            Q(title__contains=token) | Q(body__contains=token) | Q(category__contains=token)
+        )
+    scored = []
+    for document in documents.only('kind', 'object_id', 'title', 'body', 'category').iterator():
+        score = sum(
+            TITLE_WEIGHT * (token in document.title)
+            + CATEGORY_WEIGHT * (token in document.category)
+            + BODY_WEIGHT * (token in document.body)
+            for token in tokens
+        )
+        scored.append((document.kind, document.object_id, score))
+    scored.sort(key=lambda row: (-row[2], row[0], row[1]))
+    return scored[:limit]
+
+
+def search(query, kinds=None, limit=20):
+    """Return [(kind, object_id, score)] best match first; every token must prefix-match."""
+    tokens = query_tokens(query)
+    kinds = list(kinds or (SearchDocument.KIND_VIDEO, SearchDocument.KIND_COURSE))
+    if not tokens or not kinds:
+        return []
+    backend = search_backend()
+    if backend == 'fts5':
+        return _search_fts5(tokens, kinds, limit)
+    if backend == 'postgres':
+        return _search_postgres(tokens, kinds, limit)
+    return _search_basic(tokens, kinds, limit)
+
+
+def rebuild_search_index(chunk_size=500):
+    """Re-index every video and course from scratch; returns (videos, courses) indexed."""
+    SearchDocument.objects.all().delete()
+    if search_backend() == 'fts5':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+    videos = 0
+    for video in Video.objects.filter(is_active=True, is_deleted=False).select_related('category').iterator(
+        chunk_size=chunk_size
+    ):
+        index_video(video)
+        videos += 1
+    courses = 0
+    for course in Course.objects.filter(is_active=True, is_deleted=False).select_related('category').iterator(
+        chunk_size=chunk_size
+    ):
+        index_course(course)
+        courses += 1
+    return videos, courses
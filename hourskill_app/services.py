@@ -1,9 +1,8 @@
 from decimal import Decimal
 from math import ceil
 
-from django.db import transaction
-
-from .models import Transaction, Wallet
+from .models import Transaction
+from .money import run_money_operation
 
 
 def transfer_tc(sender_user, receiver_user, amount_tc, tx_type):
@@ -20,11 +19,11 @@ def transfer_tc(sender_user, receiver_user, amount_tc, tx_type):
     if amount <= 0:
         raise ValueError("Transfer amount must be positive.")
 
-    # Wrap balance moves and ledger creation in a single atomic transaction
-    with transaction.atomic():
-        # Lock both wallets to prevent concurrent balance races
-        sender_wallet = Wallet.objects.select_for_update().get(user=sender_user)
-        receiver_wallet = Wallet.objects.select_for_update().get(user=receiver_user)
+    def _transfer(locks):
+        # Both wallets in one pk-ordered lock, so opposite transfers cannot deadlock
+        wallets = locks.wallets([sender_user.id, receiver_user.id])
+        sender_wallet = wallets[sender_user.id]
+        receiver_wallet = wallets[receiver_user.id]
 
         if sender_wallet.balance < amount:
             raise ValueError("Số dư TC không đủ để thực hiện giao dịch.")
@@ -46,8 +45,10 @@ def transfer_tc(sender_user, receiver_user, amount_tc, tx_type):
         receiver_wallet.save(update_fields=['balance', 'updated_at'])
 
         return new_transaction
-    
-    
+
+    return run_money_operation('transfer', _transfer)
+
+
 def process_view_payment(user, video):
     """Deduct viewer TC, credit creator, and log the ledger atomically.
 
@@ -72,29 +73,22 @@ def process_view_payment(user, video):
         )
         return Decimal('0.00')
 
-    try:
-        with transaction.atomic():
-            viewer_wallet = Wallet.objects.select_for_update().get(user=user)
-
-            if viewer_wallet.balance < amount:
-                raise ValueError("Số dư TC không đủ để xem video này.")
-
-            viewer_wallet.balance -= amount
-            viewer_wallet.save(update_fields=['balance', 'updated_at'])
-
-            # Record the view for creator revenue pooling (no immediate credit)
-            Transaction.objects.create(
-                sender=user,
-                receiver=video.creator,
-                tx_type='VIEW_POINT',
-                amount_tc=amount,
-                reference_video=video,
-                status='SUCCESS',
-            )
-    except Exception:
-        # Propagate for caller to handle and surface
-        raise
+    def _charge_view(locks):
+        if locks.debit(user.id, amount) is None:
+            raise ValueError("Số dư TC không đủ để xem video này.")
+
+        # Record the view for creator revenue pooling (no immediate credit)
+        Transaction.objects.create(
+            sender=user,
+            receiver=video.creator,
+            tx_type='VIEW_POINT',
+            amount_tc=amount,
+            reference_video=video,
+            status='SUCCESS',
+        )
 
+    # Errors propagate for the caller to handle and surface
+    run_money_operation('view_payment', _charge_view)
     return amount
 from .models import Video
 from django.contrib.auth.models import User
@@ -0,0 +1,41 @@
+"""Whether the default cache is shared between worker processes.
+
+Several modules keep cross-request state in the Django cache: the catalog
+version, auth snapshots, unlocked-id sets and the watch-heartbeat buffer.
+That is only correct when every worker talks to the same cache (Redis,
+Memcached, database). ``cache_is_shared`` lets callers fall back to the
+database otherwise, and the system check below warns when a non-debug
+deployment runs on a per-process cache.
+"""
+
+from django.conf import settings
+from django.core import checks
+
+
+# Backends whose entries live inside one process (or nowhere).
+_PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_is_shared():
+    """True when the default cache is visible to every worker; CACHE_IS_SHARED overrides."""
+    override = getattr(settings, 'CACHE_IS_SHARED', None)
+    if override is not None:
+        return bool(override)
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    return backend not in _PROCESS_LOCAL_BACKENDS
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    if cache_is_shared():
+        return []
+    return [
+        checks.Warning(
+            'The default cache is per-process.',
+            hint='Set REDIS_URL so catalog versions, auth snapshots and buffered watch heartbeats are shared by all workers.',
+            id='hourskill_app.W001',
+        )
+    ]
@@ -1,10 +1,16 @@
 from decimal import Decimal
 
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
-from .models import UserProfile, Wallet
+from .auth import invalidate_user_snapshot
+from .catalog_cache import bump_catalog_version
+from .models import Category, Course, Notification, SearchDocument, UserProfile, Video, VideoAccess, Wallet, WatchSession
+from .notification_counters import bump_unread_counts
+from .search import index_course, index_video, remove_document
+from .suggest import KIND_COURSE, KIND_CREATOR, KIND_VIDEO, record_change, record_course, record_creator, record_video
+from .unlocks import invalidate_unlocked_ids
 
 
 User = get_user_model()
@@ -17,17 +23,126 @@ def create_user_relations(sender, instance, created, **kwargs):
     if not created:
         return
 
-    wallet, created_wallet = Wallet.objects.get_or_create(user=instance)
-    if created_wallet:
-        wallet.balance = Decimal('30.00')
-        wallet.save(update_fields=['balance'])
-
-    # Profile keeps lightweight wallet_balance for quick reads
-    UserProfile.objects.get_or_create(
-        user=instance,
-        defaults={
-            'wallet_balance': 30,
-            'balance_tc': Decimal('30.00'),
-        },
-    )
-        
\ No newline at end of file
+    # The wallet is the single balance/VIP row; profile balance fields read from it.
+    Wallet.objects.get_or_create(user=instance, defaults={'balance': Decimal('30.00')})
+    UserProfile.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_auth_snapshot(sender, instance, **kwargs):
+    """Drop the cached auth snapshot whenever the user row changes."""
+    invalidate_user_snapshot(instance.pk)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+@receiver(post_save, sender=Wallet)
+@receiver(post_delete, sender=Wallet)
+def invalidate_profile_auth_snapshot(sender, instance, **kwargs):
+    """Profile and wallet fields are part of the auth snapshot, so drop it on change."""
+    invalidate_user_snapshot(instance.user_id)
+
+
+@receiver(post_save, sender=Notification)
+def count_created_notification(sender, instance, created, **kwargs):
+    """Single creates (admin, scripts) bump the counter; the outbox worker counts its batches itself."""
+    if created and not instance.is_read:
+        bump_unread_counts({instance.recipient_id: 1})
+
+
+@receiver(post_delete, sender=Notification)
+def uncount_deleted_notification(sender, instance, **kwargs):
+    if not instance.is_read:
+        bump_unread_counts({instance.recipient_id: -1})
+
+
+@receiver(post_delete, sender=VideoAccess)
+@receiver(post_delete, sender=WatchSession)
+def invalidate_user_unlocked_ids(sender, instance, **kwargs):
+    """Revoked access must not linger in the cached unlocked-id set."""
+    invalidate_unlocked_ids(instance.user_id)
+
+
+@receiver(post_save, sender=Video)
+def index_video_for_search(sender, instance, **kwargs):
+    """Keep the video's search document in step with its text and visibility."""
+    index_video(instance)
+
+
+@receiver(post_save, sender=Course)
+def index_course_for_search(sender, instance, **kwargs):
+    """Keep the course's search document in step with its text and visibility."""
+    index_course(instance)
+
+
+@receiver(post_delete, sender=Video)
+def remove_video_from_search(sender, instance, **kwargs):
+    """Hard deletes skip the soft-delete save, so drop the document here."""
+    remove_document(SearchDocument.KIND_VIDEO, instance.pk)
+
+
+@receiver(post_delete, sender=Course)
+def remove_course_from_search(sender, instance, **kwargs):
+    """Hard deletes skip the soft-delete save, so drop the document here."""
+    remove_document(SearchDocument.KIND_COURSE, instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_for_search(sender, instance, created, **kwargs):
+    """Category names are indexed with their videos and courses."""
+    if created:
+        return
+    for video in Video.objects.filter(category=instance, is_active=True, is_deleted=False).select_related('category'):
+        index_video(video)
+    for course in Course.objects.filter(category=instance, is_active=True, is_deleted=False).select_related('category'):
+        index_course(course)
+
+
+@receiver(post_save, sender=Video)
+def update_video_suggestions(sender, instance, **kwargs):
+    record_video(instance)
+
+
+@receiver(post_save, sender=Course)
+def update_course_suggestions(sender, instance, **kwargs):
+    record_course(instance)
+
+
+@receiver(post_save, sender=User)
+def update_creator_suggestions(sender, instance, created, update_fields=None, **kwargs):
+    """Only username/role/activation changes affect suggestions (skips last_login saves)."""
+    if created and not instance.is_creator:
+        return
+    if update_fields and not {'username', 'is_creator', 'is_active'} & set(update_fields):
+        return
+    record_creator(instance)
+
+
+@receiver(post_delete, sender=Video)
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=User)
+def remove_deleted_suggestion(sender, instance, **kwargs):
+    kind = {Video: KIND_VIDEO, Course: KIND_COURSE}.get(sender, KIND_CREATOR)
+    record_change(kind, instance.pk, None)
+
+
+@receiver(post_save, sender=Video)
+@receiver(post_delete, sender=Video)
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_responses(sender, instance, **kwargs):
+    """Any catalog content change retires every cached catalog payload."""
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=User)
+def invalidate_catalog_on_creator_rename(sender, instance, created, update_fields=None, **kwargs):
+    """Listings embed creator usernames."""
+    if created or not instance.is_creator:
+        return
+    if update_fields and 'username' not in update_fields:
+        return
+    bump_catalog_version()
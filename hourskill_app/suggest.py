@@ -0,0 +1,294 @@
+"""In-process typeahead index over video titles, course titles and creator names.
+
+Each worker keeps a sorted list of accent-folded keys and answers prefix
+lookups with ``bisect`` — no database or cache round trip per keystroke.
+Every word start of a label is indexed, so "giao" suggests "Kỹ năng giao
+tiếp".
+
+Content changes are applied incrementally. On commit the writer patches its
+own index (a ``bisect`` delete/insert per word start, no re-sort) and
+appends the change to a numbered log in the shared cache. Other workers
+check the log head at most every ``SUGGEST_VERSION_CHECK_SECONDS`` and
+replay only the entries they have not seen. A compact snapshot
+(zlib-compressed JSON) plus the log position it covers lets a new worker
+start without the database; it is rewritten every
+``SUGGEST_COMPACT_EVERY`` changes by whichever worker gets the lock, and
+losing that lock just postpones compaction. The database is only read when
+there is no snapshot or the log has a gap (evicted entries).
+"""
+
+import json
+import threading
+import time
+import zlib
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Course, User, Video
+from .search import fold_text
+
+
+KIND_VIDEO = 'video'
+KIND_COURSE = 'course'
+KIND_CREATOR = 'creator'
+
+SUGGEST_CACHE_PREFIX = 'suggest-index'
+SUGGEST_CACHE_TTL = getattr(settings, 'SUGGEST_SNAPSHOT_CACHE_TTL', 24 * 60 * 60)
+SUGGEST_VERSION_CHECK_SECONDS = getattr(settings, 'SUGGEST_VERSION_CHECK_SECONDS', 2)
+# Log entries between snapshots, and the longest gap replayed instead of reloading.
+SUGGEST_COMPACT_EVERY = getattr(settings, 'SUGGEST_COMPACT_EVERY', 500)
+MAX_REPLAY = 5000
+# Word starts indexed per label and candidate keys scanned per lookup.
+MAX_WORDS_PER_LABEL = 8
+MAX_SCAN = 256
+_LOCK_TTL_SECONDS = 10
+
+_SNAPSHOT_KEY = f'{SUGGEST_CACHE_PREFIX}:snapshot'
+_SEQ_KEY = f'{SUGGEST_CACHE_PREFIX}:seq'
+_LOCK_KEY = f'{SUGGEST_CACHE_PREFIX}:lock'
+
+
+def _change_key(seq):
+    return f'{SUGGEST_CACHE_PREFIX}:change:{seq}'
+
+
+def _label_rows(ref, label):
+    words = fold_text(label).split()
+    # Position-0 keys sort ahead of later word starts with the same text.
+    return [(' '.join(words[position:]), position, ref) for position in range(min(len(words), MAX_WORDS_PER_LABEL))]
+
+
+class _PrefixIndex:
+    """Sorted (key, position, ref) rows patched in place under the module lock.
+
+    Lookups do not take the lock; a row shifting under a concurrent patch can
+    at worst hide or repeat one suggestion for that keystroke.
+    """
+
+    __slots__ = ('entries', 'rows')
+
+    def __init__(self, entries):
+        # entries: {(kind, object_id): label}
+        self.entries = dict(entries)
+        self.rows = sorted(row for ref, label in self.entries.items() for row in _label_rows(ref, label))
+
+    def apply(self, ref, label):
+        """Upsert (label) or remove (label=None) one entry; returns whether anything changed."""
+        previous = self.entries.get(ref)
+        if previous == label:
+            return False
+        if previous is not None:
+            for row in _label_rows(ref, previous):
+                index = bisect_left(self.rows, row)
+                if index < len(self.rows) and self.rows[index] == row:
+                    del self.rows[index]
+        if label is None:
+            self.entries.pop(ref, None)
+        else:
+            self.entries[ref] = label
+            for row in _label_rows(ref, label):
+                insort(self.rows, row)
+        return True
+
+    def lookup(self, prefix, limit):
+        rows = self.rows
+        start = bisect_left(rows, (prefix,))
+        found = {}
+        for key, position, ref in rows[start:start + MAX_SCAN]:
+            if not key.startswith(prefix):
+                break
+            if ref not in found or position < found[ref]:
+                found[ref] = position
+        labels = {ref: self.entries.get(ref) for ref in found}
+        ranked = sorted(
+            (ref for ref in found if labels[ref] is not None),
+            key=lambda ref: (found[ref], len(labels[ref]), labels[ref], ref),
+        )
+        return [(kind, object_id, labels[(kind, object_id)]) for kind, object_id in ranked[:limit]]
+
+
+_state_lock = threading.Lock()
+_index = None
+# Last log entry reflected in _index, and the one the shared snapshot covers.
+_applied_seq = 0
+_snapshot_seq = 0
+_checked_at = 0.0
+# _applied_seq value at which replay last stopped on a missing entry.
+_stalled = None
+
+
+def _load_entries_from_db():
+    entries = {}
+    for object_id, title in Video.objects.filter(is_active=True, is_deleted=False).values_list('id', 'title').iterator():
+        entries[(KIND_VIDEO, object_id)] = title
+    for object_id, title in Course.objects.filter(is_active=True, is_deleted=False).values_list('id', 'title').iterator():
+        entries[(KIND_COURSE, object_id)] = title
+    for object_id, username in User.objects.filter(is_creator=True, is_active=True).values_list('id', 'username').iterator():
+        entries[(KIND_CREATOR, object_id)] = username
+    return entries
+
+
+def _pack(entries, seq):
+    rows = [[kind, object_id, label] for (kind, object_id), label in entries.items()]
+    payload = {'seq': seq, 'rows': rows}
+    return zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+def _unpack(raw):
+    payload = json.loads(zlib.decompress(raw))
+    entries = {(kind, object_id): label for kind, object_id, label in payload['rows']}
+    return entries, payload['seq']
+
+
+def _current_seq():
+    seq = cache.get(_SEQ_KEY)
+    if seq is None:
+        cache.add(_SEQ_KEY, 0, timeout=None)
+        seq = cache.get(_SEQ_KEY) or 0
+    return int(seq)
+
+
+def _read_changes(first, last):
+    """Log entries first..last in order, stopping before the first missing one."""
+    if last < first:
+        return []
+    keys = [_change_key(seq) for seq in range(first, last + 1)]
+    found = cache.get_many(keys)
+    changes = []
+    for key in keys:
+        if key not in found:
+            break
+        changes.append(found[key])
+    return changes
+
+
+def _replay(index, changes):
+    for kind, object_id, label in changes:
+        index.apply((kind, object_id), label)
+
+
+def _load(seq):
+    """Fresh index reflecting log position ``seq``: snapshot + log tail, else the database."""
+    global _snapshot_seq
+
+    raw = cache.get(_SNAPSHOT_KEY)
+    if raw is not None:
+        entries, snapshot_seq = _unpack(raw)
+        changes = _read_changes(snapshot_seq + 1, seq) if snapshot_seq <= seq else None
+        if changes is not None and snapshot_seq + len(changes) == seq:
+            index = _PrefixIndex(entries)
+            _replay(index, changes)
+            _snapshot_seq = snapshot_seq
+            return index
+    index = _PrefixIndex(_load_entries_from_db())
+    # Changes logged while the rows were read are upserts/removals, so replaying them is harmless.
+    _replay(index, _read_changes(seq + 1, _current_seq()))
+    cache.set(_SNAPSHOT_KEY, _pack(index.entries, seq), timeout=SUGGEST_CACHE_TTL)
+    _snapshot_seq = seq
+    return index
+
+
+def _maybe_compact():
+    """Rewrite the snapshot from this worker's index once the log has grown; skip if another worker is at it."""
+    global _snapshot_seq
+
+    if _applied_seq - _snapshot_seq < SUGGEST_COMPACT_EVERY:
+        return
+    if not cache.add(_LOCK_KEY, 1, timeout=_LOCK_TTL_SECONDS):
+        return
+    try:
+        cache.set(_SNAPSHOT_KEY, _pack(_index.entries, _applied_seq), timeout=SUGGEST_CACHE_TTL)
+        _snapshot_seq = _applied_seq
+    finally:
+        cache.delete(_LOCK_KEY)
+
+
+def _sync():
+    """Bring the local index up to the log head; call with ``_state_lock`` held."""
+    global _index, _applied_seq, _stalled
+
+    seq = _current_seq()
+    if _index is not None and _applied_seq < seq <= _applied_seq + MAX_REPLAY:
+        changes = _read_changes(_applied_seq + 1, seq)
+        _replay(_index, changes)
+        _applied_seq += len(changes)
+        if _applied_seq < seq:
+            # An entry is missing: a writer between incr and set, or an eviction.
+            # Give the writer one check interval before treating it as a gap.
+            if _stalled != _applied_seq:
+                _stalled = _applied_seq
+                return
+    if _index is None or _applied_seq != seq:
+        # First use, a log gap, or the counter restarted (cache flushed).
+        _index = _load(seq)
+        _applied_seq = seq
+    _stalled = None
+    _maybe_compact()
+
+
+def _current_index():
+    global _checked_at
+
+    now = time.monotonic()
+    if _index is not None and now - _checked_at < SUGGEST_VERSION_CHECK_SECONDS:
+        return _index
+
+    with _state_lock:
+        if _index is not None and now - _checked_at < SUGGEST_VERSION_CHECK_SECONDS:
+            return _index
+        _sync()
+        _checked_at = now
+        return _index
+
+
+def suggest(query, limit=8):
+    """Return [(kind, object_id, label)] whose words start with the folded query."""
+    prefix = fold_text(query)
+    if not prefix:
+        return []
+    return _current_index().lookup(prefix, limit)
+
+
+def _apply_change(ref, label):
+    with _state_lock:
+        if _index is not None:
+            # Compare against the current shared state, not a stale local copy.
+            _sync()
+            if not _index.apply(ref, label):
+                # Already reflected (e.g. a save that did not touch the label).
+                return
+    seq = _current_seq()
+    try:
+        seq = cache.incr(_SEQ_KEY)
+    except ValueError:
+        # Counter evicted; readers notice the restart and reload.
+        cache.add(_SEQ_KEY, seq + 1, timeout=None)
+        seq = seq + 1
+    cache.set(_change_key(seq), [ref[0], ref[1], label], timeout=SUGGEST_CACHE_TTL)
+
+
+def record_change(kind, object_id, label):
+    """Upsert (label) or remove (label=None) an entry once the transaction commits."""
+    ref = (kind, object_id)
+    transaction.on_commit(lambda: _apply_change(ref, label))
+
+
+def record_video(video):
+    """Track a video's title; hidden or soft-deleted videos drop out."""
+    visible = video.is_active and not video.is_deleted
+    record_change(KIND_VIDEO, video.id, video.title if visible else None)
+
+
+def record_course(course):
+    """Track a course's title; hidden or soft-deleted courses drop out."""
+    visible = course.is_active and not course.is_deleted
+    record_change(KIND_COURSE, course.id, course.title if visible else None)
+
+
+def record_creator(user):
+    """Track a creator's username; non-creators and inactive users drop out."""
+    visible = user.is_creator and user.is_active
+    record_change(KIND_CREATOR, user.id, user.username if visible else None)
@@ -1,3 +1,844 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from . import auth, money, realtime, suggest, views, watch_heartbeats
+from .creator_stats import rank_creators
+from .ledger import ledger_head
+from .money import LockOrderError, LockSet, reset_retry_metrics, retry_metrics, run_money_operation
+from .models import (
+    CommentReview,
+    Course,
+    CreatorAccount,
+    CreatorRevenueEntry,
+    CreatorStats,
+    IdempotencyKey,
+    LedgerCheckpoint,
+    Notification,
+    NotificationCounter,
+    NotificationOutbox,
+    User,
+    UserProfile,
+    Video,
+    VideoAccess,
+    Wallet,
+    WatchSession,
+)
+from .notification_outbox import drain_outbox, enqueue_notification
+from .notification_templates import render_text
+from .search import fold_text
+from .unlocks import get_unlocked_ids, record_unlock
+from .views import _issue_token, _stream_user, _watchable_video_ids
+
+
+class ApiTestCase(TestCase):
+    """A viewer and a creator with bearer tokens, on a clean cache."""
+
+    def setUp(self):
+        cache.clear()
+        auth._local_snapshots.clear()
+        self.viewer = User.objects.create_user('viewer', 'viewer@example.com', 'pw-12345678')
+        self.creator = User.objects.create_user('creator', 'creator@example.com', 'pw-12345678', is_creator=True)
+        self.viewer_headers = {'HTTP_AUTHORIZATION': f'Bearer {_issue_token(self.viewer)}'}
+        self.creator_headers = {'HTTP_AUTHORIZATION': f'Bearer {_issue_token(self.creator)}'}
+
+    def make_video(self, title='Video', **fields):
+        fields.setdefault('duration_seconds', 600)
+        return Video.objects.create(title=title, creator=self.creator, file_url='videos/x.mp4', **fields)
+
+    def api_get(self, url, headers=None, **extra):
+        return self.client.get(url, **(self.viewer_headers if headers is None else headers), **extra)
+
+    def api_post(self, url, data=None, headers=None, **extra):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                url,
+                json.dumps(data or {}),
+                content_type='application/json',
+                **(self.viewer_headers if headers is None else headers),
+                **extra,
+            )
+
+
+class UnlockedIdsCacheTests(ApiTestCase):
+    def test_stale_cached_set_does_not_hide_a_committed_purchase(self):
+        video = self.make_video(base_price=10)
+        # Cached before the purchase commits, as a concurrent reader would.
+        self.assertNotIn(video.id, get_unlocked_ids(self.viewer.id)[0])
+        VideoAccess.objects.create(user=self.viewer, video=video)
+
+        response = self.api_get(f'/api/manage/videos/{video.id}/')
+        self.assertFalse(response.json()['is_locked'])
+        self.assertTrue(response.json()['file_url'])
+
+    def test_commit_retires_the_cached_set(self):
+        video = self.make_video(base_price=10)
+        get_unlocked_ids(self.viewer.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            VideoAccess.objects.create(user=self.viewer, video=video)
+            record_unlock(self.viewer.id, video)
+        self.assertIn(video.id, get_unlocked_ids(self.viewer.id)[0])
+
+
+class WatchableVideoIdsTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.free = self.make_video('Free', is_free=True)
+        self.bought = self.make_video('Bought', base_price=10)
+        self.legacy = self.make_video('Legacy', base_price=10)
+        self.locked = self.make_video('Locked', base_price=10)
+        self.own = Video.objects.create(title='Own', creator=self.viewer, file_url='videos/x.mp4', duration_seconds=600)
+        VideoAccess.objects.create(user=self.viewer, video=self.bought)
+        WatchSession.objects.create(user=self.viewer, video=self.legacy, is_unlocked=True)
+
+    def test_resolves_every_access_rule(self):
+        videos = [self.free, self.bought, self.legacy, self.locked, self.own]
+        self.assertEqual(
+            _watchable_video_ids(self.viewer, videos),
+            {self.free.id, self.bought.id, self.legacy.id, self.own.id},
+        )
+        self.assertEqual(_watchable_video_ids(None, videos), set())
+
+    def test_vip_watches_everything(self):
+        Wallet.objects.filter(user=self.viewer).update(vip_expiry=timezone.now() + timedelta(days=1))
+        self.viewer.refresh_from_db()
+        self.assertIn(self.locked.id, _watchable_video_ids(self.viewer, [self.locked]))
+
+    def test_query_count_does_not_grow_with_the_listing(self):
+        more = [self.make_video(f'Extra {i}', base_price=10) for i in range(20)]
+        _watchable_video_ids(self.viewer, [self.locked])
+        with self.assertNumQueries(0):
+            _watchable_video_ids(self.viewer, [self.locked, *more])
+
+
+class BearerSnapshotTests(ApiTestCase):
+    def test_deactivated_user_stops_authenticating(self):
+        self.assertEqual(self.api_get('/api/me/').status_code, 200)
+        self.viewer.is_active = False
+        self.viewer.save(update_fields=['is_active'])
+        self.assertEqual(self.api_get('/api/me/').status_code, 401)
+
+    def test_repeat_lookups_hit_the_snapshot(self):
+        auth.load_user(self.viewer.id)
+        with self.assertNumQueries(0):
+            user = auth.load_user(self.viewer.id)
+        self.assertEqual(user.wallet.balance, Decimal('30.00'))
+
+    def test_wallet_save_drops_the_snapshot(self):
+        auth.load_user(self.viewer.id)
+        wallet = Wallet.objects.get(user=self.viewer)
+        wallet.balance = Decimal('75.00')
+        wallet.save()
+        self.assertEqual(auth.load_user(self.viewer.id).wallet.balance, Decimal('75.00'))
+
+    def test_local_cache_keeps_snapshots_short_lived(self):
+        with self.settings(CACHE_IS_SHARED=False):
+            self.assertEqual(auth._snapshot_cache_ttl(), min(auth.SNAPSHOT_CACHE_TTL, auth.SNAPSHOT_LOCAL_TTL))
+        with self.settings(CACHE_IS_SHARED=True):
+            self.assertEqual(auth._snapshot_cache_ttl(), auth.SNAPSHOT_CACHE_TTL)
+
+
+class CreatorViewsTests(ApiTestCase):
+    def test_purchase_counts_the_view_after_commit(self):
+        video = self.make_video(base_price=10)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(
+                '/api/purchase-video/',
+                json.dumps({'video_id': video.id}),
+                content_type='application/json',
+                **self.viewer_headers,
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertFalse(CreatorStats.objects.filter(user=self.creator, total_views__gt=0).exists())
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(CreatorStats.objects.get(user=self.creator).total_views, 1)
+
+
+class RatingAggregateTests(ApiTestCase):
+    def _rate(self, video, rating):
+        return self.api_post(f'/api/video/{video.id}/comment/', {'content': 'Hay', 'rating': rating})
+
+    def test_reviews_bump_the_counters(self):
+        video = self.make_video(base_price=10)
+        self.assertEqual(self._rate(video, 5).status_code, 200)
+        self.assertEqual(self._rate(video, 4).status_code, 200)
+        video.refresh_from_db()
+        self.assertEqual((video.rating_count, video.rating_sum), (2, 9))
+        self.assertEqual(video.avg_rating, 4.5)
+        self.assertEqual(CreatorStats.objects.get(user=self.creator).rating_count, 2)
+
+    def test_rebuild_fixes_drifted_counters(self):
+        video = self.make_video(base_price=10)
+        CommentReview.objects.create(user=self.viewer, video=video, content='Hay', rating=3)
+        Video.objects.filter(pk=video.pk).update(rating_count=7, rating_sum=1)
+
+        out = StringIO()
+        call_command('rebuild_video_ratings', '--dry-run', stdout=out)
+        self.assertIn('Videos with drifted counters: 1', out.getvalue())
+        video.refresh_from_db()
+        self.assertEqual(video.rating_count, 7)
+
+        call_command('rebuild_video_ratings', '--chunk-size', '1', stdout=StringIO())
+        video.refresh_from_db()
+        self.assertEqual((video.rating_count, video.rating_sum), (1, 3))
+
+
+class FollowCounterTests(ApiTestCase):
+    def _counts(self, user):
+        stats = CreatorStats.objects.filter(user=user).values_list('follower_count', 'following_count').first()
+        return stats or (0, 0)
+
+    def test_toggle_moves_both_counters(self):
+        body = self.api_post(f'/api/follow/{self.creator.id}/').json()
+        self.assertEqual((body['is_following'], body['followers_count']), (True, 1))
+        self.assertEqual(self._counts(self.creator)[0], 1)
+        self.assertEqual(self._counts(self.viewer)[1], 1)
+
+        body = self.api_post(f'/api/follow/{self.creator.id}/').json()
+        self.assertEqual((body['is_following'], body['followers_count']), (False, 0))
+        self.assertEqual(self._counts(self.creator)[0], 0)
+        self.assertEqual(self._counts(self.viewer)[1], 0)
+
+    def test_reconcile_repairs_drifted_counters(self):
+        self.api_post(f'/api/follow/{self.creator.id}/')
+        CreatorStats.objects.filter(user=self.creator).update(follower_count=9)
+        out = StringIO()
+        call_command('reconcile_follow_counts', stdout=out)
+        self.assertIn('Rows with drifted counters: 1', out.getvalue())
+        self.assertEqual(self._counts(self.creator)[0], 1)
+
+
+class CatalogResponseCacheTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        Course.objects.create(title='Giải tích 1', instructor=self.creator)
+
+    def test_repeat_requests_revalidate_with_the_etag(self):
+        first = self.client.get('/api/courses/')
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+        with self.assertNumQueries(0):
+            cached = self.client.get('/api/courses/')
+        self.assertEqual(cached['ETag'], etag)
+        self.assertEqual(cached.content, first.content)
+        self.assertEqual(self.client.get('/api/courses/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_catalog_write_bumps_the_version(self):
+        etag = self.client.get('/api/courses/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.objects.create(title='Đại số', instructor=self.creator)
+        response = self.client.get('/api/courses/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()['courses']), 2)
+
+    def test_viewer_flags_are_overlaid_on_the_shared_base(self):
+        course = Course.objects.get()
+        video = self.make_video(course=course)
+        with self.captureOnCommitCallbacks(execute=True):
+            VideoAccess.objects.create(user=self.viewer, video=video)
+            record_unlock(self.viewer.id, video)
+
+        anonymous = self.client.get('/api/courses/')
+        mine = self.api_get('/api/courses/')
+        self.assertIn('Authorization', mine['Vary'])
+        self.assertNotEqual(mine['ETag'], anonymous['ETag'])
+        self.assertTrue(mine.json()['courses'][0].get('is_purchased'))
+        self.assertFalse(anonymous.json()['courses'][0].get('is_purchased'))
+
+
+class CreatorRevenueTests(ApiTestCase):
+    def _pending(self):
+        return self.api_get('/api/profile/', headers=self.creator_headers).json()['creator_pending_vnd']
+
+    def test_sales_are_journaled_and_folded(self):
+        for title in ('A', 'B'):
+            video = self.make_video(title, base_price=10)
+            response = self.api_post('/api/purchase-video/', {'video_id': video.id})
+            self.assertEqual(response.status_code, 200, response.content)
+
+        # Sales only append entries; reads add the unfolded ones.
+        self.assertEqual(CreatorRevenueEntry.objects.filter(creator=self.creator, folded_at__isnull=True).count(), 2)
+        self.assertEqual(CreatorAccount.objects.get(user=self.creator).pending_vnd, 0)
+        self.assertEqual(self._pending(), 1400)
+
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('fold_creator_revenue', stdout=out)
+        self.assertIn('Creators folded: 1', out.getvalue())
+        account = CreatorAccount.objects.get(user=self.creator)
+        self.assertEqual((account.pending_vnd, account.total_earned_vnd), (1400, 1400))
+        self.assertFalse(CreatorRevenueEntry.objects.filter(folded_at__isnull=True).exists())
+        self.assertEqual(CreatorStats.objects.get(user=self.creator).revenue_vnd, 1400)
+        self.assertEqual(self._pending(), 1400)
+
+        out = StringIO()
+        call_command('fold_creator_revenue', stdout=out)
+        self.assertIn('Creators folded: 0', out.getvalue())
+
+
+class UnlockCourseTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = Course.objects.create(title='Giải tích 1', instructor=self.creator)
+
+    def _unlock(self):
+        return self.api_post(f'/api/courses/{self.course.id}/unlock/')
+
+    def test_unlocks_eligible_lessons_with_one_debit(self):
+        first = self.make_video('Bài 1', course=self.course, base_price=10)
+        free = self.make_video('Bài 2', course=self.course, is_free=True)
+        owned = self.make_video('Bài 3', course=self.course, base_price=10)
+        gated = self.make_video('Bài 4', course=self.course, base_price=5, prerequisite_video=first)
+        VideoAccess.objects.create(user=self.viewer, video=owned)
+
+        response = self._unlock()
+        self.assertEqual(response.status_code, 200, response.content)
+        body = response.json()
+        self.assertEqual(sorted(body['unlocked_video_ids']), sorted([first.id, free.id]))
+        self.assertEqual(body['already_unlocked_video_ids'], [owned.id])
+        self.assertEqual(body['prerequisite_locked_video_ids'], [gated.id])
+        self.assertEqual((body['price_tc'], body['balance']), (10, 20))
+        self.assertEqual(Wallet.objects.get(user=self.viewer).balance, 20)
+        self.assertEqual(
+            set(VideoAccess.objects.filter(user=self.viewer).values_list('video_id', flat=True)),
+            {first.id, free.id, owned.id},
+        )
+
+        again = self._unlock().json()
+        self.assertEqual((again['unlocked_video_ids'], again['price_tc']), ([], 0))
+        self.assertEqual(Wallet.objects.get(user=self.viewer).balance, 20)
+
+    def test_unaffordable_course_unlocks_nothing(self):
+        for i in range(4):
+            self.make_video(f'Bài {i}', course=self.course, base_price=10)
+        response = self._unlock()
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual(Wallet.objects.get(user=self.viewer).balance, 30)
+        self.assertFalse(VideoAccess.objects.filter(user=self.viewer).exists())
+
+
+class KeysetPaginationTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        Course.objects.bulk_create(
+            [Course(title=f'Course {i}', instructor=self.creator) for i in range(60)]
+        )
+
+    def test_unpaged_request_gets_every_course(self):
+        body = self.api_get('/api/courses/').json()
+        self.assertEqual(len(body['courses']), 60)
+        self.assertIsNone(body['next_cursor'])
+
+    def test_unpaged_request_is_capped_with_a_cursor(self):
+        with mock.patch.object(views, 'UNPAGED_LIST_LIMIT', 40):
+            body = self.api_get('/api/courses/').json()
+        self.assertEqual(len(body['courses']), 40)
+        rest = self.api_get(f"/api/courses/?cursor={body['next_cursor']}").json()
+        self.assertEqual(len(rest['courses']), 20)
+        self.assertFalse({c['id'] for c in body['courses']} & {c['id'] for c in rest['courses']})
+
+    def test_cursor_walks_every_course_once(self):
+        seen = []
+        url = '/api/courses/?limit=25'
+        while url:
+            body = self.api_get(url).json()
+            seen.extend(course['id'] for course in body['courses'])
+            url = f"/api/courses/?limit=25&cursor={body['next_cursor']}" if body['next_cursor'] else None
+        self.assertEqual(len(seen), 60)
+        self.assertEqual(len(set(seen)), 60)
+
+
+class TeachersLeaderboardTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        teachers = User.objects.bulk_create(
+            [User(username=f'teacher{i}', email=f'teacher{i}@example.com', is_creator=True) for i in range(55)]
+        )
+        CreatorStats.objects.bulk_create(
+            [CreatorStats(user=teacher, video_count=1, total_views=i) for i, teacher in enumerate(teachers)]
+        )
+        rank_creators()
+
+    def test_unpaged_request_gets_every_teacher(self):
+        body = self.api_get('/api/teachers/').json()
+        self.assertEqual(len(body['teachers']), 55)
+        self.assertFalse(body['has_more'])
+        self.assertEqual([t['rank'] for t in body['teachers']], list(range(1, 56)))
+
+    def test_unpaged_request_is_capped_with_a_cursor(self):
+        with mock.patch.object(views, 'UNPAGED_LIST_LIMIT', 40):
+            body = self.api_get('/api/teachers/').json()
+        self.assertEqual(len(body['teachers']), 40)
+        self.assertTrue(body['has_more'])
+        rest = self.api_get(f"/api/teachers/?cursor={body['next_cursor']}").json()
+        self.assertEqual([t['rank'] for t in rest['teachers']], list(range(41, 56)))
+
+    def test_limit_pages_by_rank(self):
+        body = self.api_get('/api/teachers/?limit=50').json()
+        self.assertEqual(len(body['teachers']), 50)
+        rest = self.api_get(f"/api/teachers/?limit=50&cursor={body['next_cursor']}").json()
+        self.assertEqual([t['rank'] for t in rest['teachers']], list(range(51, 56)))
+
+
+class SearchIndexTests(ApiTestCase):
+    def _search(self, query, **params):
+        response = self.api_get('/api/search/', data={'q': query, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [(hit['type'], hit['id']) for hit in response.json()['results']]
+
+    def test_fold_text_strips_diacritics(self):
+        self.assertEqual(fold_text('Kỹ năng ĐÀM phán, 101!'), 'ky nang dam phan 101')
+
+    def test_search_ignores_accents_and_ranks_titles_first(self):
+        titled = self.make_video('Kỹ năng giao tiếp')
+        described = self.make_video('Bài 2', description='Luyện kỹ năng thuyết trình')
+        course = Course.objects.create(title='Kỹ năng mềm', instructor=self.creator)
+        self.make_video('Giải tích 1')
+
+        hits = self._search('ky nang')
+        self.assertEqual(set(hits), {('video', titled.id), ('video', described.id), ('course', course.id)})
+        self.assertLess(hits.index(('video', titled.id)), hits.index(('video', described.id)))
+        self.assertEqual(self._search('ky nang', type='course'), [('course', course.id)])
+        self.assertEqual(self._search('giao ti'), [('video', titled.id)])
+
+    def test_deleted_videos_leave_the_index(self):
+        video = self.make_video('Đàm phán')
+        video.is_deleted = True
+        video.save()
+        self.assertEqual(self._search('dam phan'), [])
+
+    def test_rebuild_indexes_bulk_rows(self):
+        Video.objects.bulk_create([Video(title='Đàm phán', creator=self.creator, file_url='videos/x.mp4')])
+        self.assertEqual(self._search('dam phan'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(self._search('dam phan')), 1)
+
+
+class SuggestIndexTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        suggest._index = None
+        suggest._applied_seq = suggest._snapshot_seq = 0
+        suggest._stalled = None
+
+    def _other_worker(self):
+        """Let the next lookup re-check the shared log."""
+        suggest._checked_at = 0.0
+
+    def test_patch_matches_full_rebuild(self):
+        index = suggest._PrefixIndex({('video', 1): 'Kỹ năng giao tiếp', ('course', 2): 'Giải tích 1'})
+        index.apply(('video', 1), 'Giao tiếp nâng cao')
+        index.apply(('course', 2), None)
+        index.apply(('video', 3), 'Đàm phán')
+        rebuilt = suggest._PrefixIndex({('video', 1): 'Giao tiếp nâng cao', ('video', 3): 'Đàm phán'})
+        self.assertEqual(index.rows, rebuilt.rows)
+        self.assertEqual(index.lookup('dam', 8), [('video', 3, 'Đàm phán')])
+
+    def test_changes_replay_from_the_log_without_reloading(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            video = self.make_video('Kỹ năng giao tiếp')
+        self.assertEqual(suggest.suggest('giao')[0][1], video.id)
+
+        # Written by another worker: only the shared log sees it.
+        loaded, suggest._index = suggest._index, None
+        with self.captureOnCommitCallbacks(execute=True):
+            added = self.make_video('Đàm phán')
+        suggest._index = loaded
+        self.assertEqual(suggest.suggest('dam'), [])
+
+        self._other_worker()
+        with self.assertNumQueries(0):
+            self.assertEqual(suggest.suggest('dam')[0][1], added.id)
+        self.assertIs(suggest._index, loaded)
+
+    def test_lock_contention_keeps_the_log_head(self):
+        suggest.suggest('x')
+        head = cache.get(suggest._SEQ_KEY)
+        cache.add(suggest._LOCK_KEY, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_video('Đàm phán')
+        self.assertEqual(cache.get(suggest._SEQ_KEY), head + 1)
+
+
+class MissingWalletTests(ApiTestCase):
+    """Accounts from before wallets were provisioned get one on their first credit."""
+
+    def setUp(self):
+        super().setUp()
+        Wallet.objects.filter(user=self.viewer).delete()
+        auth._local_snapshots.clear()
+        cache.clear()
+
+    def test_earn_tc_provisions_the_wallet(self):
+        response = self.api_post('/api/earn-tc/')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['new_balance'], 31)
+        self.assertEqual(Wallet.objects.get(user=self.viewer).balance, 31)
+
+    def test_recharge_provisions_the_wallet(self):
+        response = self.api_post('/api/recharge/', {'amount_vnd': 10000})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['balance'], 130)
+        self.assertEqual(Wallet.objects.get(user=self.viewer).balance, 130)
+
+    def test_ad_reward_provisions_the_wallet(self):
+        response = self.api_post('/api/reward-ads/')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(Wallet.objects.get(user=self.viewer).balance, Decimal('30.50'))
+
+
+class CheckpointLedgerTests(ApiTestCase):
+    def test_activity_after_the_run_head_is_not_drift(self):
+        call_command('checkpoint_ledger', '--full', stdout=StringIO())
+        run_head = ledger_head()
+        response = self.api_post('/api/recharge/', {'amount_vnd': 10000})
+        self.assertEqual(response.status_code, 200, response.content)
+
+        # The recharge commits after the run read its head but before the wallets are locked.
+        heads = iter([run_head])
+        with mock.patch(
+            'hourskill_app.management.commands.checkpoint_ledger.ledger_head',
+            side_effect=lambda: next(heads, ledger_head()),
+        ):
+            out = StringIO()
+            call_command('checkpoint_ledger', '--full', stdout=out)
+        self.assertIn('Wallets drifted: 0', out.getvalue())
+        self.assertNotIn('Drift user=', out.getvalue())
+        self.assertEqual(
+            LedgerCheckpoint.objects.filter(user=self.viewer).order_by('-as_of_tx_id').values_list('balance', flat=True)[0],
+            30,
+        )
+
+
+class ReconcileBalancesTests(ApiTestCase):
+    def _reconcile(self, *args):
+        out = StringIO()
+        call_command('reconcile_balances', '--workers', '1', *args, stdout=out)
+        return out.getvalue()
+
+    def test_repair_leaves_wallets_without_a_checkpoint(self):
+        Wallet.objects.filter(user=self.viewer).update(balance=99)
+        out = self._reconcile('--repair')
+        self.assertIn('Wallets left unrepaired: 1', out)
+        self.assertEqual(Wallet.objects.get(user=self.viewer).balance, 99)
+
+        self._reconcile('--repair', '--from-genesis')
+        self.assertEqual(Wallet.objects.get(user=self.viewer).balance, 30)
+
+    def test_repair_uses_the_checkpoint(self):
+        call_command('checkpoint_ledger', '--full', stdout=StringIO())
+        Wallet.objects.filter(user=self.viewer).update(balance=99)
+        out = self._reconcile('--repair')
+        self.assertIn('Wallets repaired: 1', out)
+        self.assertEqual(Wallet.objects.get(user=self.viewer).balance, 30)
+
+
+class LockSetTests(ApiTestCase):
+    def test_debit_counts_toward_the_wallet_order(self):
+        first, second = sorted([self.viewer, self.creator], key=lambda user: user.wallet.pk)
+        with transaction.atomic():
+            locks = LockSet()
+            self.assertEqual(locks.debit(second.id, 10), 20)
+            with self.assertRaises(LockOrderError):
+                locks.wallets([first.id])
+
+    def test_debit_may_retry_a_wallet_it_holds(self):
+        with transaction.atomic():
+            locks = LockSet()
+            self.assertIsNone(locks.debit(self.viewer.id, 31))
+            self.assertEqual(locks.debit(self.viewer.id, 30), 0)
+            self.assertEqual(locks.wallet(self.viewer.id).balance, 0)
+
+
+class NotificationOutboxTests(ApiTestCase):
+    def _follow(self, follower):
+        enqueue_notification('followed', self.creator, sender=follower, follower=follower.username)
+
+    def test_drain_delivers_and_empties_the_outbox(self):
+        enqueue_notification('recharge', self.viewer, amount_vnd=10000, tc_added=100)
+        self._follow(self.viewer)
+        self.assertEqual(drain_outbox(), (2, 2))
+        self.assertFalse(NotificationOutbox.objects.exists())
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(drain_outbox(), (0, 0))
+
+    def test_group_counts_distinct_followers(self):
+        other = User.objects.create_user('other', 'other@example.com', 'pw-12345678')
+        self._follow(self.viewer)
+        self._follow(self.viewer)
+        drain_outbox()
+        # Later batches fold into the open group row too.
+        self._follow(self.viewer)
+        self._follow(other)
+        drain_outbox()
+
+        group = Notification.objects.get(recipient=self.creator)
+        self.assertEqual(group.actor_count, 2)
+        self.assertEqual(sorted(group.params['actor_ids']), sorted([self.viewer.id, other.id]))
+        self.assertEqual(render_text(group), 'other và 1 người khác đã theo dõi bạn')
+
+
+class UnreadCounterTests(ApiTestCase):
+    def _unread(self):
+        return self.api_get('/api/notifications/').json()['unread_count']
+
+    def test_counter_follows_delivery_and_mark_read(self):
+        for _ in range(2):
+            enqueue_notification('recharge', self.viewer, amount_vnd=10000, tc_added=100)
+        drain_outbox()
+        self.assertEqual(self._unread(), 2)
+        # Signals keep single creates and deletes in step as well.
+        note = Notification.objects.create(recipient=self.viewer, notification_type='purchase', text='x')
+        self.assertEqual(self._unread(), 3)
+        note.delete()
+        self.assertEqual(self._unread(), 2)
+
+        self.assertEqual(self.api_post('/api/notifications/mark-read/').status_code, 200)
+        self.assertEqual(self._unread(), 0)
+        self.assertFalse(Notification.objects.filter(recipient=self.viewer, is_read=False).exists())
+
+    def test_reconcile_repairs_drifted_counters(self):
+        enqueue_notification('recharge', self.viewer, amount_vnd=10000, tc_added=100)
+        drain_outbox()
+        NotificationCounter.objects.filter(user=self.viewer).update(unread_count=7)
+        out = StringIO()
+        call_command('reconcile_notification_counters', stdout=out)
+        self.assertIn('Rows with drifted counters: 1', out.getvalue())
+        self.assertEqual(self._unread(), 1)
+
+
+class EventStreamTests(ApiTestCase):
+    def _frames(self, *changes):
+        """Open the viewer's stream, apply each change and collect the frames that follow it."""
+
+        @async_to_sync
+        async def run():
+            stream = realtime.user_event_stream(self.viewer.id, lambda n: {'id': n.id})
+            frames = [await stream.__anext__()]
+            try:
+                for change in changes:
+                    await sync_to_async(change)()
+                    frames.append(await stream.__anext__())
+            finally:
+                await stream.aclose()
+            return frames
+
+        with mock.patch.object(realtime, 'REALTIME_STREAM_TICK', 0.01):
+            return run()
+
+    def _publish(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            realtime.publish_user_change([self.viewer.id])
+
+    def test_stream_opens_with_the_current_state(self):
+        (opening,) = self._frames()
+        self.assertIn('event: state', opening)
+        self.assertIn('"balance": 30', opening)
+
+    def test_published_changes_reach_the_stream(self):
+        def credit():
+            Wallet.objects.filter(user=self.viewer).update(balance=55)
+            self._publish()
+
+        def notify():
+            enqueue_notification('recharge', self.viewer, amount_vnd=10000, tc_added=100)
+            with self.captureOnCommitCallbacks(execute=True):
+                drain_outbox()
+
+        _, balance, notification = self._frames(credit, notify)
+        self.assertIn('event: balance', balance)
+        self.assertIn('"balance": 55', balance)
+        self.assertIn('event: notification', notification)
+
+    def test_publish_waits_for_commit(self):
+        key = realtime._channel_key(self.viewer.id)
+        with self.captureOnCommitCallbacks() as callbacks:
+            realtime.publish_user_change([self.viewer.id])
+        self.assertIsNone(cache.get(key))
+        for callback in callbacks:
+            callback()
+        self.assertIsNotNone(cache.get(key))
+
+
+class WatchHeartbeatTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.session = WatchSession.objects.create(user=self.viewer, video=self.make_video())
+
+    def _ping(self, seconds_later):
+        now = timezone.now() + timedelta(seconds=seconds_later)
+        return watch_heartbeats.record_heartbeat(self.viewer.id, self.session.id, 10, now=now)
+
+    def _watched(self):
+        self.session.refresh_from_db()
+        return self.session.watched_seconds
+
+    def test_shared_cache_buffers_until_flushed(self):
+        with self.settings(CACHE_IS_SHARED=True):
+            self.assertEqual(self._ping(0), 10)
+            self.assertIsNone(self._ping(5))
+            self.assertEqual(self._ping(10), 20)
+            self.assertEqual(self._watched(), 0)
+            self.assertEqual(watch_heartbeats.buffered_seconds([self.session.id]), {self.session.id: 20})
+
+            self.assertEqual(watch_heartbeats.flush_heartbeats(), (1, 20))
+            self.assertEqual(self._watched(), 20)
+            self.assertEqual(watch_heartbeats.buffered_seconds([self.session.id]), {self.session.id: 0})
+            self.assertEqual(watch_heartbeats.flush_heartbeats(), (0, 0))
+
+    def test_per_process_cache_writes_straight_through(self):
+        with self.settings(CACHE_IS_SHARED=False):
+            self.assertEqual(self._ping(0), 10)
+            self.assertIsNone(self._ping(5))
+            self.assertEqual(self._ping(10), 10)
+            self.assertEqual(self._watched(), 20)
+            self.assertEqual(watch_heartbeats.buffered_seconds([self.session.id]), {self.session.id: 0})
+            self.assertEqual(watch_heartbeats.flush_heartbeats(), (0, 0))
+
+
+class MoneyRunnerTests(TransactionTestCase):
+    def setUp(self):
+        reset_retry_metrics()
+        self.user = User.objects.create_user('payer', 'payer@example.com', 'pw-12345678')
+
+    def test_deadlock_is_retried_in_a_fresh_transaction(self):
+        attempts = []
+
+        def operation(locks):
+            attempts.append(locks)
+            locks.debit(self.user.id, 10)
+            if len(attempts) == 1:
+                raise OperationalError('database is locked')
+            return locks.wallet(self.user.id).balance
+
+        with mock.patch.object(money.time, 'sleep'):
+            self.assertEqual(run_money_operation('test_op', operation), 20)
+        self.assertEqual(len(attempts), 2)
+        self.assertIsNot(attempts[0], attempts[1])
+        self.assertEqual(Wallet.objects.get(user=self.user).balance, 20)
+        self.assertEqual(retry_metrics()['test_op'], {'runs': 1, 'conflicts': 1, 'retries': 1})
+
+    def test_gives_up_after_max_attempts(self):
+        def operation(locks):
+            raise OperationalError('deadlock detected')
+
+        with mock.patch.object(money.time, 'sleep'), self.assertRaises(OperationalError):
+            run_money_operation('test_op', operation, max_attempts=3)
+        self.assertEqual(retry_metrics()['test_op'], {'runs': 1, 'conflicts': 3, 'retries': 2, 'exhausted': 1})
+
+    def test_other_errors_are_not_retried(self):
+        operation = mock.Mock(side_effect=OperationalError('no such table: x'))
+        with self.assertRaises(OperationalError):
+            run_money_operation('test_op', operation)
+        self.assertEqual(operation.call_count, 1)
+
+
+class GuardedDebitTests(ApiTestCase):
+    def test_insufficient_funds_leave_the_balance_alone(self):
+        with transaction.atomic():
+            self.assertIsNone(LockSet().debit(self.viewer.id, 31))
+        self.assertEqual(Wallet.objects.get(user=self.viewer).balance, 30)
+
+    def test_expect_mismatch_fails_the_guard(self):
+        with transaction.atomic():
+            locks = LockSet()
+            self.assertIsNone(locks.debit(self.viewer.id, 10, expect={'vip_expiry': timezone.now()}))
+            self.assertEqual(locks.debit(self.viewer.id, 10, expect={'vip_expiry': None}), 20)
+
+    def test_unaffordable_purchase_unlocks_nothing(self):
+        video = self.make_video(base_price=500)
+        response = self.api_post('/api/purchase-video/', {'video_id': video.id})
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual(Wallet.objects.get(user=self.viewer).balance, 30)
+        self.assertFalse(VideoAccess.objects.filter(user=self.viewer, video=video).exists())
+
+    def test_balance_cannot_go_negative(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Wallet.objects.filter(user=self.viewer).update(balance=-1)
+
+
+class IdempotencyKeyTests(ApiTestCase):
+    def _recharge(self, amount_vnd=10000, key='recharge-1'):
+        return self.api_post('/api/recharge/', {'amount_vnd': amount_vnd}, HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_without_charging_again(self):
+        first = self._recharge()
+        self.assertEqual(first.status_code, 200, first.content)
+        cache.clear()  # The replay must also work from the database row.
+        retry = self._recharge()
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(Wallet.objects.get(user=self.viewer).balance, 130)
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        self._recharge()
+        self.assertEqual(self._recharge(amount_vnd=20000).status_code, 422)
+        self.assertEqual(Wallet.objects.get(user=self.viewer).balance, 130)
+
+    def test_retry_while_the_first_request_runs_gets_409(self):
+        IdempotencyKey.objects.create(user=self.viewer, key='recharge-1', endpoint='recharge', request_hash='x')
+        self.assertEqual(self._recharge().status_code, 409)
+        self.assertEqual(Wallet.objects.get(user=self.viewer).balance, 30)
+
+
+class ReadOnlyAccountTests(ApiTestCase):
+    def test_account_gets_do_not_write(self):
+        Wallet.objects.filter(user=self.viewer).delete()
+        UserProfile.objects.filter(user=self.viewer).delete()
+        auth._local_snapshots.clear()
+        cache.clear()
+
+        for url in ('/api/wallet/', '/api/profile/', '/api/me/'):
+            with self.subTest(url=url):
+                response = self.api_get(url)
+                self.assertEqual(response.status_code, 200, response.content)
+                self.assertEqual(response.json()['balance_tc'], 0)
+        self.assertFalse(Wallet.objects.filter(user=self.viewer).exists())
+        self.assertFalse(UserProfile.objects.filter(user=self.viewer).exists())
+
+
+class BenchmarkMoneyOpsTests(TransactionTestCase):
+    def test_refused_debits_do_not_count_against_conservation(self):
+        out = StringIO()
+        call_command(
+            'benchmark_money_ops', '--scenario', 'debit', '--threads', '1', '--operations', '6',
+            '--users', '2', '--balance', '2', stdout=out,
+        )
+        self.assertIn('Refused debits: 2', out.getvalue())
+        self.assertIn('Balance conserved: True', out.getvalue())
+        self.assertFalse(User.objects.filter(username__startswith='bench_money_').exists())
+
+
+class StreamTicketTests(ApiTestCase):
+    def _stream_request(self, **params):
+        request = RequestFactory().get('/api/stream/', params)
+        return _stream_user(request)
+
+    def test_ticket_opens_the_stream_only(self):
+        ticket = self.api_post('/api/stream/ticket/').json()['ticket']
+        self.assertEqual(self._stream_request(ticket=ticket), self.viewer)
+        # Not a bearer token: it cannot call the rest of the API.
+        self.assertEqual(self.api_get('/api/me/', headers={'HTTP_AUTHORIZATION': f'Bearer {ticket}'}).status_code, 401)
+
+    def test_bearer_token_is_not_accepted_in_the_url(self):
+        token = self.viewer_headers['HTTP_AUTHORIZATION'].split(' ', 1)[1]
+        self.assertIsNone(self._stream_request(token=token))
+        self.assertIsNone(self._stream_request(ticket=token))
+
+    def test_expired_ticket_is_refused(self):
+        ticket = self.api_post('/api/stream/ticket/').json()['ticket']
+        with mock.patch.object(auth, 'STREAM_TICKET_MAX_AGE', -1):
+            self.assertIsNone(self._stream_request(ticket=ticket))
@@ -0,0 +1,117 @@
+"""Per-user unlocked video/course id sets held in the shared cache.
+
+Catalog pages need to know which videos (and therefore which courses) a
+viewer has unlocked. Instead of joining VideoAccess and WatchSession on
+every page, each user's ids are stored once as packed sorted int arrays and
+turned into frozensets on read for O(1) membership checks.
+
+Entries are keyed by a per-user version. A purchase bumps the version once
+it commits, so the next read rebuilds the set from the database; a reader
+that loaded the set just before the commit stores it under the old version,
+where nobody looks any more. Single-video access decisions also confirm a
+miss against the database (``has_unlocked_video``).
+"""
+
+import time
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import VideoAccess, WatchSession
+
+
+UNLOCKS_CACHE_PREFIX = "unlocked-ids"
+UNLOCKS_CACHE_TTL = getattr(settings, "UNLOCKED_IDS_CACHE_TTL", 60 * 60)
+_TYPECODE = "q"
+
+
+def _cache_key(user_id, version):
+    return f"{UNLOCKS_CACHE_PREFIX}:{user_id}:{version}"
+
+
+def _pack(ids):
+    return array(_TYPECODE, sorted(set(ids))).tobytes()
+
+
+def _unpack(raw):
+    values = array(_TYPECODE)
+    values.frombytes(raw)
+    return frozenset(values)
+
+
+def _load_from_db(user_id):
+    """Collect unlocked (video_id, course_id) pairs from access and legacy session rows."""
+    pairs = set(
+        VideoAccess.objects.filter(user_id=user_id).values_list('video_id', 'video__course_id')
+    )
+    # Backward compatibility: older unlock flows only marked WatchSession.is_unlocked.
+    pairs.update(
+        WatchSession.objects.filter(user_id=user_id, is_unlocked=True).values_list('video_id', 'video__course_id')
+    )
+    video_ids = {video_id for video_id, _ in pairs}
+    course_ids = {course_id for _, course_id in pairs if course_id}
+    return video_ids, course_ids
+
+
+def _version_key(user_id):
+    return f"{UNLOCKS_CACHE_PREFIX}-version:{user_id}"
+
+
+def get_unlocked_ids(user_id):
+    """Return (video_ids, course_ids) frozensets the user has unlocked."""
+    if not user_id:
+        return frozenset(), frozenset()
+
+    # The version is read before the database: a set loaded before a purchase
+    # commits is stored under the old version and never read after the bump.
+    version = cache.get(_version_key(user_id)) or 0
+    key = _cache_key(user_id, version)
+    entry = cache.get(key)
+    if entry is None:
+        video_ids, course_ids = _load_from_db(user_id)
+        entry = {'videos': _pack(video_ids), 'courses': _pack(course_ids)}
+        cache.set(key, entry, timeout=UNLOCKS_CACHE_TTL)
+    return _unpack(entry['videos']), _unpack(entry['courses'])
+
+
+def has_unlocked_video(user_id, video_id):
+    """Single-video check: the cached set, confirmed against the database when it says no."""
+    if not user_id:
+        return False
+    if video_id in get_unlocked_ids(user_id)[0]:
+        return True
+    return (
+        VideoAccess.objects.filter(user_id=user_id, video_id=video_id).exists()
+        or WatchSession.objects.filter(user_id=user_id, video_id=video_id, is_unlocked=True).exists()
+    )
+
+
+def _bump_version(user_id):
+    key = _version_key(user_id)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add and incr; any new value retires the cached sets.
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def record_unlock(user_id, video):
+    """Retire the user's cached set once the transaction that unlocked ``video`` commits."""
+    if video is not None:
+        record_unlocks(user_id, [video])
+
+
+def record_unlocks(user_id, videos):
+    """Retire the user's cached set once the transaction that unlocked ``videos`` commits."""
+    if not user_id or not any(video is not None for video in videos):
+        return
+    transaction.on_commit(lambda: _bump_version(user_id))
+
+
+def invalidate_unlocked_ids(user_id):
+    """Retire the cached set so the next read rebuilds it from the database."""
+    if user_id:
+        _bump_version(user_id)
@@ -37,8 +37,11 @@ urlpatterns = [
     path('api/video/<int:video_id>/unlock', views.api_unlock_video),
     path('api/unlock-video/', views.api_unlock_video_by_body, name='api_unlock_video_by_body'),
     path('api/courses/', views.api_get_courses, name='api_get_courses'),
+    path('api/courses/<int:course_id>/unlock/', views.api_unlock_course, name='api_unlock_course'),
     path('api/teachers/', views.api_teachers, name='api_teachers'),
     path('api/categories/', views.api_categories, name='api_categories'),
+    path('api/search/', views.api_search, name='api_search'),
+    path('api/suggest/', views.api_suggest, name='api_suggest'),
     path('api/follow/', views.api_toggle_follow, name='api_toggle_follow'),
     path('api/follow/<int:creator_id>/', views.api_toggle_follow, name='api_toggle_follow_path'),
     path('api/follow/<int:creator_id>', views.api_toggle_follow),
@@ -52,6 +55,8 @@ urlpatterns = [
     path('api/post-comment/', views.api_post_comment, name='api_post_comment'),
     path('api/notifications/', views.api_get_notifications, name='api_get_notifications'),
     path('api/notifications/mark-read/', views.mark_notifications_as_read, name='mark_notifications_as_read'),
+    path('api/stream/', views.api_event_stream, name='api_event_stream'),
+    path('api/stream/ticket/', views.api_stream_ticket, name='api_stream_ticket'),
     path('api/reward-ads/', views.api_reward_ads, name='api_reward_ads'),
     path('api/earn-tc/', views.earn_tc, name='earn_tc'),
     path('api/log-behavior/', views.api_log_behavior, name='api_log_behavior'),
@@ -1,3 +1,4 @@
+import base64
 import json
 import re
 import secrets
@@ -5,28 +6,44 @@ import calendar
 from datetime import timedelta
 from decimal import Decimal
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import authenticate
 from django.contrib.auth.forms import AuthenticationForm, PasswordChangeForm, UserCreationForm
 from django.core.cache import cache
 from django.core import signing
 from django.core.files.storage import default_storage
-from django.db import transaction
-from django.db.models import Avg, Count, F, Q
-from django.http import JsonResponse
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.http import HttpResponseNotModified, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 from django.template.loader import get_template
 from django.template import TemplateDoesNotExist
 from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils.http import parse_etags
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_GET, require_POST
 
+from .auth import (
+    STREAM_TICKET_MAX_AGE,
+    invalidate_user_snapshot,
+    issue_stream_ticket,
+    load_user,
+    read_stream_ticket_user_id,
+    resolve_request_user,
+)
+from .catalog_cache import get_or_build_base, strong_etag
 from .models import (
     Category,
     CommentReview,
     CreatorAccount,
+    CreatorStats,
     Course,
     Follow,
     Notification,
+    SearchDocument,
     Transaction,
     User,
     UserBehavior,
@@ -37,10 +54,32 @@ from .models import (
     WatchSession,
     WithdrawalRequest,
 )
+from .creator_revenue import get_creator_account_for_read, record_sale, record_sales
+from .creator_stats import (
+    bump_creator_stats,
+    bump_follow_counts,
+    get_creator_stats,
+    record_creator_views,
+    refresh_creator_stats,
+)
 from .forms import CourseForm, VideoForm
+from .idempotency import idempotent
+from .money import run_money_operation
+from .notification_counters import get_unread_count, mark_all_read
+from .notification_outbox import enqueue_notification
+from .notification_templates import render_link, render_text
+from .realtime import user_event_stream
+from .search import search as search_catalog
+from .suggest import suggest as suggest_catalog
+from .unlocks import get_unlocked_ids, has_unlocked_video, record_unlock, record_unlocks
+from .watch_heartbeats import buffered_seconds, maybe_flush_heartbeats, record_heartbeat
 
 
 DEFAULT_AVATAR_URL = "data:image/svg+xml;utf8,<svg xmlns='http://www.w3.org/2000/svg' width='128' height='128'><rect width='100%' height='100%' fill='%23e2e8f0'/><text x='50%' y='54%' dominant-baseline='middle' text-anchor='middle' font-family='Arial' font-size='56' fill='%2364758b'>U</text></svg>"
+# Compare-and-set rounds for a VIP purchase racing another renewal of the same wallet
+VIP_RENEWAL_ATTEMPTS = 3
+# Rows returned to list callers that send neither ?cursor= nor ?limit=; past it they get a next_cursor.
+UNPAGED_LIST_LIMIT = getattr(settings, 'UNPAGED_LIST_LIMIT', 500)
 
 
 def _json_error(message, status=400):
@@ -83,26 +122,16 @@ def _format_vnd_vi(value):
 
 
 def _profile_balance_tc_int(profile):
-    """Read profile TC balance using new field with legacy fallback."""
+    """Read the TC balance exposed on the profile (backed by the user's Wallet)."""
     if profile is None:
         return 0
-    balance_value = profile.balance_tc if profile.balance_tc is not None else profile.wallet_balance
-    return _tc_to_int(balance_value)
+    return _tc_to_int(profile.balance_tc)
 
 
-def _sync_profile_legacy_balance(profile):
-    """Mirror decimal balance_tc into legacy wallet_balance integer field."""
-    balance_int = _profile_balance_tc_int(profile)
-    updates = []
-    if profile.wallet_balance != balance_int:
-        profile.wallet_balance = balance_int
-        updates.append('wallet_balance')
-    if profile.balance_tc != Decimal(str(balance_int)):
-        profile.balance_tc = Decimal(str(balance_int))
-        updates.append('balance_tc')
-    if updates:
-        profile.save(update_fields=updates)
-    return balance_int
+def _account_balance_int(user):
+    """Read the current TC balance straight from the user's Wallet row."""
+    balance = Wallet.objects.filter(user=user).values_list('balance', flat=True).first()
+    return _tc_to_int(balance or 0)
 
 
 def _base_price_minutes(video):
@@ -115,14 +144,12 @@ def _base_price_minutes(video):
 
 
 def _compute_dynamic_price_tc(video):
-    """Dynamic pricing: base from duration + quality bonus from average rating."""
+    """Dynamic pricing: base from duration + quality bonus from average rating.
+
+    The average comes from the denormalized rating counters on the loaded row.
+    """
     base_price = _base_price_minutes(video)
-    avg_rating = (
-        CommentReview.objects.filter(video=video, rating__isnull=False)
-        .aggregate(avg=Avg('rating'))
-        .get('avg')
-    )
-    avg_value = float(avg_rating or 0)
+    avg_value = float(video.avg_rating)
     bonus = 0
     if avg_value > 4.8:
         bonus = 5
@@ -131,6 +158,25 @@ def _compute_dynamic_price_tc(video):
     return max(0, base_price + bonus), round(avg_value, 2)
 
 
+def _create_review(user, video, content, rating_value):
+    """Create a comment/review and bump the video's rating counters atomically."""
+    with transaction.atomic():
+        review = CommentReview.objects.create(
+            user=user,
+            video=video,
+            content=content,
+            rating=rating_value,
+        )
+        if rating_value:
+            Video.objects.filter(pk=video.pk).update(
+                rating_count=F('rating_count') + 1,
+                rating_sum=F('rating_sum') + rating_value,
+            )
+            if video.is_active and not video.is_deleted:
+                bump_creator_stats(video.creator_id, rating_count=1, rating_sum=rating_value)
+    return review
+
+
 def _parse_json_body(request):
     """Parse request.body as JSON and normalize empty bodies.
 
@@ -142,6 +188,99 @@ def _parse_json_body(request):
         raise ValueError('Dữ liệu không hợp lệ!') from exc
 
 
+def _encode_cursor(values):
+    """Pack keyset values into an opaque URL-safe cursor string."""
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(token):
+    """Unpack a cursor from _encode_cursor; returns None when absent.
+
+    Raises ValueError for malformed cursors so callers can return 400.
+    """
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception as exc:
+        raise ValueError('Cursor không hợp lệ!') from exc
+    if not isinstance(values, list):
+        raise ValueError('Cursor không hợp lệ!')
+    return values
+
+
+def _page_limit(request, default=20, maximum=100):
+    """Read ?limit= clamped to [1, maximum], falling back to default."""
+    try:
+        limit = int(request.GET.get('limit') or default)
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(limit, maximum))
+
+
+def _wants_page(request, cursor_param='cursor'):
+    """Paging is opt-in: clients that send neither a cursor nor ?limit= get up to UNPAGED_LIST_LIMIT rows."""
+    return bool(cursor_param and request.GET.get(cursor_param)) or bool(request.GET.get('limit'))
+
+
+def _created_keyset_page(request, queryset, default=50, maximum=100, cursor_param='cursor'):
+    """Return queryset newest-first, keyset-paginated on (created_at, id) when asked to.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    Unpaged requests (see _wants_page) get up to UNPAGED_LIST_LIMIT rows and
+    a next_cursor only when the list is longer. Pass cursor_param=None to
+    always start from the newest rows.
+    Raises ValueError for malformed cursors so callers can return 400.
+    """
+    if not _wants_page(request, cursor_param):
+        limit = UNPAGED_LIST_LIMIT
+    else:
+        limit = _page_limit(request, default=default, maximum=maximum)
+    cursor = _decode_cursor(request.GET.get(cursor_param)) if cursor_param else None
+    if cursor:
+        try:
+            created_at = parse_datetime(cursor[0])
+            last_id = int(cursor[1])
+        except (TypeError, ValueError, IndexError) as exc:
+            raise ValueError('Cursor không hợp lệ!') from exc
+        if created_at is None:
+            raise ValueError('Cursor không hợp lệ!')
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=last_id)
+        )
+    rows = list(queryset.order_by('-created_at', '-id')[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, _encode_cursor([rows[-1].created_at.isoformat(), rows[-1].id])
+
+
+def _catalog_response(request, name, build_base, overlay=None):
+    """Serve a catalog endpoint from the versioned response cache with a strong ETag.
+
+    build_base() returns the shared anonymous payload (ValueError -> 400);
+    overlay(base) derives the viewer's payload from it when responses are
+    personalized. If-None-Match hits return 304 without a body.
+    """
+    try:
+        base = get_or_build_base(name, request, build_base)
+    except ValueError as exc:
+        return _json_error(str(exc), status=400)
+
+    response = _json_success(overlay(base) if overlay else base)
+    etag = strong_etag(response.content)
+    if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+    if etag in if_none_match or '*' in if_none_match:
+        response = HttpResponseNotModified()
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    if overlay:
+        patch_vary_headers(response, ['Authorization'])
+    return response
+
+
 def _require_auth(request):
     """Guard endpoints using bearer token; returns (user, None) or (None, error)."""
     user = _get_auth_user(request)
@@ -150,9 +289,29 @@ def _require_auth(request):
     return None, _json_error('Vui lòng đăng nhập!', status=401)
 
 
-def _lock_wallet(user):
-    """Lock a user's wallet row for safe balance updates (select_for_update)."""
-    return Wallet.objects.select_for_update().get(user=user)
+def _credit_wallet(user, amount):
+    """Add TC with one UPDATE on the user's Wallet; returns the refreshed wallet.
+
+    The UPDATE locks the wallet row, so call it before taking any lock that
+    comes later in ``money.LOCK_ORDER``. Accounts from before wallets were
+    provisioned get one with the signup balance first.
+    """
+    Wallet.objects.get_or_create(user=user, defaults={'balance': Decimal('30.00')})
+    Wallet.objects.filter(user=user).update(balance=F('balance') + amount, updated_at=timezone.now())
+    invalidate_user_snapshot(user.id)
+    return Wallet.objects.get(user=user)
+
+
+def _credit_ad_reward(locks, user, amount):
+    """Money operation: credit an ad reward and write its EARN_ADS ledger row."""
+    wallet = _credit_wallet(user, amount)
+    Transaction.objects.create(
+        receiver=user,
+        tx_type='EARN_ADS',
+        amount_tc=amount,
+        status='SUCCESS',
+    )
+    return wallet
 
 
 def _issue_token(user):
@@ -162,17 +321,12 @@ def _issue_token(user):
 
 
 def _get_auth_user(request):
-    """Extract and verify bearer token; return User or None if invalid/expired."""
-    auth_header = request.META.get('HTTP_AUTHORIZATION', '')
-    if not auth_header.startswith('Bearer '):
-        return None
-    raw_token = auth_header.split(' ', 1)[1].strip()
-    try:
-        data = signing.TimestampSigner().unsign_object(raw_token, max_age=60 * 60 * 24 * 7)  # 7 days
-        user_id = data.get('uid')
-        return User.objects.filter(id=user_id).first()
-    except Exception:
-        return None
+    """Return the bearer-token User for this request or None if invalid/expired.
+
+    BearerAuthMiddleware resolves the token once per request from the cached
+    user/profile snapshot; this falls back to resolving here when it did not run.
+    """
+    return resolve_request_user(request)
 
 
 def _verify_ping_signature(token, max_age_seconds=30):
@@ -217,66 +371,43 @@ def _extract_drive_src(raw_value):
     return raw_value.strip()
 
 
-def _create_notification(recipient, sender, notification_type, text, link='', video=None):
-    """Create a notification row while isolating side effects from main flows."""
-    try:
-        if not recipient:
-            return None
-        return Notification.objects.create(
-            recipient=recipient,
-            sender=sender,
-            video=video,
-            notification_type=notification_type,
-            text=text,
-            link=link or '',
-        )
-    except Exception:
-        # Notifications should not break core actions like follow/comment.
-        return None
+PROFILE_DEFAULTS = {
+    'notify_comments': True,
+    'notify_follows': True,
+}
 
 
 def _get_or_create_profile(user):
-    """Get user profile with safe defaults used by profile-centric APIs."""
-    return UserProfile.objects.get_or_create(
-        user=user,
-        defaults={
-            'wallet_balance': 30,
-            'balance_tc': Decimal('30.00'),
-            'notify_comments': True,
-            'notify_follows': True,
-        },
-    )[0]
+    """Get user profile with safe defaults used by profile-centric APIs.
 
+    Reuses the profile already attached to the user (auth snapshot or
+    select_related) before touching the database.
+    """
+    try:
+        return user.profile
+    except UserProfile.DoesNotExist:
+        pass
+    return UserProfile.objects.get_or_create(user=user, defaults=PROFILE_DEFAULTS)[0]
 
-def _refresh_vip_state(user, profile=None):
-    """Keep VIP flags synced between user/profile and auto-expire outdated subscriptions."""
-    profile = profile or _get_or_create_profile(user)
-    now = timezone.now()
 
-    expiry = profile.vip_expiry or user.vip_expiry
-    flagged = bool(profile.is_vip or user.is_vip)
-    is_active = bool(flagged and expiry and expiry > now)
+def _get_profile_for_read(user):
+    """Read-only variant of _get_or_create_profile for GET endpoints.
 
-    if flagged and expiry and expiry <= now:
-        profile.is_vip = False
-        profile.vip_expiry = None
-        profile.save(update_fields=['is_vip', 'vip_expiry'])
-        user.is_vip = False
-        user.vip_expiry = None
-        user.save(update_fields=['is_vip', 'vip_expiry'])
-        return False, None
+    Returns an unsaved default profile when the row is missing; the
+    reconcile_account_state job creates it.
+    """
+    try:
+        return user.profile
+    except UserProfile.DoesNotExist:
+        return UserProfile(user=user, **PROFILE_DEFAULTS)
 
-    updates = []
-    if profile.is_vip != bool(user.is_vip):
-        profile.is_vip = bool(user.is_vip)
-        updates.append('is_vip')
-    if profile.vip_expiry != user.vip_expiry:
-        profile.vip_expiry = user.vip_expiry
-        updates.append('vip_expiry')
-    if updates:
-        profile.save(update_fields=updates)
 
-    return is_active, expiry
+def _vip_state(user):
+    """Read-only VIP check returning (is_active, expiry) from the user's Wallet."""
+    expiry = user.vip_expiry
+    if expiry and expiry > timezone.now():
+        return True, expiry
+    return False, None
 
 
 def _get_or_create_creator_account(user):
@@ -326,22 +457,46 @@ def _profile_avatar_url(request, profile):
 
 def _is_notification_enabled(user, field_name):
     """Check per-user notification preference (defaults to True)."""
-    profile = _get_or_create_profile(user)
+    profile = _get_profile_for_read(user)
     return bool(getattr(profile, field_name, True))
 
 
+def _watchable_video_ids(user, videos):
+    """Bulk access rule: return ids of `videos` the user can watch.
+
+    Covers owner, free video, active VIP, purchased access and legacy unlocked
+    watch sessions without per-video queries, whatever the listing size.
+    """
+    return _watchable_ids(user, [(v.id, v.creator_id, bool(getattr(v, 'is_free', False))) for v in videos])
+
+
+def _watchable_ids(user, refs):
+    """Same rule as _watchable_video_ids over (video_id, creator_id, is_free) tuples."""
+    refs = list(refs)
+    if not user or not refs:
+        return set()
+
+    watchable = {video_id for video_id, creator_id, is_free in refs if creator_id == user.id or is_free}
+    pending_ids = [video_id for video_id, _, _ in refs if video_id not in watchable]
+    if not pending_ids:
+        return watchable
+
+    vip_active, _ = _vip_state(user)
+    if vip_active:
+        return watchable.union(pending_ids)
+
+    # Purchased access plus legacy unlocked sessions, from the cached per-user set.
+    unlocked_ids, _ = get_unlocked_ids(user.id)
+    watchable.update(video_id for video_id in pending_ids if video_id in unlocked_ids)
+    return watchable
+
+
 def _can_watch_video(user, video):
     """Access rule: owner, free video, purchased access, or active VIP."""
-    if not user:
-        return False
-    if user.id == video.creator_id:
-        return True
-    if bool(getattr(video, 'is_free', False)):
+    if video.id in _watchable_video_ids(user, [video]):
         return True
-    vip_active, _ = _refresh_vip_state(user)
-    if vip_active:
-        return True
-    return VideoAccess.objects.filter(user=user, video=video).exists()
+    # The cached set can lag a purchase that just committed; confirm a denial.
+    return has_unlocked_video(user.id, video.id) if user else False
 
 
 def _is_video_completed(user, video):
@@ -349,10 +504,11 @@ def _is_video_completed(user, video):
     if not user or not video:
         return False
     required_seconds = max(1, int(video.duration_seconds or 0))
-    session = WatchSession.objects.filter(user=user, video=video).first()
+    session = WatchSession.objects.filter(user=user, video=video).values_list('id', 'watched_seconds').first()
     if not session:
         return False
-    return int(session.watched_seconds or 0) >= required_seconds
+    session_id, watched = session
+    return int(watched or 0) + buffered_seconds([session_id])[session_id] >= required_seconds
 
 
 def _prerequisite_gate(user, video):
@@ -367,7 +523,7 @@ def _prerequisite_gate(user, video):
     if user.id == video.creator_id:
         return True, prereq.id, prereq.title
 
-    vip_active, _ = _refresh_vip_state(user)
+    vip_active, _ = _vip_state(user)
     if vip_active:
         return True, prereq.id, prereq.title
 
@@ -377,13 +533,32 @@ def _prerequisite_gate(user, video):
     return False, prereq.id, prereq.title
 
 
+def _watched_seconds_by_video(user, video_ids):
+    """``{video_id: seconds}`` of the user's sessions, persisted plus still buffered."""
+    rows = list(
+        WatchSession.objects.filter(user=user, video_id__in=video_ids).values_list('id', 'video_id', 'watched_seconds')
+    )
+    buffered = buffered_seconds(session_id for session_id, _, _ in rows)
+    return {video_id: int(watched or 0) + buffered[session_id] for session_id, video_id, watched in rows}
+
+
+def _prerequisite_blocked_ids(user, videos):
+    """Bulk _prerequisite_gate: ids of ``videos`` whose prerequisite the user has not completed."""
+    gated = [video for video in videos if video.prerequisite_video_id and video.creator_id != user.id]
+    if not gated or _vip_state(user)[0]:
+        return set()
+    watched = _watched_seconds_by_video(user, {video.prerequisite_video_id for video in gated})
+    return {
+        video.id
+        for video in gated
+        if int(watched.get(video.prerequisite_video_id) or 0)
+        < max(1, int(video.prerequisite_video.duration_seconds or 0))
+    }
+
+
 def _creator_avg_rating(user):
     """Average rating across all creator videos; returns float in [0, 5]."""
-    agg = CommentReview.objects.filter(
-        video__creator=user,
-        rating__isnull=False,
-    ).aggregate(avg=Avg('rating'))
-    return float(agg.get('avg') or 0)
+    return float(get_creator_stats(user).avg_rating)
 
 
 def _process_video_purchase(user, video):
@@ -396,8 +571,7 @@ def _process_video_purchase(user, video):
     # Fast path for already-unlocked videos
     if VideoAccess.objects.filter(user=user, video=video).exists():
         video_url = _safe_file_url(None, video.file_url)
-        profile = _get_or_create_profile(user)
-        remaining_int = _sync_profile_legacy_balance(profile)
+        remaining_int = _account_balance_int(user)
         remaining = Decimal(str(remaining_int))
         return {
             'remaining_tc': remaining,
@@ -412,121 +586,82 @@ def _process_video_purchase(user, video):
             'message': 'Video đã được mở khóa trước đó',
         }, None
 
-    did_charge_user = False
-    try:
-        with transaction.atomic():
-            # Create access inside transaction so failures roll back the unlock record
-            access, created = VideoAccess.objects.select_for_update().get_or_create(user=user, video=video)
-            if not created:
-                profile = _get_or_create_profile(user)
-                remaining_int = _sync_profile_legacy_balance(profile)
-                remaining = Decimal(str(remaining_int))
-                video_url = _safe_file_url(None, video.file_url)
-                return {
-                    'remaining_tc': remaining,
-                    'remaining_balance': remaining_int,
-                    'balance': remaining_int,
-                    'balance_display': f"{_format_tc_vi(remaining_int)} TC",
-                    'video_url': video_url,
-                    'videoUrl': video_url,
-                    'price_tc': price,
-                    'dynamic_price_tc': price_int,
-                    'avg_rating': avg_rating,
-                    'message': 'Video đã được mở khóa trước đó',
-                }, None
-
-            vip_active, _ = _refresh_vip_state(user)
-
-            # Free videos (or VIP viewers) are unlocked without balance deduction
-            if price > 0 and not vip_active:
-                profile = UserProfile.objects.select_for_update().get_or_create(
-                    user=user,
-                    defaults={'wallet_balance': 30, 'balance_tc': Decimal('30.00')},
-                )[0]
-                wallet = _lock_wallet(user)
-                current_balance = _profile_balance_tc_int(profile)
-                if current_balance < price_int:
-                    raise ValueError('Số dư TC không đủ để mở khóa video này.')
-
-                next_balance = current_balance - price_int
-
-                UserProfile.objects.filter(pk=profile.pk).update(
-                    balance_tc=F('balance_tc') - Decimal(str(price_int)),
-                    wallet_balance=F('wallet_balance') - price_int,
-                )
-                profile.refresh_from_db(fields=['balance_tc', 'wallet_balance'])
+    def _unlock(locks):
+        did_charge_user = False
+        vip_active, _ = _vip_state(user)
+        # Free videos (or VIP viewers) are unlocked without balance deduction
+        charge = price > 0 and not vip_active
+        # LOCK_ORDER: the guarded wallet debit comes before the VideoAccess row.
+        if charge:
+            balance = locks.debit(user.id, price)
+            if balance is None:
+                raise ValueError('Số dư TC không đủ để mở khóa video này.')
+
+        # Create access inside transaction so failures roll back the unlock record
+        access, created = locks.get_or_create(VideoAccess, user=user, video=video)
+        if not created:
+            # A concurrent request unlocked it first; undo this attempt's debit.
+            transaction.set_rollback(True)
+            return None
+
+        if charge:
+            remaining_int = _tc_to_int(balance)
 
-                Wallet.objects.filter(pk=wallet.pk).update(balance=F('balance') - Decimal(str(price_int)))
-                wallet.refresh_from_db(fields=['balance'])
+            Transaction.objects.create(
+                sender=user,
+                receiver=video.creator,
+                tx_type='CONTENT_SALE',
+                amount_tc=price,
+                tc_added=Decimal('0.00'),
+                reference_video=video,
+                status='SUCCESS',
+            )
+
+            # Revenue split: 70% to creator pending_vnd (1 TC = 100 VND), 30% kept by platform.
+            # Journaled, not applied: the creator's account row is folded outside this transaction.
+            creator_share_vnd = int(price_int * 0.7 * 100)
+            if user.id != video.creator_id and creator_share_vnd > 0:
+                record_sale(video.creator, creator_share_vnd, video=video)
 
                 Transaction.objects.create(
                     sender=user,
                     receiver=video.creator,
                     tx_type='CONTENT_SALE',
-                    amount_tc=price,
+                    amount_tc=Decimal(str(price_int)),
+                    amount_vnd=Decimal(str(creator_share_vnd)),
                     tc_added=Decimal('0.00'),
                     reference_video=video,
-                    status='SUCCESS',
+                    status='PENDING',
                 )
+            did_charge_user = True
+        else:
+            remaining_int = _account_balance_int(user)
+
+        session, session_created = WatchSession.objects.get_or_create(user=user, video=video)
+        if session_created:
+            record_creator_views(video.creator_id)
+        if not session.is_unlocked:
+            session.is_unlocked = True
+            session.save(update_fields=['is_unlocked'])
+        record_unlock(user.id, video)
+
+        # Purchase notifications are only for newly-paid unlocks.
+        if did_charge_user:
+            enqueue_notification(
+                'video_unlocked', user, sender=video.creator_id, video=video,
+                title=video.title, price_tc=price_int,
+            )
 
-                # Revenue split: 70% to creator pending_vnd (1 TC = 100 VND), 30% kept by platform.
-                creator_share_vnd = int(price_int * 0.7 * 100)
-                if user.id != video.creator_id and creator_share_vnd > 0:
-                    creator_account = CreatorAccount.objects.select_for_update().get_or_create(user=video.creator)[0]
-                    CreatorAccount.objects.filter(pk=creator_account.pk).update(
-                        pending_vnd=F('pending_vnd') + Decimal(str(creator_share_vnd)),
-                        total_earned_vnd=F('total_earned_vnd') + Decimal(str(creator_share_vnd)),
-                    )
-                    creator_account.refresh_from_db(fields=['pending_vnd', 'total_earned_vnd'])
-
-                    Transaction.objects.create(
-                        sender=user,
-                        receiver=video.creator,
-                        tx_type='CONTENT_SALE',
-                        amount_tc=Decimal(str(price_int)),
-                        amount_vnd=Decimal(str(creator_share_vnd)),
-                        tc_added=Decimal('0.00'),
-                        reference_video=video,
-                        status='PENDING',
-                    )
-                did_charge_user = True
-            else:
-                profile = _get_or_create_profile(user)
-                next_balance = _sync_profile_legacy_balance(profile)
-                wallet = Wallet.objects.filter(user=user).first()
-                if wallet and _tc_to_int(wallet.balance) != next_balance:
-                    Wallet.objects.filter(pk=wallet.pk).update(balance=Decimal(str(next_balance)))
-                    wallet.refresh_from_db(fields=['balance'])
-
-            session, _ = WatchSession.objects.get_or_create(user=user, video=video)
-            if not session.is_unlocked:
-                session.is_unlocked = True
-                session.save(update_fields=['is_unlocked'])
-
-            # Purchase notifications are only for newly-paid unlocks.
-            if did_charge_user:
-                buyer_text = f"Bạn đã mở khóa {video.title}. -{price_int} TC"
-                _create_notification(
-                    recipient=user,
-                    sender=video.creator,
-                    notification_type=Notification.TYPE_PURCHASE,
-                    text=buyer_text,
-                    link=f"video-detail.html?id={video.id}",
-                    video=video,
+            if user.id != video.creator_id:
+                enqueue_notification(
+                    'video_sold', video.creator_id, sender=user, video=video,
+                    buyer=user.username, title=video.title, share_vnd=int(price_int * 0.7 * 100),
                 )
 
-                if user.id != video.creator_id:
-                    creator_share_vnd = int(price_int * 0.7 * 100)
-                    creator_text = f"{user.username} đã mua {video.title}. +{_format_vnd_vi(creator_share_vnd)} VND (Pending)"
-                    _create_notification(
-                        recipient=video.creator,
-                        sender=user,
-                        notification_type=Notification.TYPE_PURCHASE,
-                        text=creator_text,
-                        link=f"video-detail.html?id={video.id}",
-                        video=video,
-                    )
+        return remaining_int
 
+    try:
+        remaining_int = run_money_operation('video_purchase', _unlock)
     except Wallet.DoesNotExist:
         return None, _json_error('Ví không tồn tại.', status=404)
     except ValueError as exc:
@@ -534,7 +669,23 @@ def _process_video_purchase(user, video):
     except Exception as exc:
         return None, _json_error(str(exc), status=500)
 
-    remaining_int = _sync_profile_legacy_balance(profile)
+    if remaining_int is None:
+        # Lost the race to a concurrent unlock of the same video.
+        remaining_int = _account_balance_int(user)
+        video_url = _safe_file_url(None, video.file_url)
+        return {
+            'remaining_tc': Decimal(str(remaining_int)),
+            'remaining_balance': remaining_int,
+            'balance': remaining_int,
+            'balance_display': f"{_format_tc_vi(remaining_int)} TC",
+            'video_url': video_url,
+            'videoUrl': video_url,
+            'price_tc': price,
+            'dynamic_price_tc': price_int,
+            'avg_rating': avg_rating,
+            'message': 'Video đã được mở khóa trước đó',
+        }, None
+
     remaining = Decimal(str(remaining_int))
     video_url = _safe_file_url(None, video.file_url)
     return {
@@ -645,33 +796,24 @@ def api_login(request):
 @csrf_exempt
 @require_GET
 def api_get_wallet(request):
-    """API: Get wallet balance for the authenticated user."""
+    """API: Get wallet balance for the authenticated user.
+
+    Read-only: an account without a Wallet row reads as 0 TC and gets its
+    wallet from the first credit (``_credit_wallet``), never from a GET.
+    """
     user = _get_auth_user(request)
     if not user:
         return _json_error('Unauthorized', status=401)
-    
-    try:
-        profile = _get_or_create_profile(user)
-        wallet, _ = Wallet.objects.get_or_create(user=user)
-        balance_int = _sync_profile_legacy_balance(profile)
-
-        # Keep wallet mirrored for legacy code paths.
-        if _tc_to_int(wallet.balance) != balance_int:
-            wallet.balance = Decimal(str(balance_int))
-            wallet.save(update_fields=['balance', 'updated_at'])
 
-        return _json_success({
-            'balance': balance_int,
-            'balance_tc': balance_int,
-            'balance_display': f"{_format_tc_vi(balance_int)} TC",
-            'user_id': user.id,
-            'username': user.username,
-            'email': user.email,
-        })
-    except Wallet.DoesNotExist:
-        return _json_error('Wallet not found', status=404)
-    except Exception as e:
-        return _json_error(str(e), status=500)
+    balance_int = _profile_balance_tc_int(_get_profile_for_read(user))
+    return _json_success({
+        'balance': balance_int,
+        'balance_tc': balance_int,
+        'balance_display': f"{_format_tc_vi(balance_int)} TC",
+        'user_id': user.id,
+        'username': user.username,
+        'email': user.email,
+    })
 
 @require_GET
 def api_profile(request):
@@ -680,17 +822,11 @@ def api_profile(request):
     if auth_error:
         return auth_error
 
-    # Profile is the source of truth for balance.
-    profile = _get_or_create_profile(user)
-    vip_active, vip_expiry = _refresh_vip_state(user, profile)
-    wallet, _ = Wallet.objects.get_or_create(user=user)
-    creator_account = CreatorAccount.objects.filter(user=user).first()
-    balance_int = _sync_profile_legacy_balance(profile)
-
-    # Keep wallet mirror aligned for legacy screens.
-    if _tc_to_int(wallet.balance) != balance_int:
-        wallet.balance = Decimal(str(balance_int))
-        wallet.save(update_fields=['balance', 'updated_at'])
+    # The balance is read from the Wallet row (0 when missing); this read never writes.
+    profile = _get_profile_for_read(user)
+    vip_active, vip_expiry = _vip_state(user)
+    creator_account = get_creator_account_for_read(user)
+    balance_int = _profile_balance_tc_int(profile)
 
     return _json_success({
         'id': user.id,
@@ -706,12 +842,12 @@ def api_profile(request):
         'is_vip': bool(vip_active),
         'vip_expiry': vip_expiry.isoformat() if vip_expiry else None,
         'vip_expiry_display': vip_expiry.strftime('%d/%m/%Y') if vip_expiry else None,
-        'creator_available_vnd': _tc_to_int(creator_account.available_vnd) if creator_account else 0,
-        'creator_pending_vnd': _tc_to_int(creator_account.pending_vnd) if creator_account else 0,
-        'creator_total_earned_vnd': _tc_to_int(creator_account.total_earned_vnd) if creator_account else 0,
-        'creator_available_balance': _tc_to_int(creator_account.available_vnd) if creator_account else 0,
-        'creator_pending_balance': _tc_to_int(creator_account.pending_vnd) if creator_account else 0,
-        'creator_total_earned': _tc_to_int(creator_account.total_earned_vnd) if creator_account else 0,
+        'creator_available_vnd': _tc_to_int(creator_account.available_vnd),
+        'creator_pending_vnd': _tc_to_int(creator_account.pending_vnd),
+        'creator_total_earned_vnd': _tc_to_int(creator_account.total_earned_vnd),
+        'creator_available_balance': _tc_to_int(creator_account.available_vnd),
+        'creator_pending_balance': _tc_to_int(creator_account.pending_vnd),
+        'creator_total_earned': _tc_to_int(creator_account.total_earned_vnd),
     })
 
 
@@ -722,10 +858,10 @@ def api_me(request):
     if auth_error:
         return auth_error
 
-    profile = _get_or_create_profile(user)
-    vip_active, vip_expiry = _refresh_vip_state(user, profile)
-    creator_account = CreatorAccount.objects.filter(user=user).first()
-    balance_int = _sync_profile_legacy_balance(profile)
+    profile = _get_profile_for_read(user)
+    vip_active, vip_expiry = _vip_state(user)
+    creator_account = get_creator_account_for_read(user)
+    balance_int = _profile_balance_tc_int(profile)
 
     return _json_success({
         'id': user.id,
@@ -743,12 +879,12 @@ def api_me(request):
         'is_vip': bool(vip_active),
         'vip_expiry': vip_expiry.isoformat() if vip_expiry else None,
         'vip_expiry_display': vip_expiry.strftime('%d/%m/%Y') if vip_expiry else None,
-        'creator_available_vnd': _tc_to_int(creator_account.available_vnd) if creator_account else 0,
-        'creator_pending_vnd': _tc_to_int(creator_account.pending_vnd) if creator_account else 0,
-        'creator_total_earned_vnd': _tc_to_int(creator_account.total_earned_vnd) if creator_account else 0,
-        'creator_available_balance': _tc_to_int(creator_account.available_vnd) if creator_account else 0,
-        'creator_pending_balance': _tc_to_int(creator_account.pending_vnd) if creator_account else 0,
-        'creator_total_earned': _tc_to_int(creator_account.total_earned_vnd) if creator_account else 0,
+        'creator_available_vnd': _tc_to_int(creator_account.available_vnd),
+        'creator_pending_vnd': _tc_to_int(creator_account.pending_vnd),
+        'creator_total_earned_vnd': _tc_to_int(creator_account.total_earned_vnd),
+        'creator_available_balance': _tc_to_int(creator_account.available_vnd),
+        'creator_pending_balance': _tc_to_int(creator_account.pending_vnd),
+        'creator_total_earned': _tc_to_int(creator_account.total_earned_vnd),
     })
 
 
@@ -977,8 +1113,8 @@ def ping_watch_session(request):
     if not session_id or not signature:
         return _json_error('Thiếu session_id hoặc signature!', status=400)
 
-    session = WatchSession.objects.filter(id=session_id, user=user).first()
-    if not session:
+    persisted = WatchSession.objects.filter(id=session_id, user=user).values_list('watched_seconds', flat=True).first()
+    if persisted is None:
         return _json_error('Session không tồn tại hoặc không thuộc về bạn!', status=404)
 
     # Anti-cheat: enforce >=9s between pings using cached last-seen timestamps
@@ -991,19 +1127,15 @@ def ping_watch_session(request):
     if payload.get('uid') != user.id or payload.get('sid') != session_id:
         return _json_error('Chữ ký không hợp lệ!', status=403)
 
-    cache_key = f"watch-ping:{user.id}:{session_id}"
-    now = timezone.now()
-    last_seen = cache.get(cache_key)
-    if last_seen and (now - last_seen).total_seconds() < 9:
+    # Add 10 seconds per heartbeat; UI should call every 10s from player.
+    # Buffered in a shared cache and flushed to WatchSession in bulk, else written straight through
+    # (>=9s anti-spam guard included either way).
+    pending = record_heartbeat(user.id, session_id, 10)
+    if pending is None:
         return _json_error('Phát hiện spam ping!', status=403)
+    maybe_flush_heartbeats()
 
-    cache.set(cache_key, now, timeout=60)
-
-    # Add 10 seconds per heartbeat; UI should call every 10s from player
-    session.watched_seconds += 10
-    session.save(update_fields=['watched_seconds', 'last_ping_time'])
-
-    return _json_success({'watched_seconds': session.watched_seconds})
+    return _json_success({'watched_seconds': persisted + pending})
 
 @csrf_exempt
 @require_POST
@@ -1030,24 +1162,28 @@ def api_upload_video(request):
 def api_course_list_create(request):
     """List active courses or create a new course (creators only)."""
     if request.method == 'GET':
-        q = request.GET.get('q', '').strip()
-        category_text = (request.GET.get('category') or '').strip()
-        qs = Course.objects.filter(is_deleted=False, is_active=True)
-        if q:
-            qs = qs.filter(Q(title__icontains=q))
-        if category_text:
-            qs = qs.filter(category_text__icontains=category_text)
-        data = [
-            {
-                'id': c.id,
-                'title': c.title,
-                'description': c.description,
-                'category': c.category_text,
-                'instructor': c.instructor.username,
-            }
-            for c in qs.order_by('-created_at')
-        ]
-        return _json_success({'courses': data})
+        def build_base():
+            q = request.GET.get('q', '').strip()
+            category_text = (request.GET.get('category') or '').strip()
+            qs = Course.objects.filter(is_deleted=False, is_active=True)
+            if q:
+                qs = qs.filter(Q(title__icontains=q))
+            if category_text:
+                qs = qs.filter(category_text__icontains=category_text)
+            page, next_cursor = _created_keyset_page(request, qs.select_related('instructor'))
+            data = [
+                {
+                    'id': c.id,
+                    'title': c.title,
+                    'description': c.description,
+                    'category': c.category_text,
+                    'instructor': c.instructor.username,
+                }
+                for c in page
+            ]
+            return {'courses': data, 'has_more': next_cursor is not None, 'next_cursor': next_cursor}
+
+        return _catalog_response(request, 'manage-courses', build_base)
 
     if request.method == 'POST':
         user, auth_error = _require_auth(request)
@@ -1090,19 +1226,14 @@ def api_course_detail(request, course_id):
     if request.method == 'GET':
         viewer = _get_auth_user(request)
         videos = Video.objects.filter(course=course, is_deleted=False, is_active=True).select_related('prerequisite_video').order_by('created_at')
+        videos = list(videos)
         unlocked_video_ids = set()
         completed_video_ids = set()
         if viewer:
-            unlocked_video_ids = set(
-                VideoAccess.objects.filter(user=viewer, video__course=course).values_list('video_id', flat=True)
-            )
-            # Backward compatibility: older unlock flows marked WatchSession.is_unlocked without creating VideoAccess.
-            unlocked_video_ids.update(
-                WatchSession.objects.filter(user=viewer, video__course=course, is_unlocked=True).values_list('video_id', flat=True)
-            )
+            unlocked_video_ids = _watchable_video_ids(viewer, videos)
             course_video_ids = [v.id for v in videos]
             if course_video_ids:
-                progress = WatchSession.objects.filter(user=viewer, video_id__in=course_video_ids).values_list('video_id', 'watched_seconds')
+                progress = _watched_seconds_by_video(viewer, course_video_ids).items()
                 duration_map = {v.id: max(1, int(v.duration_seconds or 0)) for v in videos}
                 completed_video_ids = {
                     vid for vid, watched in progress
@@ -1112,7 +1243,7 @@ def api_course_detail(request, course_id):
         lessons = []
         viewer_is_vip = False
         if viewer:
-            viewer_is_vip, _ = _refresh_vip_state(viewer)
+            viewer_is_vip, _ = _vip_state(viewer)
         for lesson in videos:
             duration_seconds = int(lesson.duration_seconds or 0)
             computed_price, _ = _compute_dynamic_price_tc(lesson)
@@ -1189,36 +1320,56 @@ def api_course_detail(request, course_id):
 def api_video_list_create(request):
     """List active videos or create a new video (creators only)."""
     if request.method == 'GET':
-        viewer = _get_auth_user(request)
-        q = request.GET.get('q', '').strip()
-        course_id = request.GET.get('course')
-        standalone = request.GET.get('standalone')
-        qs = Video.objects.filter(is_deleted=False, is_active=True)
-        if q:
-            qs = qs.filter(Q(title__icontains=q))
-        if course_id:
-            qs = qs.filter(course_id=course_id)
-        if standalone is not None:
-            standalone_flag = str(standalone).lower() in {'1', 'true', 'yes'}
-            qs = qs.filter(is_standalone=standalone_flag)
-        data = []
-        for v in qs.order_by('-created_at'):
-            can_watch = _can_watch_video(viewer, v)
-            data.append({
-                'id': v.id,
-                'title': v.title,
-                'course': v.course_id,
-                'category': v.category.name if v.category else None,
-                'price_tc': int(v.price_tc),
-                'duration_seconds': v.duration_seconds,
-                'creator': v.creator.username,
-                'creator_id': v.creator_id,
-                'is_standalone': v.is_standalone,
-                'is_unlocked': bool(can_watch),
-                'thumbnail': _safe_file_url(request, v.thumbnail),
-                'file_url': _safe_file_url(request, v.file_url) if can_watch else '',
-            })
-        return _json_success({'videos': data})
+        def build_base():
+            q = request.GET.get('q', '').strip()
+            course_id = request.GET.get('course')
+            standalone = request.GET.get('standalone')
+            qs = Video.objects.filter(is_deleted=False, is_active=True)
+            if q:
+                qs = qs.filter(Q(title__icontains=q))
+            if course_id:
+                qs = qs.filter(course_id=course_id)
+            if standalone is not None:
+                standalone_flag = str(standalone).lower() in {'1', 'true', 'yes'}
+                qs = qs.filter(is_standalone=standalone_flag)
+            videos, next_cursor = _created_keyset_page(request, qs.select_related('category', 'creator'))
+            data = [
+                {
+                    'id': v.id,
+                    'title': v.title,
+                    'course': v.course_id,
+                    'category': v.category.name if v.category else None,
+                    'price_tc': int(v.price_tc),
+                    'duration_seconds': v.duration_seconds,
+                    'creator': v.creator.username,
+                    'creator_id': v.creator_id,
+                    'is_standalone': v.is_standalone,
+                    'is_unlocked': False,
+                    'thumbnail': _safe_file_url(request, v.thumbnail),
+                    'file_url': '',
+                }
+                for v in videos
+            ]
+            # Per-video access inputs; never sent as-is, only used by the overlay.
+            access = {v.id: (v.creator_id, bool(v.is_free), _safe_file_url(request, v.file_url)) for v in videos}
+            return {
+                'payload': {'videos': data, 'has_more': next_cursor is not None, 'next_cursor': next_cursor},
+                'access': access,
+            }
+
+        def overlay(base):
+            access = base['access']
+            watchable_ids = _watchable_ids(
+                _get_auth_user(request),
+                [(video_id, creator_id, is_free) for video_id, (creator_id, is_free, _) in access.items()],
+            )
+            videos = [
+                dict(row, is_unlocked=True, file_url=access[row['id']][2]) if row['id'] in watchable_ids else row
+                for row in base['payload']['videos']
+            ]
+            return dict(base['payload'], videos=videos)
+
+        return _catalog_response(request, 'manage-videos', build_base, overlay)
 
     if request.method == 'POST':
         user, auth_error = _require_auth(request)
@@ -1246,6 +1397,7 @@ def api_video_list_create(request):
             video.thumbnail = stored_thumb
 
         video.save()
+        bump_creator_stats(user.id, video_count=1)
 
         return _json_success({'id': video.id, 'title': video.title, 'file_url': _safe_file_url(request, video.file_url)}, status=201)
 
@@ -1319,6 +1471,8 @@ def api_video_detail(request, video_id):
         video.is_active = False
         video.is_deleted = True
         video.save(update_fields=['is_active', 'is_deleted'])
+        # Views and ratings of the removed video drop out of the creator totals.
+        refresh_creator_stats([video.creator_id])
         return _json_success({'message': 'Đã xóa mềm video.'})
 
     return _json_error('Method not allowed', status=405)
@@ -1336,8 +1490,15 @@ def homepage(request):
 
     categories = Category.objects.all()
 
+    try:
+        page, next_cursor = _created_keyset_page(request, courses.select_related('instructor'))
+    except ValueError:
+        # A stale or hand-edited cursor just restarts from the newest courses.
+        page, next_cursor = _created_keyset_page(request, courses.select_related('instructor'), cursor_param=None)
+
     context = {
-        'courses': courses.order_by('-created_at'),
+        'courses': page,
+        'next_cursor': next_cursor,
         'query': q,
         'category_id': category_text,
         'categories': categories,
@@ -1373,16 +1534,19 @@ def api_get_video_detail(request, video_id):
         return _json_error('Video không tồn tại!', status=404)
 
     is_owner = user.id == video.creator_id
-    vip_active, _ = _refresh_vip_state(user)
+    vip_active, _ = _vip_state(user)
     dynamic_price_tc, avg_rating = _compute_dynamic_price_tc(video)
     if video.is_free:
         dynamic_price_tc = 0
-    session, _ = WatchSession.objects.get_or_create(user=user, video=video)
+    session, session_created = WatchSession.objects.get_or_create(user=user, video=video)
+    if session_created:
+        record_creator_views(video.creator_id)
 
     has_access = _can_watch_video(user, video)
     if has_access and not session.is_unlocked:
         session.is_unlocked = True
         session.save(update_fields=['is_unlocked'])
+        record_unlock(user.id, video)
 
     locked = not has_access
     following = Follow.objects.filter(follower=user, following=video.creator).exists()
@@ -1424,6 +1588,7 @@ def api_get_video_detail(request, video_id):
 
 @csrf_exempt
 @require_POST
+@idempotent('unlock_video')
 def api_unlock_video(request, video_id):
     """API: Unlock a video using TC and return the playable URL."""
     user, auth_error = _require_auth(request)
@@ -1447,6 +1612,7 @@ def api_unlock_video(request, video_id):
 
 @csrf_exempt
 @require_POST
+@idempotent('unlock_video')
 def api_unlock_video_by_body(request):
     """API: Unlock a video by video_id in JSON body at /api/unlock-video/."""
     user, auth_error = _require_auth(request)
@@ -1478,6 +1644,141 @@ def api_unlock_video_by_body(request):
     return _json_success({'message': 'Mở khóa video thành công!', **payload})
 
 
+@csrf_exempt
+@require_POST
+@idempotent('unlock_course')
+def api_unlock_course(request, course_id):
+    """API: Unlock every eligible lesson of a course with one debit and one transaction.
+
+    Lessons are priced like api_unlock_video; already unlocked lessons and
+    lessons whose prerequisite is not completed yet are skipped and reported.
+    """
+    user, auth_error = _require_auth(request)
+    if auth_error:
+        return auth_error
+
+    try:
+        course = Course.objects.get(id=course_id, is_active=True, is_deleted=False)
+    except Course.DoesNotExist:
+        return _json_error('Khóa học không tồn tại!', status=404)
+
+    videos = list(
+        Video.objects.filter(course=course, is_active=True, is_deleted=False)
+        .select_related('prerequisite_video', 'creator')
+        .order_by('created_at', 'id')
+    )
+    video_ids = [video.id for video in videos]
+    already_ids = set(VideoAccess.objects.filter(user=user, video_id__in=video_ids).values_list('video_id', flat=True))
+    blocked_ids = _prerequisite_blocked_ids(user, [video for video in videos if video.id not in already_ids])
+    lessons = [video for video in videos if video.id not in already_ids and video.id not in blocked_ids]
+    prices = {
+        video.id: 0 if video.is_free else _compute_dynamic_price_tc(video)[0]
+        for video in lessons
+    }
+
+    vip_active, _ = _vip_state(user)
+    # Same rule as a single unlock: free lessons and VIP viewers are not charged.
+    charged = [] if vip_active else [video for video in lessons if prices[video.id] > 0]
+    total_int = sum(prices[video.id] for video in charged)
+
+    def _unlock_course(locks):
+        # LOCK_ORDER: one guarded debit for the whole course, then the access rows.
+        if total_int > 0:
+            balance = locks.debit(user.id, total_int)
+            if balance is None:
+                raise ValueError('Số dư TC không đủ để mở khóa khóa học này.')
+            remaining_int = _tc_to_int(balance)
+        else:
+            remaining_int = _account_balance_int(user)
+
+        locks.bulk_create(VideoAccess, [VideoAccess(user=user, video=video) for video in lessons])
+
+        ledger_rows, sales, creator_shares = [], [], {}
+        for video in charged:
+            price_int = prices[video.id]
+            ledger_rows.append(Transaction(
+                sender=user,
+                receiver=video.creator,
+                tx_type='CONTENT_SALE',
+                amount_tc=Decimal(str(price_int)),
+                tc_added=Decimal('0.00'),
+                reference_video=video,
+                status='SUCCESS',
+            ))
+            # Revenue split: 70% to creator pending_vnd (1 TC = 100 VND), journaled like single sales.
+            creator_share_vnd = int(price_int * 0.7 * 100)
+            if user.id != video.creator_id and creator_share_vnd > 0:
+                sales.append((video.creator, creator_share_vnd, video))
+                creator_shares[video.creator_id] = creator_shares.get(video.creator_id, 0) + creator_share_vnd
+                ledger_rows.append(Transaction(
+                    sender=user,
+                    receiver=video.creator,
+                    tx_type='CONTENT_SALE',
+                    amount_tc=Decimal(str(price_int)),
+                    amount_vnd=Decimal(str(creator_share_vnd)),
+                    tc_added=Decimal('0.00'),
+                    reference_video=video,
+                    status='PENDING',
+                ))
+        Transaction.objects.bulk_create(ledger_rows)
+        record_sales(sales)
+
+        lesson_ids = [video.id for video in lessons]
+        session_ids = set(
+            WatchSession.objects.filter(user=user, video_id__in=lesson_ids).values_list('video_id', flat=True)
+        )
+        WatchSession.objects.filter(user=user, video_id__in=session_ids, is_unlocked=False).update(is_unlocked=True)
+        new_sessions = [video for video in lessons if video.id not in session_ids]
+        WatchSession.objects.bulk_create(
+            [WatchSession(user=user, video=video, is_unlocked=True) for video in new_sessions]
+        )
+        new_views = {}
+        for video in new_sessions:
+            new_views[video.creator_id] = new_views.get(video.creator_id, 0) + 1
+        for creator_id, views in new_views.items():
+            record_creator_views(creator_id, views)
+        record_unlocks(user.id, lessons)
+
+        if charged:
+            enqueue_notification(
+                'course_unlocked', user, sender=course.instructor_id,
+                course_id=course.id, title=course.title, lessons=len(lessons), price_tc=total_int,
+            )
+            for creator_id, share_vnd in creator_shares.items():
+                enqueue_notification(
+                    'course_sold', creator_id, sender=user,
+                    course_id=course.id, buyer=user.username, title=course.title, share_vnd=share_vnd,
+                )
+        return remaining_int
+
+    if lessons:
+        try:
+            remaining_int = run_money_operation('course_unlock', _unlock_course)
+        except Wallet.DoesNotExist:
+            return _json_error('Ví không tồn tại.', status=404)
+        except ValueError as exc:
+            return _json_error(str(exc), status=400)
+        except IntegrityError:
+            # A lesson was unlocked concurrently between the read above and the insert.
+            return _json_error('Một bài học vừa được mở khóa ở yêu cầu khác, vui lòng thử lại.', status=409)
+        except Exception as exc:
+            return _json_error(str(exc), status=500)
+    else:
+        remaining_int = _account_balance_int(user)
+
+    return _json_success({
+        'message': 'Mở khóa khóa học thành công!' if lessons else 'Không có bài học nào cần mở khóa.',
+        'course_id': course.id,
+        'unlocked_video_ids': [video.id for video in lessons],
+        'already_unlocked_video_ids': [video_id for video_id in video_ids if video_id in already_ids],
+        'prerequisite_locked_video_ids': [video_id for video_id in video_ids if video_id in blocked_ids],
+        'price_tc': total_int,
+        'remaining_balance': remaining_int,
+        'balance': remaining_int,
+        'balance_display': f"{_format_tc_vi(remaining_int)} TC",
+    })
+
+
 @require_GET
 def api_creator_price_eligibility(request):
     """API: return whether creator can manually override per-video price."""
@@ -1498,95 +1799,187 @@ def api_creator_price_eligibility(request):
 @require_GET
 def api_get_courses(request):
     """API: Return active courses and categories for catalog display."""
-    viewer = _get_auth_user(request)
-    categories = list(Category.objects.values('id', 'name'))  # Used for filters
-
-    purchased_course_ids = set()
-    if viewer:
-        purchased_course_ids = set(
-            VideoAccess.objects.filter(user=viewer, video__course__isnull=False)
-            .values_list('video__course_id', flat=True)
-            .distinct()
+    def build_base():
+        categories = list(Category.objects.values('id', 'name'))  # Used for filters
+        course_page, next_cursor = _created_keyset_page(
+            request,
+            Course.objects.filter(is_active=True, is_deleted=False).select_related('instructor'),
         )
-        # Backward compatibility for historical unlock rows that only exist in WatchSession.
-        purchased_course_ids.update(
-            WatchSession.objects.filter(user=viewer, is_unlocked=True, video__course__isnull=False)
-            .values_list('video__course_id', flat=True)
-            .distinct()
-        )
-
-    course_qs = (
-        Course.objects.filter(is_active=True, is_deleted=False)
-        .select_related('instructor')
-        .order_by('-created_at')
-    )
-
-    courses = [
-        {
-            'id': course.id,
-            'title': course.title,
-            'category_text': course.category_text,
-            'creator_id': course.instructor_id,
-            'creator_name': course.instructor.username,
-            'instructor__id': course.instructor_id,
-            'instructor__username': course.instructor.username,
-            'is_purchased': bool(course.id in purchased_course_ids),
-            'created_at': course.created_at.isoformat(),
+        courses = [
+            {
+                'id': course.id,
+                'title': course.title,
+                'category_text': course.category_text,
+                'creator_id': course.instructor_id,
+                'creator_name': course.instructor.username,
+                'instructor__id': course.instructor_id,
+                'instructor__username': course.instructor.username,
+                'is_purchased': False,
+                'created_at': course.created_at.isoformat(),
+            }
+            for course in course_page
+        ]
+        return {
+            'categories': categories,
+            'courses': courses,
+            'has_more': next_cursor is not None,
+            'next_cursor': next_cursor,
         }
-        for course in course_qs
-    ]
 
-    return _json_success({'categories': categories, 'courses': courses})
+    def overlay(base):
+        viewer = _get_auth_user(request)
+        if not viewer:
+            return base
+        # Includes historical unlock rows that only exist in WatchSession.
+        _, purchased_course_ids = get_unlocked_ids(viewer.id)
+        courses = [
+            dict(course, is_purchased=True) if course['id'] in purchased_course_ids else course
+            for course in base['courses']
+        ]
+        return dict(base, courses=courses)
+
+    return _catalog_response(request, 'courses', build_base, overlay)
 
 
 @require_GET
 def api_categories(request):
     """API: Return categories only (id, name) for dropdowns."""
-    categories = list(Category.objects.values('id', 'name'))
-    return _json_success({'categories': categories})
+    return _catalog_response(
+        request,
+        'categories',
+        lambda: {'categories': list(Category.objects.values('id', 'name'))},
+    )
+
+
+@require_GET
+def api_search(request):
+    """API: Relevance-ranked, accent-insensitive search over videos and courses.
+
+    ?q= is folded and prefix-matched token by token (every token must match);
+    ?type=video|course narrows the result kinds; ?limit= caps the result count.
+    """
+    query = (request.GET.get('q') or '').strip()
+    kind = (request.GET.get('type') or '').strip().lower()
+    if kind and kind not in {SearchDocument.KIND_VIDEO, SearchDocument.KIND_COURSE}:
+        return _json_error('Loại tìm kiếm không hợp lệ!', status=400)
+    limit = _page_limit(request, default=20, maximum=50)
+
+    hits = search_catalog(query, kinds=[kind] if kind else None, limit=limit)
+    video_ids = [object_id for hit_kind, object_id, _ in hits if hit_kind == SearchDocument.KIND_VIDEO]
+    course_ids = [object_id for hit_kind, object_id, _ in hits if hit_kind == SearchDocument.KIND_COURSE]
+    videos = Video.objects.filter(id__in=video_ids, is_active=True, is_deleted=False).select_related('category', 'creator').in_bulk()
+    courses = Course.objects.filter(id__in=course_ids, is_active=True, is_deleted=False).select_related('instructor').in_bulk()
+
+    results = []
+    for hit_kind, object_id, score in hits:
+        if hit_kind == SearchDocument.KIND_VIDEO and object_id in videos:
+            video = videos[object_id]
+            results.append({
+                'type': hit_kind,
+                'id': video.id,
+                'title': video.title,
+                'score': round(score, 4),
+                'course': video.course_id,
+                'category': video.category.name if video.category else None,
+                'creator': video.creator.username,
+                'creator_id': video.creator_id,
+                'price_tc': int(video.price_tc),
+                'duration_seconds': video.duration_seconds,
+                'thumbnail': _safe_file_url(request, video.thumbnail),
+            })
+        elif hit_kind == SearchDocument.KIND_COURSE and object_id in courses:
+            course = courses[object_id]
+            results.append({
+                'type': hit_kind,
+                'id': course.id,
+                'title': course.title,
+                'score': round(score, 4),
+                'category': course.category_text,
+                'instructor': course.instructor.username,
+                'instructor_id': course.instructor_id,
+            })
+
+    return _json_success({'query': query, 'results': results})
+
+
+@require_GET
+def api_suggest(request):
+    """API: Typeahead suggestions for video titles, course titles and creators.
+
+    Served from the in-process prefix index, so it is cheap enough to call on
+    every keystroke. ?q= is accent-folded; ?limit= caps the suggestions.
+    """
+    query = (request.GET.get('q') or '').strip()
+    limit = _page_limit(request, default=8, maximum=20)
+    suggestions = [
+        {'type': kind, 'id': object_id, 'label': label}
+        for kind, object_id, label in suggest_catalog(query, limit=limit)
+    ]
+    return _json_success({'query': query, 'suggestions': suggestions})
 
 
 @require_GET
 def api_teachers(request):
-    """API: Return ranked teachers (creators) by total views then average rating."""
+    """API: Return ranked teachers (creators) by total views then average rating.
+
+    Ranks are precomputed on CreatorStats by the refresh_creator_stats job;
+    pages are keyset-paginated on (rank, user id) via ?cursor= and ?limit=;
+    without either the first UNPAGED_LIST_LIMIT teachers are returned.
+    """
     user, auth_error = _require_auth(request)
     if auth_error:
         return auth_error
 
     try:
-        teachers_qs = (
-            User.objects.filter(uploaded_videos__is_active=True, uploaded_videos__is_deleted=False)
-            .distinct()
-            .annotate(
-                total_views=Count('uploaded_videos__watchsession', distinct=True),
-                avg_rating=Avg(
-                    'uploaded_videos__comments__rating',
-                    filter=Q(uploaded_videos__comments__rating__isnull=False),
-                ),
-            )
-            .order_by('-total_views', '-avg_rating', 'username')
+        cursor = _decode_cursor(request.GET.get('cursor'))
+        after_rank, after_user_id = (int(cursor[0]), int(cursor[1])) if cursor else (0, 0)
+    except (ValueError, TypeError, IndexError):
+        return _json_error('Cursor không hợp lệ!', status=400)
+    # Unpaged callers (no cursor, no ?limit=) get the leaderboard up to UNPAGED_LIST_LIMIT.
+    limit = _page_limit(request, default=50) if _wants_page(request) else UNPAGED_LIST_LIMIT
+
+    try:
+        ranked = (
+            CreatorStats.objects.filter(rank__isnull=False, video_count__gt=0)
+            .filter(Q(rank__gt=after_rank) | Q(rank=after_rank, user_id__gt=after_user_id))
+            .select_related('user', 'user__profile')
+            .order_by('rank', 'user_id')
+        )
+        page = list(ranked[:limit + 1])
+        has_more = len(page) > limit
+        page = page[:limit]
+
+        teacher_ids = [stats.user_id for stats in page]
+        following_ids = set(
+            Follow.objects.filter(follower=user, following_id__in=teacher_ids).values_list('following_id', flat=True)
         )
 
         data = []
-        for teacher in teachers_qs:
-            profile = _get_or_create_profile(teacher)
-            is_following = Follow.objects.filter(follower=user, following=teacher).exists()
+        for stats in page:
+            teacher = stats.user
+            profile = _get_profile_for_read(teacher)
             data.append({
                 'id': teacher.id,
                 'username': teacher.username,
+                'rank': stats.rank,
                 'avatar_url': _profile_avatar_url(request, profile) or f"https://ui-avatars.com/api/?name={teacher.username}",
                 'specialization': profile.specialization or 'Giang vien da linh vuc',
                 'bio': profile.bio or 'Chua cap nhat mo ta linh vuc giang day.',
-                'total_views': int(teacher.total_views or 0),
-                'avg_rating': round(float(teacher.avg_rating or 0), 2),
-                'followers_count': Follow.objects.filter(following=teacher).count(),
-                'is_following': bool(is_following),
+                'total_views': int(stats.total_views or 0),
+                'avg_rating': round(float(stats.avg_rating), 2),
+                'followers_count': int(stats.follower_count or 0),
+                'is_following': teacher.id in following_ids,
             })
 
-        return _json_success({'teachers': data})
+        return _json_success({
+            'teachers': data,
+            'has_more': has_more,
+            'next_cursor': _encode_cursor([page[-1].rank, page[-1].user_id]) if has_more else None,
+        })
     except Exception as exc:
         return _json_error(f'Khong the tai danh sach giao vien: {exc}', status=500)
-    
+
+
 @csrf_exempt
 @require_POST
 def api_toggle_follow(request, creator_id=None):
@@ -1620,24 +2013,21 @@ def api_toggle_follow(request, creator_id=None):
         return _json_error('Bạn không thể tự follow chính mình!')
 
     try:
-        # A single record represents follow; presence => following
-        follow_record = Follow.objects.filter(follower=user, following=creator).first()
-        if follow_record:
-            follow_record.delete()
-            is_following = False
-        else:
-            Follow.objects.create(follower=user, following=creator)
-            is_following = True
-            if _is_notification_enabled(creator, 'notify_follows'):
-                _create_notification(
-                    recipient=creator,
-                    sender=user,
-                    notification_type=Notification.TYPE_FOLLOW,
-                    text=f"{user.username} đã theo dõi bạn",
-                    link=f"/channel.html?id={user.id}",
-                )
+        # A single record represents follow; presence => following.
+        # Counters and the notification event move in the same transaction as the Follow row.
+        with transaction.atomic():
+            deleted, _ = Follow.objects.filter(follower=user, following=creator).delete()
+            if deleted:
+                bump_follow_counts(user.id, creator.id, -1)
+                is_following = False
+            else:
+                Follow.objects.create(follower=user, following=creator)
+                bump_follow_counts(user.id, creator.id, 1)
+                is_following = True
+                if _is_notification_enabled(creator, 'notify_follows'):
+                    enqueue_notification('followed', creator, sender=user, follower=user.username)
 
-        followers_count = Follow.objects.filter(following=creator).count()
+        followers_count = get_creator_stats(creator).follower_count
     except Exception as exc:
         return _json_error(str(exc), status=500)
 
@@ -1656,6 +2046,7 @@ def api_creator_notify_toggle(request):
 
 @csrf_exempt
 @require_POST
+@idempotent('purchase_video')
 def api_purchase_video(request):
     """API: Deduct TC from buyer, credit creator, and unlock the video atomically."""
     user, auth_error = _require_auth(request)
@@ -1683,6 +2074,7 @@ def api_purchase_video(request):
 
 @csrf_exempt
 @require_POST
+@idempotent('recharge')
 def api_recharge_tc(request):
     """API: Recharge TC by paying VND with fixed conversion 10,000 VND = 100 TC."""
     user, auth_error = _require_auth(request)
@@ -1700,40 +2092,24 @@ def api_recharge_tc(request):
 
     tc_added = amount_vnd // 100
 
-    try:
-        with transaction.atomic():
-            profile = UserProfile.objects.select_for_update().get_or_create(
-                user=user,
-                defaults={'wallet_balance': 30, 'balance_tc': Decimal('30.00')},
-            )[0]
-            wallet, _ = Wallet.objects.select_for_update().get_or_create(user=user)
-
-            UserProfile.objects.filter(pk=profile.pk).update(
-                balance_tc=F('balance_tc') + Decimal(str(tc_added)),
-                wallet_balance=F('wallet_balance') + tc_added,
-            )
-            Wallet.objects.filter(pk=wallet.pk).update(balance=F('balance') + Decimal(str(tc_added)))
+    def _recharge(locks):
+        wallet = _credit_wallet(user, Decimal(str(tc_added)))
 
-            profile.refresh_from_db(fields=['balance_tc', 'wallet_balance'])
-            new_balance = _profile_balance_tc_int(profile)
+        Transaction.objects.create(
+            sender=user,
+            receiver=user,
+            tx_type='RECHARGE',
+            amount_tc=Decimal(str(tc_added)),
+            amount_vnd=Decimal(str(amount_vnd)),
+            tc_added=Decimal(str(tc_added)),
+            status='SUCCESS',
+        )
 
-            Transaction.objects.create(
-                sender=user,
-                receiver=user,
-                tx_type='RECHARGE',
-                amount_tc=Decimal(str(tc_added)),
-                amount_vnd=Decimal(str(amount_vnd)),
-                tc_added=Decimal(str(tc_added)),
-                status='SUCCESS',
-            )
+        enqueue_notification('recharge', user, amount_vnd=amount_vnd, tc_added=tc_added)
+        return _tc_to_int(wallet.balance)
 
-            _create_notification(
-                recipient=user,
-                sender=None,
-                notification_type=Notification.TYPE_PURCHASE,
-                text=f"Nạp thành công {amount_vnd:,} VND. +{tc_added} TC".replace(',', '.'),
-                link='profile.html#wallet',
-            )
+    try:
+        new_balance = run_money_operation('recharge', _recharge)
     except Exception as exc:
         return _json_error(str(exc), status=500)
 
@@ -1748,6 +2124,7 @@ def api_recharge_tc(request):
 
 @csrf_exempt
 @require_POST
+@idempotent('purchase_vip')
 def api_purchase_vip(request):
     """API: Purchase or renew VIP by charging TC and extending expiry by one month."""
     user, auth_error = _require_auth(request)
@@ -1757,62 +2134,54 @@ def api_purchase_vip(request):
     package_price_vnd = Decimal('149000')
     vip_cost_tc = 149
 
-    try:
-        with transaction.atomic():
-            profile = UserProfile.objects.select_for_update().get_or_create(
-                user=user,
-                defaults={'wallet_balance': 30, 'balance_tc': Decimal('30.00')},
-            )[0]
-            wallet, _ = Wallet.objects.select_for_update().get_or_create(user=user)
-
-            balance_int = _sync_profile_legacy_balance(profile)
-            if balance_int < vip_cost_tc:
-                return _json_error('So du TC khong du de mua/gia han VIP.', status=400)
-
+    def _purchase_vip(locks):
+        # Compare-and-set on vip_expiry: the debit only applies if no concurrent
+        # renewal moved the expiry since it was read; otherwise read it again.
+        for _ in range(VIP_RENEWAL_ATTEMPTS):
+            current_expiry = Wallet.objects.filter(user=user).values_list('vip_expiry', flat=True).get()
             now = timezone.now()
-            current_expiry = profile.vip_expiry or user.vip_expiry
-            is_renewal = bool(current_expiry and current_expiry > now and (profile.is_vip or user.is_vip))
-            base_time = current_expiry if current_expiry and current_expiry > now else now
+            is_renewal = bool(current_expiry and current_expiry > now)
+            base_time = current_expiry if is_renewal else now
             new_expiry = _add_one_month_safe(base_time)
 
-            new_balance_int = max(0, balance_int - vip_cost_tc)
-
-            profile.is_vip = True
-            profile.vip_expiry = new_expiry
-            profile.balance_tc = Decimal(str(new_balance_int))
-            profile.wallet_balance = new_balance_int
-            profile.save(update_fields=['is_vip', 'vip_expiry', 'balance_tc', 'wallet_balance'])
-
-            user.is_vip = True
-            user.vip_expiry = new_expiry
-            user.save(update_fields=['is_vip', 'vip_expiry'])
+            balance = locks.debit(
+                user.id,
+                vip_cost_tc,
+                expect={'vip_expiry': current_expiry},
+                vip_expiry=new_expiry,
+            )
+            if balance is not None:
+                break
+            if Wallet.objects.filter(user=user, vip_expiry=current_expiry).exists():
+                # Expiry unchanged, so the balance guard failed.
+                return None
+        else:
+            raise ValueError('VIP dang duoc gia han o mot yeu cau khac, vui long thu lai.')
 
-            wallet.balance = Decimal(str(new_balance_int))
-            wallet.save(update_fields=['balance'])
+        Transaction.objects.create(
+            sender=user,
+            receiver=user,
+            tx_type='VIP_PURCHASE',
+            amount_tc=Decimal(str(vip_cost_tc)),
+            amount_vnd=package_price_vnd,
+            tc_added=Decimal('0.00'),
+            status='SUCCESS',
+        )
 
-            Transaction.objects.create(
-                sender=user,
-                receiver=user,
-                tx_type='VIP_PURCHASE',
-                amount_tc=Decimal(str(vip_cost_tc)),
-                amount_vnd=package_price_vnd,
-                tc_added=Decimal('0.00'),
-                status='SUCCESS',
-            )
+        enqueue_notification(
+            'vip_purchased', user, renewal=is_renewal, expiry=new_expiry.strftime('%d/%m/%Y'),
+        )
+        return _tc_to_int(balance), new_expiry, is_renewal
 
-            _create_notification(
-                recipient=user,
-                sender=None,
-                notification_type=Notification.TYPE_PURCHASE,
-                text=(
-                    f"Gia han VIP thanh cong den {new_expiry.strftime('%d/%m/%Y')}"
-                    if is_renewal else
-                    f"Kich hoat VIP thanh cong den {new_expiry.strftime('%d/%m/%Y')}"
-                ),
-                link='profile.html#wallet',
-            )
+    try:
+        purchased = run_money_operation('vip_purchase', _purchase_vip)
+    except ValueError as exc:
+        return _json_error(str(exc), status=409)
     except Exception as exc:
         return _json_error(str(exc), status=500)
+    if purchased is None:
+        return _json_error('So du TC khong du de mua/gia han VIP.', status=400)
+    new_balance_int, new_expiry, is_renewal = purchased
 
     return _json_success({
         'message': 'Gia han VIP thanh cong.' if is_renewal else 'Mua VIP thanh cong.',
@@ -1829,6 +2198,7 @@ def api_purchase_vip(request):
 
 @csrf_exempt
 @require_POST
+@idempotent('withdraw')
 def api_withdraw_request(request):
     """API: Create a withdrawal request when creator available balance is above threshold."""
     user, auth_error = _require_auth(request)
@@ -1840,57 +2210,56 @@ def api_withdraw_request(request):
     except ValueError as exc:
         return _json_error(str(exc), status=400)
 
-    try:
-        with transaction.atomic():
-            account = CreatorAccount.objects.select_for_update().get_or_create(user=user)[0]
+    def _withdraw(locks):
+        account = locks.get_or_create(CreatorAccount, user=user)[0]
 
-            available_vnd = _tc_to_int(account.available_vnd)
-            if available_vnd <= 50000:
-                return _json_error('Can toi thieu hon 50.000 VND kha dung de gui yeu cau rut.', status=400)
+        available_vnd = _tc_to_int(account.available_vnd)
+        if available_vnd <= 50000:
+            raise ValueError('Can toi thieu hon 50.000 VND kha dung de gui yeu cau rut.')
 
-            requested = data.get('amount_vnd')
-            if requested is None:
-                withdraw_vnd = available_vnd
-            else:
-                withdraw_vnd = int(requested)
+        requested = data.get('amount_vnd')
+        if requested is None:
+            withdraw_vnd = available_vnd
+        else:
+            withdraw_vnd = int(requested)
 
-            if withdraw_vnd <= 50000:
-                return _json_error('So tien rut phai lon hon 50.000 VND.', status=400)
-            if withdraw_vnd > available_vnd:
-                return _json_error('So du kha dung khong du.', status=400)
+        if withdraw_vnd <= 50000:
+            raise ValueError('So tien rut phai lon hon 50.000 VND.')
+        if withdraw_vnd > available_vnd:
+            raise ValueError('So du kha dung khong du.')
 
-            CreatorAccount.objects.filter(pk=account.pk).update(
-                available_vnd=F('available_vnd') - Decimal(str(withdraw_vnd))
-            )
-            account.refresh_from_db(fields=['available_vnd'])
-
-            amount_vnd = Decimal(str(withdraw_vnd))
-            withdraw_tc = int(withdraw_vnd / 100)
-            request_row = WithdrawalRequest.objects.create(
-                user=user,
-                amount_tc=Decimal(str(withdraw_tc)),
-                amount_vnd=amount_vnd,
-                status='PENDING',
-                note='Auto-generated from profile withdrawal request',
-            )
+        CreatorAccount.objects.filter(pk=account.pk).update(
+            available_vnd=F('available_vnd') - Decimal(str(withdraw_vnd))
+        )
+        account.refresh_from_db(fields=['available_vnd'])
 
-            Transaction.objects.create(
-                sender=user,
-                receiver=None,
-                tx_type='WITHDRAW_VND',
-                amount_tc=Decimal(str(withdraw_tc)),
-                amount_vnd=amount_vnd,
-                tc_added=Decimal('0.00'),
-                status='PENDING',
-            )
+        amount_vnd = Decimal(str(withdraw_vnd))
+        withdraw_tc = int(withdraw_vnd / 100)
+        request_row = WithdrawalRequest.objects.create(
+            user=user,
+            amount_tc=Decimal(str(withdraw_tc)),
+            amount_vnd=amount_vnd,
+            status='PENDING',
+            note='Auto-generated from profile withdrawal request',
+        )
 
-            _create_notification(
-                recipient=user,
-                sender=None,
-                notification_type=Notification.TYPE_PURCHASE,
-                text=f"Yeu cau rut {_format_vnd_vi(withdraw_vnd)} VND da duoc tao (ma {request_row.id}).",
-                link='profile.html#wallet',
-            )
+        Transaction.objects.create(
+            sender=user,
+            receiver=None,
+            tx_type='WITHDRAW_VND',
+            amount_tc=Decimal(str(withdraw_tc)),
+            amount_vnd=amount_vnd,
+            tc_added=Decimal('0.00'),
+            status='PENDING',
+        )
+
+        enqueue_notification('withdraw_requested', user, amount_vnd=withdraw_vnd, request_id=request_row.id)
+        return account, request_row, withdraw_tc, amount_vnd
+
+    try:
+        account, request_row, withdraw_tc, amount_vnd = run_money_operation('withdraw', _withdraw)
+    except ValueError as exc:
+        return _json_error(str(exc), status=400)
     except Exception as exc:
         return _json_error(str(exc), status=500)
 
@@ -1936,25 +2305,36 @@ def api_post_comment(request):
     except Video.DoesNotExist:
         return _json_error('Video không tồn tại!', status=404)
 
-    CommentReview.objects.create(
-        user=user,
-        video=video,
-        content=content,
-        rating=rating_value,
-    )
+    _create_review(user, video, content, rating_value)
 
     if user != video.creator and _is_notification_enabled(video.creator, 'notify_comments'):
-        _create_notification(
-            recipient=video.creator,
-            sender=user,
-            notification_type=Notification.TYPE_RATING,
-            text=f"{user.username} đã đánh giá {rating_value} sao cho video của bạn",
-            link=f"/video-detail.html?id={video.id}",
-            video=video,
-        )
+        enqueue_notification('rated', video.creator_id, sender=user, video=video, reviewer=user.username, rating=rating_value)
 
     return _json_success({'message': 'Đã gửi bình luận!'})
 
+def _notification_payload(request, n):
+    """Serialize one notification (sender and video preloaded) for the header dropdown."""
+    text = render_text(n)
+    return {
+        'id': n.id,
+        'text': text,
+        'content': text,
+        'link': render_link(n),
+        'notification_type': n.notification_type,
+        'actor_count': n.actor_count,
+        'sender': {
+            'id': n.sender_id,
+            'username': n.sender.username if n.sender else None,
+        },
+        'sender_name': n.sender.username if n.sender else 'Hệ thống',
+        'video_id': n.video_id,
+        'video_title': n.video.title if n.video else None,
+        'video_thumbnail': _safe_file_url(request, n.video.thumbnail) if n.video and n.video.thumbnail else '',
+        'is_read': n.is_read,
+        'created_at': n.created_at.strftime("%H:%M %d/%m/%Y"),
+    }
+
+
 @require_GET
 def api_get_notifications(request):
     """API: Fetch recent notifications plus unread count for the current user."""
@@ -1963,33 +2343,66 @@ def api_get_notifications(request):
         return auth_error
 
     # Pull latest notifications; limit to keep payload small
-    notifs = Notification.objects.filter(recipient=user).select_related('sender', 'video').order_by('-created_at')[:20]
+    notifs = (
+        Notification.objects.filter(recipient=user)
+        .select_related('sender', 'video')
+        .order_by('-created_at', '-id')[:20]
+    )
 
-    data = [
-        {
-            'id': n.id,
-            'text': n.text,
-            'content': n.text,
-            'notification_type': n.notification_type,
-            'sender': {
-                'id': n.sender_id,
-                'username': n.sender.username if n.sender else None,
-            },
-            'sender_name': n.sender.username if n.sender else 'Hệ thống',
-            'video_id': n.video_id,
-            'video_title': n.video.title if n.video else None,
-            'video_thumbnail': _safe_file_url(request, n.video.thumbnail) if n.video and n.video.thumbnail else '',
-            'is_read': n.is_read,
-            'created_at': n.created_at.strftime("%H:%M %d/%m/%Y"),
-        }
-        for n in notifs
-    ]
+    data = [_notification_payload(request, n) for n in notifs]
 
-    unread_count = Notification.objects.filter(recipient=user, is_read=False).count()
+    # Maintained counter instead of COUNT(*) over the unread rows on every poll.
+    unread_count = get_unread_count(user.id)
 
     return _json_success({'notifications': data, 'unread_count': unread_count})
 
 
+@csrf_exempt
+@require_POST
+def api_stream_ticket(request):
+    """API: Issue a short-lived ticket for opening the event stream.
+
+    EventSource cannot send headers, so the stream takes its credential in the
+    query string, which access logs record. The bearer token never goes there;
+    the ticket does, and it expires after STREAM_TICKET_MAX_AGE seconds.
+    """
+    user, auth_error = _require_auth(request)
+    if auth_error:
+        return auth_error
+    return _json_success({'ticket': issue_stream_ticket(user), 'expires_in': STREAM_TICKET_MAX_AGE})
+
+
+def _stream_user(request):
+    user = resolve_request_user(request)
+    if user is None:
+        user_id = read_stream_ticket_user_id(request.GET.get('ticket', '').strip())
+        user = load_user(user_id) if user_id else None
+    return user
+
+
+@require_GET
+async def api_event_stream(request):
+    """API: Server-sent events with new notifications, unread count and wallet changes.
+
+    Meant to be served over ASGI (core.asgi); replaces polling of
+    api_get_notifications and api_me. Authenticated by bearer header or
+    ``?ticket=`` from api_stream_ticket. Frames: state (on connect),
+    notification, unread and balance. See realtime.py.
+    """
+    user = await sync_to_async(_stream_user)(request)
+    if user is None:
+        return _json_error('Vui lòng đăng nhập!', status=401)
+
+    response = StreamingHttpResponse(
+        user_event_stream(user.id, lambda n: _notification_payload(request, n)),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies from buffering the stream.
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @csrf_exempt
 @require_POST
 def mark_notifications_as_read(request):
@@ -1998,7 +2411,7 @@ def mark_notifications_as_read(request):
     if auth_error:
         return auth_error
 
-    Notification.objects.filter(recipient=user, is_read=False).update(is_read=True)
+    mark_all_read(user.id)
     return JsonResponse({'status': 'success'})
 
 
@@ -2054,22 +2467,10 @@ def api_video_comment(request, video_id):
     except Video.DoesNotExist:
         return _json_error('Video không tồn tại!', status=404)
 
-    CommentReview.objects.create(
-        user=user,
-        video=video,
-        content=content,
-        rating=rating_value,
-    )
+    _create_review(user, video, content, rating_value)
 
     if user != video.creator and _is_notification_enabled(video.creator, 'notify_comments'):
-        _create_notification(
-            recipient=video.creator,
-            sender=user,
-            notification_type=Notification.TYPE_RATING,
-            text=f"{user.username} đã đánh giá {rating_value} sao cho video của bạn",
-            link=f"/video-detail.html?id={video.id}",
-            video=video,
-        )
+        enqueue_notification('rated', video.creator_id, sender=user, video=video, reviewer=user.username, rating=rating_value)
 
     return _json_success({'message': 'Đã gửi bình luận!'})
     
@@ -2093,28 +2494,7 @@ def api_reward_ads(request):
     reward_amount = Decimal('0.50')
 
     try:
-        with transaction.atomic():
-            wallet = _lock_wallet(user)
-            profile = UserProfile.objects.select_for_update().get_or_create(
-                user=user,
-                defaults={'wallet_balance': 30, 'balance_tc': Decimal('30.00')},
-            )[0]
-
-            Wallet.objects.filter(pk=wallet.pk).update(balance=F('balance') + reward_amount)
-            UserProfile.objects.filter(pk=profile.pk).update(
-                balance_tc=F('balance_tc') + reward_amount,
-                wallet_balance=F('wallet_balance') + _tc_to_int(reward_amount),
-            )
-            wallet.refresh_from_db(fields=['balance'])
-
-            Transaction.objects.create(
-                receiver=user,
-                tx_type='EARN_ADS',
-                amount_tc=reward_amount,
-                status='SUCCESS',
-            )
-    except Wallet.DoesNotExist:
-        return _json_error('Ví không tồn tại. Vui lòng liên hệ hỗ trợ.', status=500)
+        wallet = run_money_operation('ad_reward', _credit_ad_reward, user, reward_amount)
     except Exception as exc:
         return _json_error(str(exc), status=500)
 
@@ -2130,26 +2510,7 @@ def earn_tc(request):
         return auth_error
 
     try:
-        with transaction.atomic():
-            profile, _ = UserProfile.objects.select_for_update().get_or_create(
-                user=user,
-                defaults={'wallet_balance': 30, 'balance_tc': Decimal('30.00')},
-            )
-            wallet, _ = Wallet.objects.select_for_update().get_or_create(user=user)
-
-            UserProfile.objects.filter(pk=profile.pk).update(
-                balance_tc=F('balance_tc') + Decimal('1.00'),
-                wallet_balance=F('wallet_balance') + 1,
-            )
-            Wallet.objects.filter(pk=wallet.pk).update(balance=F('balance') + Decimal('1.00'))
-            wallet.refresh_from_db(fields=['balance'])
-
-            Transaction.objects.create(
-                receiver=user,
-                tx_type='EARN_ADS',
-                amount_tc=Decimal('1.00'),
-                status='SUCCESS',
-            )
+        wallet = run_money_operation('ad_reward', _credit_ad_reward, user, Decimal('1.00'))
     except Exception as exc:
         return _json_error(str(exc), status=500)
 
@@ -2175,28 +2536,7 @@ def reward_ad_view(request):
         return _json_error('Bạn đang nhận thưởng quá nhanh, vui lòng đợi.', status=429)
 
     try:
-        with transaction.atomic():
-            wallet = Wallet.objects.select_for_update().get(user=user)
-            profile = UserProfile.objects.select_for_update().get_or_create(
-                user=user,
-                defaults={'wallet_balance': 30, 'balance_tc': Decimal('30.00')},
-            )[0]
-
-            Wallet.objects.filter(pk=wallet.pk).update(balance=F('balance') + Decimal('1.00'))
-            UserProfile.objects.filter(pk=profile.pk).update(
-                balance_tc=F('balance_tc') + Decimal('1.00'),
-                wallet_balance=F('wallet_balance') + 1,
-            )
-            wallet.refresh_from_db(fields=['balance'])
-
-            Transaction.objects.create(
-                receiver=user,
-                tx_type='EARN_ADS',
-                amount_tc=Decimal('1.00'),
-                status='SUCCESS',
-            )
-    except Wallet.DoesNotExist:
-        return _json_error('Ví không tồn tại. Vui lòng liên hệ hỗ trợ.', status=404)
+        wallet = run_money_operation('ad_reward', _credit_ad_reward, user, Decimal('1.00'))
     except Exception as exc:
         return _json_error(str(exc), status=500)
 
@@ -2446,6 +2786,8 @@ def api_create_course_with_video(request):
                     video.prerequisite_video = prereq_video
                     video.save(update_fields=['prerequisite_video'])
 
+            bump_creator_stats(user.id, video_count=len(created))
+
             created_payload = [
                 {
                     'id': video.id,
@@ -2476,6 +2818,7 @@ def api_channel_detail(request):
 
     Query param 'id' must specify the user id of the channel owner.
     Response includes the owner's active courses and follower count.
+    Videos page with ?cursor=, courses with ?courses_cursor=; ?limit= applies to both.
     """
     user, auth_error = _require_auth(request)
     if auth_error:
@@ -2490,15 +2833,23 @@ def api_channel_detail(request):
     except User.DoesNotExist:
         return _json_error('Người dùng không tồn tại!', status=404)
 
-    owner_profile = _get_or_create_profile(owner)
+    owner_profile = _get_profile_for_read(owner)
 
     # gather courses for owner
-    courses = list(
-        Course.objects.filter(instructor=owner, is_active=True).values(
-            'id', 'title'
+    try:
+        course_page, courses_next_cursor = _created_keyset_page(
+            request,
+            Course.objects.filter(instructor=owner, is_active=True).only('id', 'title', 'created_at'),
+            cursor_param='courses_cursor',
         )
-    )
-    followers_count = Follow.objects.filter(following=owner).count()
+        video_page, videos_next_cursor = _created_keyset_page(
+            request,
+            Video.objects.filter(creator=owner, is_active=True),
+        )
+    except ValueError as exc:
+        return _json_error(str(exc), status=400)
+    courses = [{'id': course.id, 'title': course.title} for course in course_page]
+    followers_count = get_creator_stats(owner).follower_count
 
     # also indicate whether the requesting user already follows this owner
     is_following = False
@@ -2508,9 +2859,9 @@ def api_channel_detail(request):
     # collect videos created by owner (useful for channel display)
     videos = []
     try:
-        vids = Video.objects.filter(creator=owner, is_active=True)
-        for v in vids:
-            can_watch = _can_watch_video(user, v)
+        watchable_ids = _watchable_video_ids(user, video_page)
+        for v in video_page:
+            can_watch = v.id in watchable_ids
             videos.append({
                 'id': v.id,
                 'title': v.title,
@@ -2532,9 +2883,11 @@ def api_channel_detail(request):
             'bio': owner_profile.bio or 'Chua cap nhat mo ta linh vuc giang day.',
         },
         'courses': courses,
+        'courses_next_cursor': courses_next_cursor,
         'followers_count': followers_count,
         'is_following': is_following,
         'videos': videos,
+        'next_cursor': videos_next_cursor,
     })
 def video_tracking(request):
 
@@ -0,0 +1,199 @@
+"""Buffered watch-session heartbeats.
+
+The player pings every 10 seconds per viewer. Instead of an UPDATE on
+WatchSession per ping, ``record_heartbeat`` adds the seconds to a counter in
+the shared cache (``cache.incr``, so concurrent writers do not lose
+increments) after the usual anti-spam check. A session whose counter goes
+from empty to non-empty is appended to a numbered slot list, which is how
+the flusher finds pending sessions without scanning keys.
+
+``flush_heartbeats`` walks the slots past its cursor, takes each buffered
+amount off its counter and applies the amounts with one ``bulk_update`` per
+batch (``watched_seconds = watched_seconds + n``, so it never overwrites a
+concurrent write). It runs from the flush_watch_heartbeats worker and, with
+WATCH_HEARTBEAT_INLINE_FLUSH, at most once per WATCH_HEARTBEAT_FLUSH_INTERVAL
+from the ping request itself. Completion checks add ``buffered_seconds`` to
+the persisted value, so progress is never stale while it waits in the buffer.
+
+Buffering needs a cache shared by every worker (``cache_is_shared``): with a
+per-process cache (LocMemCache) each worker would hold its own buffer that
+the others, and the completion checks they serve, cannot see. Without one,
+``record_heartbeat`` writes each accepted ping straight to WatchSession and
+nothing is buffered.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import WatchSession
+from .shared_cache import cache_is_shared
+
+
+WATCH_HEARTBEAT_CACHE_PREFIX = 'watch-buffer'
+WATCH_PING_CACHE_PREFIX = 'watch-ping'
+# Minimum gap between accepted pings of one session (anti-spam).
+WATCH_PING_MIN_INTERVAL = 9
+WATCH_PING_GUARD_TTL = 60
+WATCH_HEARTBEAT_BUFFER_TTL = getattr(settings, 'WATCH_HEARTBEAT_BUFFER_TTL', 24 * 60 * 60)
+WATCH_HEARTBEAT_FLUSH_INTERVAL = getattr(settings, 'WATCH_HEARTBEAT_FLUSH_INTERVAL', 30)
+WATCH_HEARTBEAT_INLINE_FLUSH = getattr(settings, 'WATCH_HEARTBEAT_INLINE_FLUSH', True)
+_FLUSH_LOCK_TTL = 60
+
+_SEQ_KEY = f'{WATCH_HEARTBEAT_CACHE_PREFIX}:seq'
+_CURSOR_KEY = f'{WATCH_HEARTBEAT_CACHE_PREFIX}:cursor'
+_FLUSH_LOCK_KEY = f'{WATCH_HEARTBEAT_CACHE_PREFIX}:flush-lock'
+_FLUSH_DUE_KEY = f'{WATCH_HEARTBEAT_CACHE_PREFIX}:flush-due'
+
+
+def _buffer_key(session_id):
+    return f'{WATCH_HEARTBEAT_CACHE_PREFIX}:session:{session_id}'
+
+
+def _slot_key(slot):
+    return f'{WATCH_HEARTBEAT_CACHE_PREFIX}:slot:{slot}'
+
+
+def _ping_key(user_id, session_id):
+    return f'{WATCH_PING_CACHE_PREFIX}:{user_id}:{session_id}'
+
+
+def _incr(key, delta):
+    """``cache.incr`` that (re)creates the key; returns the new value."""
+    cache.add(key, 0, timeout=WATCH_HEARTBEAT_BUFFER_TTL)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # Evicted between add and incr.
+        cache.set(key, delta, timeout=WATCH_HEARTBEAT_BUFFER_TTL)
+        return delta
+
+
+def _register(user_id, session_id):
+    slot = _incr(_SEQ_KEY, 1)
+    cache.set(_slot_key(slot), (user_id, session_id), timeout=WATCH_HEARTBEAT_BUFFER_TTL)
+
+
+def record_heartbeat(user_id, session_id, seconds, now=None):
+    """Record ``seconds`` of watching; None for a ping that came too soon.
+
+    Returns the seconds not yet in a ``watched_seconds`` read made before the
+    call: the buffered total, or ``seconds`` when written straight through.
+    """
+    now = now or timezone.now()
+    ping_key = _ping_key(user_id, session_id)
+    last_seen = cache.get(ping_key)
+    if last_seen and (now - last_seen).total_seconds() < WATCH_PING_MIN_INTERVAL:
+        return None
+    cache.set(ping_key, now, timeout=WATCH_PING_GUARD_TTL)
+
+    if not cache_is_shared():
+        WatchSession.objects.filter(id=session_id).update(
+            watched_seconds=F('watched_seconds') + seconds,
+            last_ping_time=now,
+        )
+        return seconds
+
+    buffered = _incr(_buffer_key(session_id), seconds)
+    if buffered == seconds:
+        # The counter was empty: the flusher does not know about this session yet.
+        _register(user_id, session_id)
+    return buffered
+
+
+def buffered_seconds(session_ids):
+    """``{session_id: seconds}`` waiting in the buffer for the given sessions."""
+    session_ids = list(session_ids)
+    if not session_ids:
+        return {}
+    if not cache_is_shared():
+        return dict.fromkeys(session_ids, 0)
+    raw = cache.get_many([_buffer_key(session_id) for session_id in session_ids])
+    return {
+        session_id: max(0, int(raw.get(_buffer_key(session_id)) or 0))
+        for session_id in session_ids
+    }
+
+
+def flush_heartbeats(batch_size=500):
+    """Apply every buffered heartbeat, ``batch_size`` slots per UPDATE; returns (sessions, seconds).
+
+    Returns (0, 0) at once when another flusher holds the lock.
+    """
+    if not cache.add(_FLUSH_LOCK_KEY, 1, timeout=_FLUSH_LOCK_TTL):
+        return 0, 0
+    sessions = seconds = 0
+    try:
+        cursor = int(cache.get(_CURSOR_KEY) or 0)
+        last_slot = int(cache.get(_SEQ_KEY) or 0)
+        if last_slot < cursor:
+            # The slot counter was evicted and restarted.
+            cursor = 0
+        while cursor < last_slot:
+            batch_end = min(last_slot, cursor + batch_size)
+            applied = _flush_slots(cursor + 1, batch_end)
+            sessions += len(applied)
+            seconds += sum(applied.values())
+            cursor = batch_end
+            cache.set(_CURSOR_KEY, cursor, timeout=None)
+        return sessions, seconds
+    finally:
+        cache.delete(_FLUSH_LOCK_KEY)
+
+
+def _flush_slots(first, last):
+    slot_keys = [_slot_key(slot) for slot in range(first, last + 1)]
+    owners = {session_id: user_id for user_id, session_id in cache.get_many(slot_keys).values()}
+    pending = {
+        session_id: seconds
+        for session_id, seconds in buffered_seconds(owners).items()
+        if seconds > 0
+    }
+
+    # Take the amounts off first: pings landing meanwhile stay in the buffer.
+    for session_id, seconds in pending.items():
+        try:
+            remaining = cache.decr(_buffer_key(session_id), seconds)
+        except ValueError:
+            # Evicted after the read; the amount read is still applied.
+            continue
+        if remaining > 0:
+            _register(owners[session_id], session_id)
+    try:
+        _apply(pending, owners)
+    except Exception:
+        for session_id, seconds in pending.items():
+            if _incr(_buffer_key(session_id), seconds) == seconds:
+                _register(owners[session_id], session_id)
+        raise
+    cache.delete_many(slot_keys)
+    return pending
+
+
+def _apply(pending, owners):
+    if not pending:
+        return
+    now = timezone.now()
+    last_seen = cache.get_many([_ping_key(owners[session_id], session_id) for session_id in pending])
+    sessions = [
+        WatchSession(
+            id=session_id,
+            watched_seconds=F('watched_seconds') + seconds,
+            last_ping_time=last_seen.get(_ping_key(owners[session_id], session_id)) or now,
+        )
+        for session_id, seconds in sorted(pending.items())
+    ]
+    # Sessions deleted meanwhile simply match no row.
+    with transaction.atomic():
+        WatchSession.objects.bulk_update(sessions, ['watched_seconds', 'last_ping_time'])
+
+
+def maybe_flush_heartbeats():
+    """Inline flush from a ping, at most once per WATCH_HEARTBEAT_FLUSH_INTERVAL across requests."""
+    if not WATCH_HEARTBEAT_INLINE_FLUSH or not cache_is_shared():
+        return
+    if cache.add(_FLUSH_DUE_KEY, 1, timeout=WATCH_HEARTBEAT_FLUSH_INTERVAL):
+        flush_heartbeats()
+